@@ -0,0 +1,341 @@
+"""
+Benchmark whole commands against a local fake Habitica API.
+
+A fake Habitica server with a synthetic party is started in a separate
+process, and the requests made by hhelper.py are redirected to it. Each
+command is then run for each party size, and the wall time, number of
+requests and peak memory allocated by the command are reported.
+
+The fake server serves the party, its members, a challenge listing with one
+Sharing Weekend challenge that every member has joined, and the challenge
+progress of each member, where every third member hasn't completed all
+todos. It can add latency to each response and enforce a rate limit in the
+same way as Habitica: by reporting the remaining budget in response headers,
+and responding with 429 when the budget has been used up.
+
+Usage:
+    python benchmarks/e2e_benchmark.py [--sizes 30,1000,10000]
+        [--latency SECONDS] [--rate-limit REQUESTS] [--window SECONDS]
+"""
+
+import argparse
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from urllib.parse import parse_qs, urlsplit
+from urllib.request import urlopen
+import types
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# hhelper.py reads the credentials when imported, so made-up ones are used
+_CREDENTIALS = types.ModuleType("conf.secrets.habitica_credentials")
+_CREDENTIALS.PLAYER_USER_ID = "benchmark-user-id"
+_CREDENTIALS.PLAYER_API_TOKEN = "benchmark-api-token"
+sys.modules["conf.secrets.habitica_credentials"] = _CREDENTIALS
+
+# pylint: disable=wrong-import-position
+import hhelper  # noqa: E402
+from habitica_helper import daemon  # noqa: E402
+from habitica_helper import habrequest  # noqa: E402
+from habitica_helper.stockrandomizer import StockRandomizer  # noqa: E402
+
+
+CHALLENGE_ID = "5ba1ffe0-0000-4000-8000-000000000000"
+PAGE_SIZE = 30
+
+COMMANDS = [
+    ["sharing-winners", "--no-archive"],
+    ["party-members"],
+    ["pick-winner", "Sharing Weekend", "--no-archive"],
+    ]
+
+
+def member_id(index):
+    """
+    Return the user ID of the member with the given index.
+    """
+    return "00000000-0000-4000-8000-{:012d}".format(index)
+
+
+def member_data(index):
+    """
+    Return made-up member data as returned by Habitica API.
+    """
+    return {
+        "_id": member_id(index),
+        "auth": {"local": {"username": "user{}".format(index)},
+                 "timestamps": {
+                     "created": "2020-01-04T21:11:{:02d}.201Z".format(
+                         index % 60),
+                     "loggedin": "2022-01-06T08:09:17.{:03d}Z".format(
+                         index % 1000)}},
+        "profile": {"name": "User {}".format(index)},
+        }
+
+
+def challenge_listing(size):
+    """
+    Return a challenge listing with the benchmarked challenge and older ones.
+    """
+    challenges = [{
+        "id": "5ba1ffe0-0000-4000-8000-{:012d}".format(i),
+        "name": "Old challenge {}".format(i),
+        "createdAt": "2019-01-{:02d}T12:00:00.000Z".format(i),
+        "memberCount": size,
+        } for i in range(1, 29)]
+    challenges.append({
+        "id": CHALLENGE_ID,
+        "name": "Sharing Weekend Challenge",
+        "summary": "Share something",
+        "description": "Share something and complete the todo",
+        "createdAt": "2020-05-01T12:00:00.000Z",
+        "memberCount": size,
+        })
+    return challenges
+
+
+class FakeHabitica(ThreadingHTTPServer):
+    """
+    A local HTTP server imitating the parts of Habitica API used by the tools.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, size, latency=0.0, rate_limit=None,
+                 window=60.0):
+        """
+        :size: Number of members in the party
+        :latency: Time in seconds added to each response
+        :rate_limit: Number of requests allowed per window, or None for no
+                     limit
+        :window: Length of the rate limit window in seconds
+        """
+        super().__init__(address, _FakeHabiticaHandler)
+        self.size = size
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.window = window
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.window_start = time.time()
+        self.window_count = 0
+
+    def reserve(self):
+        """
+        Count a request against the rate limit.
+
+        :returns: A tuple of (allowed, remaining, reset time)
+        """
+        with self.lock:
+            self.request_count += 1
+            now = time.time()
+            if now - self.window_start >= self.window:
+                self.window_start = now
+                self.window_count = 0
+            self.window_count += 1
+            reset = self.window_start + self.window
+            if self.rate_limit is None:
+                return (True, None, reset)
+            remaining = self.rate_limit - self.window_count
+            return (remaining >= 0, max(remaining, 0), reset)
+
+
+def _js_date(timestamp):
+    """
+    Return the given time as a JavaScript date string like Habitica uses.
+    """
+    moment = datetime.fromtimestamp(timestamp, timezone.utc)
+    return moment.strftime("%a %b %d %Y %H:%M:%S GMT+0000 "
+                           "(Coordinated Universal Time)")
+
+
+class _FakeHabiticaHandler(BaseHTTPRequestHandler):
+    """
+    Respond to a request to the fake Habitica API.
+    """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+    def _send(self, status, data, headers=None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _page(self, query):
+        """
+        Return a page of member entries starting after the lastId in query.
+        """
+        last_id = parse_qs(query).get("lastId", [None])[0]
+        start = 0 if last_id is None else int(last_id.split("-")[-1]) + 1
+        end = min(start + PAGE_SIZE, self.server.size)
+        return [{"id": member_id(index)} for index in range(start, end)]
+
+    def _data(self, path, query):
+        """
+        Return the data for the given API path, or None if it is unknown.
+        """
+        parts = path.strip("/").split("/")[2:]
+        size = self.server.size
+        routes = {
+            ("groups", "party"): lambda: {"memberCount": size,
+                                          "description": "Benchmark party"},
+            ("groups", "party", "members"): lambda: self._page(query),
+            ("challenges", "groups", "party"): lambda: challenge_listing(
+                size),
+            ("challenges", CHALLENGE_ID): lambda: challenge_listing(size)[-1],
+            ("challenges", CHALLENGE_ID, "members"): lambda: self._page(query),
+            }
+        if tuple(parts) in routes:
+            return routes[tuple(parts)]()
+        if parts[:3] == ["challenges", CHALLENGE_ID, "members"]:
+            index = int(parts[3].split("-")[-1])
+            return {"tasks": [{"type": "todo",
+                               "completed": index % 3 != 2}]}
+        if parts[0] == "members" and len(parts) == 2:
+            return member_data(int(parts[1].split("-")[-1]))
+        return None
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        Respond to a GET request.
+        """
+        url = urlsplit(self.path)
+        if url.path == "/_stats":
+            self._send(200, {"requests": self.server.request_count})
+            return
+        if url.path == "/_reset":
+            with self.server.lock:
+                self.server.request_count = 0
+            self._send(200, {})
+            return
+
+        allowed, remaining, reset = self.server.reserve()
+        time.sleep(self.server.latency)
+        headers = {}
+        if remaining is not None:
+            headers = {"X-RateLimit-Remaining": str(remaining),
+                       "X-RateLimit-Reset": _js_date(reset)}
+        if not allowed:
+            headers["Retry-After"] = str(max(reset - time.time(), 0))
+            self._send(429, {"success": False}, headers)
+            return
+        data = self._data(url.path, url.query)
+        if data is None:
+            self._send(404, {"success": False}, headers)
+        else:
+            self._send(200, {"success": True, "data": data}, headers)
+
+
+def _serve(port_queue, size, latency, rate_limit, window):
+    """
+    Run a fake Habitica server, reporting its port using the queue.
+    """
+    server = FakeHabitica(("127.0.0.1", 0), size, latency, rate_limit,
+                          window)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+class _RedirectAdapter(requests.adapters.HTTPAdapter):
+    """
+    A transport adapter sending requests for habitica.com to the fake server.
+    """
+
+    def __init__(self, base_url):
+        super().__init__()
+        self.base_url = base_url
+
+    def send(self, request, **kwargs):  # pylint: disable=arguments-differ
+        request.url = request.url.replace("https://habitica.com",
+                                          self.base_url, 1)
+        return super().send(request, **kwargs)
+
+
+def run_benchmark(base_url, args):
+    """
+    Run a command and measure it.
+
+    :base_url: URL of the fake server
+    :args: Command-line arguments for hhelper.py
+    :returns: A tuple of (exit code, seconds, requests, peak bytes)
+    """
+    urlopen(base_url + "/_reset").read()
+    hhelper._PARTY_TOOL["tools"].clear()  # pylint: disable=protected-access
+    tracemalloc.start()
+    start = time.perf_counter()
+    exit_code = daemon.run_command(hhelper.cli, args, io.StringIO())
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = json.loads(urlopen(base_url + "/_stats").read())
+    return (exit_code, seconds, stats["requests"], peak)
+
+
+def main():
+    """
+    Run the benchmarks and print the results.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", default="30,1000,10000",
+                        help="Comma-separated party sizes")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds added to each response")
+    parser.add_argument("--rate-limit", type=int, default=None,
+                        help="Requests allowed per window (default no limit)")
+    parser.add_argument("--window", type=float, default=60.0,
+                        help="Length of the rate limit window in seconds")
+    options = parser.parse_args()
+
+    # The rate limit budget of the fake server must not be shared with real
+    # hhelper.py processes
+    os.environ["HHELPER_RATE_LIMIT_FILE"] = ""
+
+    # The seed is not fetched from the stock market
+    StockRandomizer._stock_seed = (  # pylint: disable=protected-access
+        lambda self, ticker, date: 95957366)
+
+    print("{:<34}{:>8}{:>10}{:>10}{:>12}".format(
+        "command", "size", "seconds", "requests", "peak MiB"))
+    for size in [int(size) for size in options.sizes.split(",")]:
+        port_queue = multiprocessing.Queue()
+        server = multiprocessing.Process(
+            target=_serve, daemon=True,
+            args=(port_queue, size, options.latency, options.rate_limit,
+                  options.window))
+        server.start()
+        base_url = "http://127.0.0.1:{}".format(port_queue.get())
+        habrequest._SESSION.mount(  # pylint: disable=protected-access
+            "https://habitica.com", _RedirectAdapter(base_url))
+        try:
+            for args in COMMANDS:
+                exit_code, seconds, request_count, peak = run_benchmark(
+                    base_url, args)
+                print("{:<34}{:>8}{:>10.2f}{:>10}{:>12.1f}{}".format(
+                    " ".join(args), size, seconds, request_count,
+                    peak / 2**20,
+                    "" if exit_code == 0 else "  (exit code {})".format(
+                        exit_code)))
+        finally:
+            server.terminate()
+            server.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark creating Members from API data.
+
+Compares the memory used per member and the time taken to create a member to
+a reference implementation that stores its attributes in an instance dict and
+parses timestamps using strptime, as Member used to.
+
+Usage:
+    python benchmarks/member_benchmark.py [member_count]
+"""
+
+from datetime import datetime
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from habitica_helper.member import Member  # noqa: E402
+
+
+class DictMember():
+    """
+    Reference implementation with an instance dict and strptime parsing.
+    """
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, api_data):
+        self.id = api_data["_id"]  # pylint: disable=invalid-name
+        self.displayname = api_data["profile"]["name"]
+        self.login_name = api_data["auth"]["local"]["username"]
+        self.habitica_birthday = datetime.strptime(
+            api_data["auth"]["timestamps"]["created"],
+            "%Y-%m-%dT%H:%M:%S.%fZ")
+        self.last_login = datetime.strptime(
+            api_data["auth"]["timestamps"]["loggedin"],
+            "%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def member_data(count):
+    """
+    Return a list of made-up member data dicts as returned by Habitica API.
+    """
+    return [{
+        "_id": "00000000-0000-4000-8000-{:012d}".format(i),
+        "auth": {"local": {"username": "user{}".format(i)},
+                 "timestamps": {
+                     "created": "2020-01-04T21:11:{:02d}.201Z".format(i % 60),
+                     "loggedin": "2022-01-06T08:09:17.{:03d}Z".format(
+                         i % 1000)}},
+        "profile": {"name": "User {}".format(i)},
+        } for i in range(count)]
+
+
+def memory_per_member(factory, data):
+    """
+    Return the average number of bytes allocated per created member.
+    """
+    tracemalloc.start()
+    members = [factory(item) for item in data]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del members
+    return size / len(data)
+
+
+def seconds_per_member(factory, data):
+    """
+    Return the best average time taken to create one member.
+    """
+    times = timeit.repeat(lambda: [factory(item) for item in data],
+                          number=1, repeat=5)
+    return min(times) / len(data)
+
+
+def main(count):
+    """
+    Run the benchmark and print the results.
+    """
+    data = member_data(count)
+    factories = [
+        ("Member", lambda item: Member(item["_id"], api_data=item)),
+        ("reference", DictMember),
+        ]
+    print("{:<12}{:>16}{:>16}".format("", "bytes/member", "µs/member"))
+    for name, factory in factories:
+        print("{:<12}{:>16.0f}{:>16.2f}".format(
+            name,
+            memory_per_member(factory, data),
+            seconds_per_member(factory, data) * 1e6))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,252 @@
+"""
+Regression benchmarks for the CPU-bound code that scales with group size.
+
+Each benchmark is timed and compared to a baseline stored in
+micro_baseline.json, and the script fails if any of them has become slower
+than the baseline by more than the allowed threshold. No network access is
+needed.
+
+To make the baselines usable on different machines, the timings are not
+stored in seconds but relative to a fixed pure-Python calibration workload
+timed on the same machine during the same run.
+
+Usage:
+    python benchmarks/micro_benchmark.py [--update] [--threshold FRACTION]
+        [--baseline PATH]
+
+Run with --update to store the current timings as the new baseline, e.g.
+after an intended change in performance.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import statistics
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from habitica_helper.habiticatool import (  # noqa: E402
+    PartyTool, completed_all_todos)
+from habitica_helper.member import Member  # noqa: E402
+from habitica_helper.task import Task  # noqa: E402
+from habitica_helper import utils  # noqa: E402
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "micro_baseline.json")
+
+# Allowed slowdown compared to the baseline, as a fraction
+DEFAULT_THRESHOLD = 0.3
+
+# Number of items processed in each benchmark
+ITEMS = 1000
+
+
+def _timestamps():
+    """
+    Return a list of distinct timestamps in Habitica format.
+    """
+    return ["20{:02d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}.{:03d}Z".format(
+        i % 30, i % 12 + 1, i % 28 + 1, i % 24, i % 60, (i * 7) % 60, i % 1000)
+            for i in range(ITEMS)]
+
+
+def bench_member_from_profile():
+    """
+    Create Members from profile dicts.
+    """
+    birthday = datetime.datetime(2020, 1, 4, 21, 11, 35)
+    profiles = [{"id": "00000000-0000-4000-8000-{:012d}".format(i),
+                 "displayname": "User {}".format(i),
+                 "loginname": "user{}".format(i),
+                 "birthday": birthday,
+                 "last_login": birthday} for i in range(ITEMS)]
+    return lambda: [Member(profile["id"], profile_data=profile)
+                    for profile in profiles]
+
+
+def bench_timestamp_to_datetime():
+    """
+    Parse Habitica timestamps.
+    """
+    timestamps = _timestamps()
+    return lambda: [utils.timestamp_to_datetime(timestamp)
+                    for timestamp in timestamps]
+
+
+def bench_newest_matching_challenge():
+    """
+    Find the newest Sharing Weekend challenge among thousands of challenges.
+    """
+    timestamps = _timestamps()
+    tool = PartyTool({})
+    # pylint: disable=protected-access
+    tool._challenges = [{
+        "id": "challenge-{}".format(i),
+        "name": ("Sharing Weekend Challenge {}".format(i) if i % 4
+                 else "Sharing Weekend TEMPLATE {}".format(i)),
+        "createdAt": timestamps[i % ITEMS],
+        } for i in range(5 * ITEMS)]
+    return lambda: [tool.current_sharing_weekend()]
+
+
+def bench_task_dict():
+    """
+    Convert Tasks to the API representation.
+    """
+    tasks = [Task({"text": "Task {}".format(i), "tasktype": "habit",
+                   "notes": "Notes {}".format(i), "difficulty": "medium",
+                   "date": "2020-05-05"}) for i in range(ITEMS)]
+    # pylint: disable=protected-access
+    return lambda: [task._task_dict() for task in tasks]
+
+
+def bench_task_setters():
+    """
+    Create Tasks, validating each field in the setters.
+    """
+    task_data = [{"text": "Task {}".format(i), "tasktype": "daily",
+                  "notes": "Notes {}".format(i), "difficulty": "hard",
+                  "frequency": "weekly", "uppable": True, "downable": "false",
+                  "date": datetime.date(2020, 5, 5)} for i in range(ITEMS)]
+    return lambda: [Task(data) for data in task_data]
+
+
+def bench_eligibility():
+    """
+    Evaluate eligibility based on challenge progress dicts.
+    """
+    progresses = [{"tasks": [{"type": task_type, "completed": i % 3 != 2}
+                             for task_type in ["habit", "daily", "todo",
+                                               "todo", "todo"]]}
+                  for i in range(ITEMS)]
+    return lambda: [completed_all_todos(progress) for progress in progresses]
+
+
+BENCHMARKS = {
+    "member_from_profile": bench_member_from_profile,
+    "timestamp_to_datetime": bench_timestamp_to_datetime,
+    "newest_matching_challenge": bench_newest_matching_challenge,
+    "task_dict": bench_task_dict,
+    "task_setters": bench_task_setters,
+    "eligibility": bench_eligibility,
+    }
+
+
+def _calibration():
+    """
+    A fixed workload of common pure-Python operations.
+    """
+    items = {}
+    for i in range(ITEMS):
+        items["key-{}".format(i)] = [i, str(i), float(i)]
+    return sorted(items.items(), key=lambda item: item[1][1])
+
+
+class _Timing:
+    """
+    Repeated timing of a function.
+
+    The function is called enough times per measurement for the measurement
+    to take at least 0.05 seconds, so that timer resolution doesn't matter.
+    The number of calls is determined once, when the timing is created.
+    """
+
+    def __init__(self, function):
+        self._timer = timeit.Timer(function)
+        number, _ = self._timer.autorange()
+        self._number = max(1, number // 4)
+
+    def best_time(self, repeat=5):
+        """
+        Return the shortest time in seconds taken by a call of the function.
+        """
+        return min(self._timer.repeat(repeat=repeat,
+                                      number=self._number)) / self._number
+
+
+def measure(rounds=9):
+    """
+    Return the time of each benchmark relative to the calibration workload.
+
+    In each round, the calibration workload is timed right before and right
+    after each benchmark, so that changes in the load of the machine affect
+    both timings alike. The median of the relative times of all rounds is
+    returned, so that a single disturbed round doesn't change the result.
+    """
+    calibration = _Timing(_calibration)
+    timings = {name: _Timing(setup()) for name, setup in BENCHMARKS.items()}
+    relatives = {name: [] for name in timings}
+    for _ in range(rounds):
+        for name, timing in timings.items():
+            before = calibration.best_time()
+            benchmark = timing.best_time()
+            after = calibration.best_time()
+            relatives[name].append(benchmark / min(before, after))
+    return {name: statistics.median(values)
+            for name, values in relatives.items()}
+
+
+def main():
+    """
+    Run the benchmarks and compare them to the baseline.
+
+    :returns: Exit code: 1 if any benchmark has regressed, otherwise 0
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--update", action="store_true",
+                        help="Store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="Allowed slowdown as a fraction, overriding the "
+                             "thresholds in the baseline file")
+    parser.add_argument("--baseline", default=BASELINE_PATH,
+                        help="Path of the baseline file")
+    options = parser.parse_args()
+
+    results = measure()
+    if options.update:
+        baseline = {"threshold": DEFAULT_THRESHOLD, "benchmarks": {}}
+        if os.path.exists(options.baseline):
+            with open(options.baseline) as baseline_file:
+                baseline = json.load(baseline_file)
+        for name, relative in results.items():
+            baseline["benchmarks"].setdefault(name, {})["relative"] = round(
+                relative, 4)
+        with open(options.baseline, "w") as baseline_file:
+            json.dump(baseline, baseline_file, indent=4, sort_keys=True)
+            baseline_file.write("\n")
+        print("Baseline stored in {}".format(options.baseline))
+        return 0
+
+    with open(options.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    regressions = []
+    print("{:<28}{:>10}{:>10}{:>10}".format("benchmark", "baseline",
+                                            "current", "change"))
+    for name, relative in results.items():
+        expected = baseline["benchmarks"].get(name)
+        if expected is None:
+            print("{:<28}{:>10}{:>10.3f}".format(name, "-", relative))
+            continue
+        threshold = options.threshold
+        if threshold is None:
+            threshold = expected.get("threshold", baseline["threshold"])
+        change = relative / expected["relative"] - 1
+        regressed = change > threshold
+        if regressed:
+            regressions.append(name)
+        print("{:<28}{:>10.3f}{:>10.3f}{:>+9.0%}{}".format(
+            name, expected["relative"], relative, change,
+            "  REGRESSION" if regressed else ""))
+    if regressions:
+        print("Slower than allowed: {}".format(", ".join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
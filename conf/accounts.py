@@ -0,0 +1,11 @@
+"""
+Habitica accounts for which `hhelper.py all-accounts` runs commands.
+"""
+from conf.header import HEADER
+
+# Maps a name for each account, e.g. the name of the party it manages, to the
+# Habitica API header of the account. Add the credentials of other accounts
+# as headers structured like HEADER in conf/header.py.
+ACCOUNTS = {
+    "default": HEADER,
+}
@@ -0,0 +1,7 @@
+"""
+Location of the local archive of drawn challenge winners.
+"""
+
+# SQLite database in which `hhelper.py sharing-winners` and `pick-winner`
+# store the results of each draw
+ARCHIVE = "conf/secrets/results.sqlite"
@@ -0,0 +1,6 @@
+"""
+Location of the local index of party chat messages.
+"""
+
+# SQLite database in which `hhelper.py sync-chat` stores the party chat
+CHAT_INDEX = "conf/secrets/party_chat.sqlite"
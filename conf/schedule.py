@@ -0,0 +1,21 @@
+"""
+Recurring jobs run by `hhelper.py scheduler`.
+
+Each job is a tuple of a cron-like schedule ("minute hour day month weekday",
+in local time) and the command-line arguments of the hhelper.py command to
+run. Jobs are run one at a time in the same process.
+"""
+
+JOBS = [
+    # Update the birthday calendar every morning
+    ("0 8 * * *", ["party-birthdays"]),
+    # Keep the party chat index up to date for verifying sharing tasks
+    ("0 * * * *", ["sync-chat"]),
+    # Fetch the completers and the stock data for the Tuesday draw in
+    # advance. This must be done after the stock (AEX) has closed.
+    ("50 17 * * 2", ["prefetch-sharing-winners"]),
+    ("0 18 * * 2", ["sharing-winners"]),
+]
+
+# Data fetched by a job is reused by the jobs run within this many seconds
+SHARE_WINDOW = 15 * 60
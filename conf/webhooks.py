@@ -0,0 +1,10 @@
+"""
+Settings for receiving Habitica webhooks with `hhelper.py webhook-server`.
+"""
+
+# SQLite database in which the received challenge todo completions are stored
+WEBHOOK_STATE = "conf/secrets/webhook_state.sqlite"
+
+# Local port the webhook server listens to. Habitica must be able to reach it,
+# e.g. through a reverse proxy.
+WEBHOOK_PORT = 8742
@@ -0,0 +1,109 @@
+"""
+Running commands for several Habitica accounts concurrently.
+
+Habitica limits the request rate of each user separately, so commands for
+different accounts, e.g. the leaders of different parties, can run at the same
+time without slowing each other down. Each account gets its own rate limit
+budget and HTTP session in habrequest, and the output of each command is
+collected separately.
+
+Commands find the credentials of the account they are run for using
+`current_header`.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import io
+import sys
+import threading
+
+from habitica_helper import daemon
+from habitica_helper import habrequest
+
+
+_CURRENT = threading.local()
+
+
+def current_header(default):
+    """
+    Return the header of the account the current thread runs a command for.
+
+    :default: Header returned when not running a command for an account
+    """
+    return getattr(_CURRENT, "header", default)
+
+
+class _ThreadOutput(io.TextIOBase):
+    """
+    A text stream that writes to a separate stream for each thread.
+
+    sys.stdout is shared by all threads, so while commands run concurrently
+    it is replaced by this stream, which passes the output of each command to
+    the stream of the thread running it. Output from other threads goes to the
+    original stream.
+    """
+
+    def __init__(self, fallback):
+        super().__init__()
+        self._fallback = fallback
+        self._streams = threading.local()
+
+    def _stream(self):
+        stream = getattr(self._streams, "stream", None)
+        return self._fallback if stream is None else stream
+
+    def route(self, stream):
+        """
+        Write the output of the current thread to the given stream.
+        """
+        self._streams.stream = stream
+
+    def writable(self):
+        return True
+
+    def write(self, text):  # pylint: disable=arguments-renamed
+        return self._stream().write(text)
+
+    def flush(self):
+        self._stream().flush()
+
+
+def run_for_accounts(command, accounts, args):
+    """
+    Run the click command with args for every account concurrently.
+
+    :command: The click command or group to run
+    :accounts: A dict mapping a name of each account to its Habitica API
+               header
+    :args: List of command-line arguments
+    :returns: A dict mapping the name of each account to a tuple of the exit
+              code and the output of the command
+    :raises: RuntimeError if called by a command already run for an account
+    """
+    if hasattr(_CURRENT, "header"):
+        raise RuntimeError("Commands run for an account can't run commands "
+                           "for all accounts.")
+    for header in accounts.values():
+        habrequest.add_account(header["x-api-user"])
+    router = _ThreadOutput(sys.stdout)
+
+    def _run(account):
+        """
+        Run the command for one account in the current thread.
+        """
+        name, header = account
+        output = io.StringIO()
+        router.route(output)
+        _CURRENT.header = header
+        try:
+            exit_code = daemon.invoke(command, args, output)
+        finally:
+            del _CURRENT.header
+            router.route(None)
+        return name, (exit_code, output.getvalue())
+
+    with contextlib.redirect_stdout(router), \
+            contextlib.redirect_stderr(router), \
+            ThreadPoolExecutor(max_workers=max(len(accounts), 1)) as executor:
+        return dict(executor.map(habrequest.with_current_priority(_run),
+                                 accounts.items()))
@@ -0,0 +1,231 @@
+"""
+A local archive of drawn challenge winners.
+
+Every draw is appended to a SQLite database together with everything needed
+to reproduce and audit it: the completers, the stock prices and seed used for
+picking the winner, and the text that was shown to the user. Rows are never
+updated or deleted, so drawing a winner again for the same challenge adds a
+new draw, and queries only consider the newest draw of each challenge.
+Draws are stored with the ID of the party they were made for, so that several
+parties can share an archive without mixing their results.
+
+Questions about past results, such as who has won most often, are answered
+from the archive using indexed queries instead of fetching old challenges from
+Habitica.
+"""
+
+import datetime
+import time
+
+from habitica_helper import storage
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS draws (
+    id INTEGER PRIMARY KEY,
+    challenge_id TEXT NOT NULL,
+    challenge_name TEXT,
+    drawn_at INTEGER NOT NULL,
+    week INTEGER NOT NULL,
+    ticker TEXT,
+    stock_date TEXT,
+    seed INTEGER,
+    open REAL,
+    high REAL,
+    low REAL,
+    close REAL,
+    winner_id TEXT,
+    winner_name TEXT,
+    output TEXT,
+    party_id TEXT
+);
+CREATE TABLE IF NOT EXISTS completions (
+    draw_id INTEGER NOT NULL REFERENCES draws (id),
+    user_id TEXT NOT NULL,
+    login_name TEXT,
+    displayname TEXT,
+    PRIMARY KEY (draw_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS draws_by_challenge ON draws (challenge_id, id);
+CREATE INDEX IF NOT EXISTS draws_by_time ON draws (drawn_at);
+CREATE INDEX IF NOT EXISTS completions_by_user
+    ON completions (user_id, draw_id);
+
+CREATE VIEW IF NOT EXISTS latest_draws AS
+    SELECT * FROM draws WHERE id IN (
+        SELECT MAX(id) FROM draws GROUP BY challenge_id);
+
+CREATE TRIGGER IF NOT EXISTS draws_no_update BEFORE UPDATE ON draws
+    BEGIN SELECT RAISE(ABORT, 'the archive is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS draws_no_delete BEFORE DELETE ON draws
+    BEGIN SELECT RAISE(ABORT, 'the archive is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS completions_no_update BEFORE UPDATE ON completions
+    BEGIN SELECT RAISE(ABORT, 'the archive is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS completions_no_delete BEFORE DELETE ON completions
+    BEGIN SELECT RAISE(ABORT, 'the archive is append-only'); END;
+"""
+
+_MS_PER_DAY = 24 * 60 * 60 * 1000
+
+
+def _week(milliseconds):
+    """
+    Return the number of the week starting on Monday that contains the time.
+
+    The epoch was on a Thursday, so days are shifted by three to make the
+    weeks start on Mondays.
+    """
+    return (milliseconds // _MS_PER_DAY + 3) // 7
+
+
+class ResultArchive():
+    """
+    Drawn challenge winners, stored in an append-only SQLite database.
+    """
+
+    def __init__(self, path=":memory:"):
+        """
+        Open the archive, creating it if it doesn't exist yet.
+
+        :path: Path of the database file
+        """
+        self._connection = storage.connect(path, _SCHEMA)
+        self._add_party_column()
+
+    def _add_party_column(self):
+        """
+        Add the party_id column to archives created without it.
+
+        Draws archived before the column existed have no party, and are only
+        included in queries that aren't limited to a party.
+        """
+        columns = [row[1] for row in
+                   self._connection.execute("PRAGMA table_info(draws)")]
+        with self._connection:
+            if "party_id" not in columns:
+                self._connection.execute(
+                    "ALTER TABLE draws ADD COLUMN party_id TEXT")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS draws_by_party "
+                "ON draws (party_id, drawn_at)")
+
+    def close(self):
+        """
+        Close the database.
+        """
+        self._connection.close()
+
+    def record(self, challenge, randomizer, winner, output, drawn_at=None,
+               party_id=None):
+        """
+        Add a draw to the archive.
+
+        :challenge: The Challenge whose completers have already been fetched
+        :randomizer: The StockRandomizer used for picking the winner
+        :winner: The winning Member, or None if nobody won
+        :output: The text describing the result, as shown to the user
+        :drawn_at: Datetime of the draw. Defaults to now.
+        :party_id: ID of the party the challenge belongs to
+        :returns: ID of the new draw
+        """
+        if drawn_at is None:
+            drawn_at_ms = int(time.time() * 1000)
+        else:
+            drawn_at_ms = storage.milliseconds(drawn_at)
+        prices = randomizer.prices or {}
+        with self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO draws (challenge_id, challenge_name, drawn_at, "
+                "week, ticker, stock_date, seed, open, high, low, close, "
+                "winner_id, winner_name, output, party_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (challenge.id, challenge.name, drawn_at_ms,
+                 _week(drawn_at_ms), randomizer.ticker,
+                 randomizer.date.strftime("%Y-%m-%d"), randomizer.seed,
+                 prices.get("Open"), prices.get("High"), prices.get("Low"),
+                 prices.get("Close"),
+                 winner.id if winner else None,
+                 winner.login_name if winner else None, output, party_id))
+            draw_id = cursor.lastrowid
+            self._connection.executemany(
+                "INSERT INTO completions VALUES (?, ?, ?, ?)",
+                [(draw_id, member.id, member.login_name, member.displayname)
+                 for member in challenge.completers])
+        return draw_id
+
+    def draws(self, challenge_id):
+        """
+        Return all draws of the given challenge, oldest first.
+
+        :challenge_id: ID of the challenge
+        :returns: A list of dicts with the columns of the draws
+        """
+        cursor = self._connection.execute(
+            "SELECT * FROM draws WHERE challenge_id = ? ORDER BY id",
+            (challenge_id,))
+        columns = [description[0] for description in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def most_wins(self, since, limit=10, party_id=None):
+        """
+        Return the users who have won most challenges since the given time.
+
+        :since: Datetime from which draws are included
+        :limit: Maximum number of users returned
+        :party_id: If given, only draws for this party are included
+        :returns: A list of (user ID, login name, wins) tuples, the user with
+                  most wins first
+        """
+        return self._connection.execute(
+            "SELECT winner_id, MAX(winner_name), COUNT(*) AS wins "
+            "FROM latest_draws "
+            "WHERE drawn_at >= ? AND winner_id IS NOT NULL "
+            "AND (? IS NULL OR party_id = ?) "
+            "GROUP BY winner_id ORDER BY wins DESC, MAX(winner_name) "
+            "LIMIT ?", (storage.milliseconds(since), party_id, party_id,
+                        limit)).fetchall()
+
+    def completion_streaks(self, min_length=2, name_contains=None,
+                           party_id=None):
+        """
+        Return runs of consecutive weeks in which users completed challenges.
+
+        A user is counted for a week if they were a completer in the newest
+        draw of any archived challenge drawn during that week.
+
+        :min_length: Minimum number of consecutive weeks in a run
+        :name_contains: If given, only challenges whose name contains this
+                        are considered
+        :party_id: If given, only challenges of this party are considered
+        :returns: A list of (user ID, login name, weeks, first Monday) tuples,
+                  the longest runs first
+        """
+        return [(user_id, login_name, length,
+                 datetime.date(1970, 1, 1)
+                 + datetime.timedelta(days=first_week * 7 - 3))
+                for user_id, login_name, length, first_week
+                in self._connection.execute(
+                    """
+                    WITH weeks AS (
+                        SELECT DISTINCT completions.user_id,
+                                        latest_draws.week
+                        FROM latest_draws JOIN completions
+                            ON completions.draw_id = latest_draws.id
+                        WHERE (? IS NULL OR instr(
+                            lower(latest_draws.challenge_name), lower(?)))
+                            AND (? IS NULL OR latest_draws.party_id = ?)
+                    ), islands AS (
+                        SELECT user_id, week, week - ROW_NUMBER() OVER (
+                            PARTITION BY user_id ORDER BY week) AS island
+                        FROM weeks
+                    )
+                    SELECT islands.user_id,
+                           (SELECT login_name FROM completions
+                            WHERE completions.user_id = islands.user_id
+                            ORDER BY draw_id DESC LIMIT 1),
+                           COUNT(*) AS length, MIN(week)
+                    FROM islands GROUP BY islands.user_id, island
+                    HAVING length >= ?
+                    ORDER BY length DESC, MIN(week) DESC
+                    """, (name_contains, name_contains, party_id, party_id,
+                          min_length))]
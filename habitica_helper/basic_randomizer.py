@@ -10,6 +10,12 @@ class BasicRandomizer(object):
     A wrapper for python random module that Habitica challenge winners.
     """
 
+    def __init__(self):
+        """
+        Initialize the randomizer with its own random number generator.
+        """
+        self._random = random.Random()
+
     def pick_integer(self, min_, max_):
         """
         Return an integer between min (inclusive) and max (not inclusive).
@@ -20,4 +26,4 @@ class BasicRandomizer(object):
         :min_: Minimum value (inclusive)
         :max_: Maximum value (not inclusive)
         """
-        return random.randint(min_, max_)
+        return self._random.randint(min_, max_)
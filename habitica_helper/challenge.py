@@ -5,7 +5,10 @@ A class for representing a Habitica challenge.
 from habitica_helper.habiticatool import PartyTool
 from habitica_helper.basic_randomizer import BasicRandomizer
 from habitica_helper.stockrandomizer import StockRandomizer
+from habitica_helper.task import Task, task_diff
 from habitica_helper import habrequest
+from habitica_helper import planner
+from habitica_helper import tracing
 from habitica_helper import utils
 
 
@@ -14,22 +17,71 @@ class Challenge():
     Data and operations for an existing Habitica challenge.
     """
 
-    def __init__(self, header, challenge_id):
+    def __init__(self, header, challenge_id, data=None, party_tool=None):
         """
         Create a class for a challenge.
 
+        If challenge data is already available, e.g. from a challenge listing,
+        it can be given to avoid fetching it again. The full challenge data is
+        fetched from the API only if a field missing from the given data is
+        needed.
+
         :header: Header to use with API
         :challenge_id: The ID of the represented challenge
+        :data: Already-fetched data dict for the challenge (optional)
+        :party_tool: PartyTool used for fetching participant data. Giving the
+                     same tool to multiple challenges allows them to share
+                     fetched member data. If not given, a new tool is created
+                     when needed.
         """
         self.id = challenge_id  # pylint: disable=invalid-name
         self._header = header
-        self._full_data = utils.get_dict_from_api(
-            header,
-            "https://habitica.com/api/v3/challenges/{}".format(challenge_id))
-        self._party_tool = PartyTool(header)
+        self._data = dict(data) if data else {}
+        self._full_data_fetched = False
+        self._changes = {}
+        self._party_tool_instance = party_tool
         self._participants = None
         self._completers = None
 
+    @property
+    def _party_tool(self):
+        """
+        PartyTool for fetching the participant data, created when first needed.
+        """
+        if self._party_tool_instance is None:
+            self._party_tool_instance = PartyTool(self._header)
+        return self._party_tool_instance
+
+    def _field(self, key):
+        """
+        Return the value of the given field in the challenge data.
+
+        The full challenge data is fetched if the field is not present in the
+        data available so far.
+
+        :key: Name of the field in Habitica API challenge data
+        """
+        if key not in self._data and not self._full_data_fetched:
+            with tracing.span("challenge fetch", challenge=self.id):
+                full_data = utils.get_dict_from_api(
+                    self._header,
+                    "https://habitica.com/api/v3/challenges/{}"
+                    "".format(self.id))
+            full_data.update(self._data)
+            self._data = full_data
+            self._full_data_fetched = True
+        return self._data[key]
+
+    def _current(self, key):
+        """
+        Return the local value of the given field, including unsent changes.
+
+        :key: Name of the field in Habitica API challenge data
+        """
+        if key in self._changes:
+            return self._changes[key]
+        return self._field(key)
+
     @property
     def participants(self):
         """
@@ -46,16 +98,93 @@ class Challenge():
         A list of party members who have completed all challenge todo tasks.
         """
         if self._completers is None:
-            self._completers = sorted(self._party_tool.eligible_winners(
-                self.id, self.participants))
+            with tracing.span("challenge completers", challenge=self.id):
+                self._completers = sorted(self._party_tool.eligible_winners(
+                    self.id, self.participants))
         return self._completers
 
+    def verified_completers(self, chat_index, start=None, end=None,
+                            group_id="party"):
+        """
+        Return the completers who have also posted in the party chat.
+
+        Tasks such as "Share a success from the week in party chat" are
+        reported by the participants themselves, so this can be used for
+        checking that they really have posted something.
+
+        :chat_index: A synced ChatIndex containing the party chat
+        :start: Datetime from which chat messages are counted. Defaults to the
+                creation time of the challenge.
+        :end: Datetime until which chat messages are counted. Defaults to no
+              limit.
+        :group_id: ID of the party under which its messages are indexed
+        :returns: A list of Members
+        """
+        if start is None:
+            start = utils.timestamp_to_datetime(self._field("createdAt"))
+        posters = chat_index.posters(start, end, group_id)
+        return [member for member in self.completers if member.id in posters]
+
+    def use_webhook_state(self, state):
+        """
+        Use the todo completions received from webhooks for the completers.
+
+        The participants who are known to have completed all todos based on
+        the webhook events are not polled when determining the completers.
+        The todos of the challenge are fetched for comparing them to the
+        events.
+
+        :state: WebhookState containing the received events
+        :returns: The number of participants whose progress is known
+        """
+        todo_ids = [task.id for task in self.tasks()
+                    if task.tasktype == "todo"]
+        user_ids = state.completers(self.id, todo_ids)
+        self._party_tool.mark_eligible(self.id, user_ids)
+        return len(user_ids)
+
+    def plan_completers(self, plan):
+        """
+        Add the requests made for finding the completers to the given plan.
+
+        The number of participants is taken from the challenge data, so if the
+        challenge was created using data from a challenge listing, no requests
+        are made.
+
+        :plan: RequestPlan to which the requests are added
+        """
+        if self._completers is not None:
+            return
+        if "memberCount" not in self._data and not self._full_data_fetched:
+            plan.add(planner.HABITICA, "GET /challenges/:challengeId")
+        self._party_tool.plan_eligible_winners(plan, self.id,
+                                               self._field("memberCount"))
+
+    def iter_completers(self):
+        """
+        Yield the completers one at a time as soon as they are found.
+
+        Unlike `completers`, the members are not sorted, and participants are
+        fetched one page at a time.
+        """
+        if self._completers is not None:
+            for member in self._completers:
+                yield member
+            return
+        participants = self._participants
+        if participants is None:
+            participants = self._party_tool.iter_challenge_participants(
+                self.id)
+        for member in self._party_tool.iter_eligible_winners(self.id,
+                                                             participants):
+            yield member
+
     @property
     def name(self):
         """
         The name of the challenge.
         """
-        return self._full_data["name"]
+        return self._current("name")
 
     @name.setter
     def name(self, name):
@@ -65,14 +194,14 @@ class Challenge():
         This method only affects the local copy of the challenge: the update()
         method needs to be called to send the changes to Habitica.
         """
-        self._full_data["name"] = name
+        self._changes["name"] = name
 
     @property
     def summary(self):
         """
         The challenge summary.
         """
-        return self._full_data["summary"]
+        return self._current("summary")
 
     @summary.setter
     def summary(self, summary):
@@ -82,14 +211,14 @@ class Challenge():
         This method only affects the local copy of the challenge: the update()
         method needs to be called to send the changes to Habitica.
         """
-        self._full_data["summary"] = summary
+        self._changes["summary"] = summary
 
     @property
     def description(self):
         """
         The challenge description.
         """
-        return self._full_data["description"]
+        return self._current("description")
 
     @description.setter
     def description(self, description):
@@ -99,18 +228,31 @@ class Challenge():
         This method only affects the local copy of the challenge: the update()
         method needs to be called to send the changes to Habitica.
         """
-        self._full_data["description"] = description
+        self._changes["description"] = description
 
     def update(self):
         """
-        Update the name, description and summary of the challenge.
+        Send changes in the name, description and summary to Habitica.
+
+        Only the fields that differ from the data last received from Habitica
+        are sent. If nothing has changed, no request is made at all.
+
+        If sending the changes fails, they are kept, so that they are sent
+        again by the next update.
+
+        :returns: True if changes were sent, otherwise False
         """
-        new_data = {"name": self.name,
-                    "description": self.description,
-                    "summary": self.summary}
+        changed = {key: value for key, value in self._changes.items()
+                   if key not in self._data or self._data[key] != value}
+        if not changed:
+            self._changes = {}
+            return False
         habrequest.put(
             "https://habitica.com/api/v3/challenges/{}".format(self.id),
-            data=new_data, headers=self._header)
+            data=changed, headers=self._header)
+        self._data.update(changed)
+        self._changes = {}
+        return True
 
     def completer_str(self):
         """
@@ -126,7 +268,7 @@ class Challenge():
                            for member in self.completers]
         return intro + "\n".join(completer_lines)
 
-    def random_winner(self, date=None, stock=None):
+    def random_winner(self, date=None, stock=None, randomizer=None):
         """
         Pick a winner for the challenge.
 
@@ -138,17 +280,20 @@ class Challenge():
         :stock: Stock to use, e.g. "^AEX". Make sure that the stock has already
                 closed for the day used: otherwise the result might still
                 change.
-        :returns: The Member who won the challenge
+        :randomizer: An already-initialized randomizer to use instead of
+                     creating a new one based on date and stock.
+        :returns: The Member who won the challenge, or None if nobody
+                  completed it
         """
-        if date and stock:
-            randomizer = StockRandomizer(stock, date)
-        else:
-            randomizer = BasicRandomizer()
+        if not self.completers:
+            return None
+        if randomizer is None:
+            randomizer = _randomizer(date, stock)
 
         winner_index = randomizer.pick_integer(0, len(self.completers) - 1)
         return self.completers[winner_index]
 
-    def winner_str(self, date, stock):
+    def winner_str(self, date, stock, randomizer=None, winner=None):
         """
         Pick a winner as `winner` does, but return a string.
 
@@ -163,19 +308,26 @@ class Challenge():
         :stock: Stock to use, e.g. "^AEX". Make sure that the stock has already
                 closed for the day used: otherwise the result might still
                 change.
+        :randomizer: An already-initialized randomizer to use instead of
+                     creating a new one based on date and stock.
+        :winner: The Member already picked using the randomizer, if any. The
+                 winner is then described instead of picking one again.
         :returns: A string describing the process.
         """
-        if date and stock:
-            randomizer = StockRandomizer(stock, date)
+        if randomizer is None:
+            randomizer = _randomizer(date, stock)
+        if isinstance(randomizer, StockRandomizer):
             intro = (
-                f"Using stock data for {date} from {stock} (seed "
-                f"{randomizer.seed}).\n\n"
+                f"Using stock data for {randomizer.date} from "
+                f"{randomizer.ticker} (seed {randomizer.seed}).\n\n"
             )
         else:
-            randomizer = BasicRandomizer()
             intro = ""
 
-        winner = self.random_winner(date, stock)
+        if winner is None:
+            winner = self.random_winner(randomizer=randomizer)
+        if winner is None:
+            return intro + "Nobody completed the challenge, so nobody wins."
         return intro + "{} wins the challenge!".format(winner)
 
     def award_winner(self, winner):
@@ -213,6 +365,85 @@ class Challenge():
             data=taskdata, headers=self._header)
         resp.raise_for_status()
 
+    def add_tasks(self, tasks):
+        """
+        Add all the given tasks to this challenge using a single request.
+
+        The IDs of the created tasks are stored in the `id` attribute of the
+        given Task objects.
+
+        :tasks: An iterable of Task objects
+        """
+        Task.create_many_to_challenge(tasks, self.id, self._header)
+
+    def tasks(self):
+        """
+        Fetch the current tasks of this challenge.
+
+        :returns: A list of Tasks
+        """
+        task_data = utils.get_dict_from_api(
+            self._header,
+            "https://habitica.com/api/v3/tasks/challenge/{}".format(self.id))
+        return [Task.from_api(task) for task in task_data]
+
+    def sync_tasks(self, desired_tasks):
+        """
+        Make the tasks of this challenge match the given ones.
+
+        The current tasks are fetched once and compared to the desired ones
+        as described in `task.task_diff`. Then only the needed requests are
+        made: all missing tasks are created using a single request, and
+        changed tasks are updated and extra tasks deleted one by one. If the
+        challenge already has the desired tasks, nothing is sent.
+
+        :desired_tasks: An iterable of Tasks the challenge should have. Use
+                        `Task.from_api` to create them from templates such as
+                        the ones in conf/tasks.py.
+        :returns: A tuple of (created, updated, deleted) lists of Tasks
+        """
+        to_create, to_update, to_delete = task_diff(self.tasks(),
+                                                    desired_tasks)
+        self.add_tasks(to_create)
+        for task, changes in to_update:
+            task.update(self._header, changes)
+        for task in to_delete:
+            task.delete(self._header)
+        return (to_create, [task for task, _ in to_update], to_delete)
+
+
+def _randomizer(date, stock):
+    """
+    Return a StockRandomizer if date and stock are given, else a basic one.
+    """
+    if date and stock:
+        return StockRandomizer(stock, date)
+    return BasicRandomizer()
+
+
+def draw_winners(challenges, date, stock):
+    """
+    Pick winners for multiple challenges using a single stock data fetch.
+
+    Each challenge gets its own randomizer initialized with the same seed, so
+    the winner of each challenge is the same as it would be if the challenge
+    was drawn alone using `Challenge.random_winner`.
+
+    :challenges: An iterable of Challenges
+    :date: Date object representing the date from which to use the stock data.
+    :stock: Stock to use, e.g. "^AEX". Make sure that the stock has already
+            closed for the day used: otherwise the result might still change.
+    :returns: A tuple of (seed, winners) where winners is a list containing the
+              winning Member for each challenge, or None for challenges
+              nobody completed, in the same order as the challenges were
+              given.
+    """
+    seed = StockRandomizer(stock, date).seed
+    winners = [challenge.random_winner(
+                   randomizer=StockRandomizer(stock, date, seed=seed))
+               for challenge in challenges]
+    return (seed, winners)
+
 
 class ChallengeTool(object):
     """
@@ -247,6 +478,6 @@ class ChallengeTool(object):
         resp = habrequest.post("https://habitica.com/api/v3/challenges",
                                headers=self._header, data=data)
         resp.raise_for_status()
-        challenge_id = resp.json()["data"]["id"]
+        challenge_data = resp.json()["data"]
 
-        return Challenge(self._header, challenge_id)
+        return Challenge(self._header, challenge_data["id"], challenge_data)
@@ -0,0 +1,142 @@
+"""
+A local index of group chat messages.
+
+Habitica only returns the newest messages of a group chat, so the messages are
+fetched regularly and stored in a local SQLite database. Each fetch only adds
+the messages newer than the newest already-indexed one, and the messages are
+indexed by their author and time, so that e.g. finding out who posted in the
+party chat during a weekend doesn't require going through the chat history.
+"""
+
+import datetime
+
+from habitica_helper import storage
+from habitica_helper import utils
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    group_id TEXT NOT NULL,
+    user_id TEXT,
+    username TEXT,
+    timestamp INTEGER NOT NULL,
+    text TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_by_user
+    ON messages (group_id, user_id, timestamp);
+CREATE INDEX IF NOT EXISTS messages_by_time
+    ON messages (group_id, timestamp);
+"""
+
+
+class ChatIndex():
+    """
+    Chat messages of Habitica groups, stored in a SQLite database.
+    """
+
+    def __init__(self, path=":memory:"):
+        """
+        Open the index, creating it if it doesn't exist yet.
+
+        :path: Path of the database file
+        """
+        self._connection = storage.connect(path, _SCHEMA)
+
+    def close(self):
+        """
+        Close the database.
+        """
+        self._connection.close()
+
+    def _newest_id(self, group_id):
+        """
+        Return the ID of the newest indexed message in the group, or None.
+        """
+        row = self._connection.execute(
+            "SELECT id FROM messages WHERE group_id = ? "
+            "ORDER BY timestamp DESC LIMIT 1", (group_id,)).fetchone()
+        return row[0] if row else None
+
+    def add(self, messages, group_id="party"):
+        """
+        Add the given messages to the index.
+
+        Messages that are already in the index are ignored.
+
+        :messages: An iterable of chat message dicts as returned by Habitica
+        :group_id: ID of the group, or "party" for the party of the user
+        """
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO messages VALUES (?, ?, ?, ?, ?, ?)",
+                [(message["id"], group_id, message.get("uuid"),
+                  message.get("username"),
+                  storage.milliseconds(message["timestamp"]),
+                  message.get("text"))
+                 for message in messages])
+
+    def sync(self, header, group_id="party"):
+        """
+        Add the messages posted after the newest indexed one to the index.
+
+        Habitica returns only the newest messages of each chat (200 for
+        parties), so any older messages posted since the previous sync are
+        missed if the sync isn't run often enough.
+
+        :header: Habitica API header
+        :group_id: ID of the group, or "party" for the party of the user
+        :returns: The number of new messages
+        """
+        messages = utils.get_dict_from_api(
+            header,
+            "https://habitica.com/api/v3/groups/{}/chat".format(group_id))
+        newest_id = self._newest_id(group_id)
+        new_messages = []
+        for message in sorted(messages,
+                              key=lambda message: storage.milliseconds(
+                                  message["timestamp"]),
+                              reverse=True):
+            if message["id"] == newest_id:
+                break
+            new_messages.append(message)
+        self.add(new_messages, group_id)
+        return len(new_messages)
+
+    def posters(self, start, end=None, group_id="party"):
+        """
+        Return the IDs of users who posted in the chat during the given time.
+
+        :start: Datetime from which messages are included
+        :end: Datetime until which messages are included (not inclusive).
+              Defaults to no limit.
+        :group_id: ID of the group, or "party" for the party of the user
+        :returns: A set of user IDs
+        """
+        end_ms = storage.milliseconds(end) if end is not None else 2**63 - 1
+        rows = self._connection.execute(
+            "SELECT DISTINCT user_id FROM messages WHERE group_id = ? "
+            "AND timestamp >= ? AND timestamp < ?",
+            (group_id, storage.milliseconds(start), end_ms))
+        return {user_id for user_id, in rows}
+
+    def messages_by(self, user_id, start, end=None, group_id="party"):
+        """
+        Return the messages the given user posted during the given time.
+
+        :user_id: ID of the user
+        :start: Datetime from which messages are included
+        :end: Datetime until which messages are included (not inclusive).
+              Defaults to no limit.
+        :group_id: ID of the group, or "party" for the party of the user
+        :returns: A list of (UTC datetime, text) tuples, oldest first
+        """
+        end_ms = storage.milliseconds(end) if end is not None else 2**63 - 1
+        rows = self._connection.execute(
+            "SELECT timestamp, text FROM messages WHERE group_id = ? "
+            "AND user_id = ? AND timestamp >= ? AND timestamp < ? "
+            "ORDER BY timestamp",
+            (group_id, user_id, storage.milliseconds(start), end_ms))
+        epoch = datetime.datetime(1970, 1, 1)
+        return [(epoch + datetime.timedelta(milliseconds=timestamp), text)
+                for timestamp, text in rows]
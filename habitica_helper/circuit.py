@@ -0,0 +1,120 @@
+"""
+Circuit breakers for failing fast during outages of remote services.
+
+When a service is down, every request to it waits for its own failure, and a
+command making hundreds of requests can hang for a long time. A circuit
+breaker counts consecutive failures, and after FAILURE_THRESHOLD of them it
+opens: further calls fail immediately with CircuitOpenError without contacting
+the service. Once COOLDOWN seconds have passed, a single call is let through
+as a probe. If the probe succeeds, the circuit closes again, and if it fails,
+the circuit stays open for another cool-down. Other calls made while the probe
+is in progress fail fast too.
+"""
+
+import threading
+import time
+
+import requests
+
+
+# Number of consecutive failures after which a circuit opens
+FAILURE_THRESHOLD = 5
+
+# Seconds after which an open circuit lets a probe through
+COOLDOWN = 30
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised instead of calling a service whose circuit breaker is open.
+    """
+
+
+class CircuitBreaker():
+    """
+    Book-keeping of the recent failures of calls to a service.
+    """
+
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD,
+                 cooldown=COOLDOWN):
+        """
+        :name: Name of the service, used in error messages
+        :failure_threshold: Number of consecutive failures after which the
+                            circuit opens
+        :cooldown: Seconds after which an open circuit lets a probe through
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def before(self):
+        """
+        Check that a call may be made, raising CircuitOpenError if not.
+
+        If the cool-down has passed, the call is let through as the probe, and
+        its result must be reported using `succeeded` or `failed`.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if (self._probing
+                    or time.time() - self._opened_at < self.cooldown):
+                raise CircuitOpenError(
+                    "{} is unavailable after {} consecutive failures, not "
+                    "retrying yet".format(self.name, self._failures))
+            self._probing = True
+
+    def succeeded(self):
+        """
+        Record a successful call, closing the circuit.
+        """
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def failed(self):
+        """
+        Record a failed call, opening the circuit if needed.
+        """
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.time()
+                self._probing = False
+
+    def abandoned(self):
+        """
+        Record a call that was interrupted before it finished.
+
+        Nothing is learned about the service, but if the call was the probe,
+        the next call is let through as a new probe.
+        """
+        with self._lock:
+            self._probing = False
+
+    def call(self, func, is_failure, *args, **kwargs):
+        """
+        Call the given function through the circuit breaker.
+
+        :func: Function making the call to the service
+        :is_failure: Function returning True if the given exception raised by
+                     func means that the service is unavailable. Other
+                     exceptions count as successful calls.
+        :returns: Return value of func
+        """
+        self.before()
+        report = self.abandoned
+        try:
+            result = func(*args, **kwargs)
+            report = self.succeeded
+            return result
+        except Exception as err:
+            report = self.failed if is_failure(err) else self.succeeded
+            raise
+        finally:
+            report()
@@ -0,0 +1,295 @@
+"""
+A long-running server process for running command-line commands.
+
+Starting a new process for every command means paying for interpreter
+startup, imports, new HTTPS connections and empty caches every time. The
+server keeps a warm process that runs the commands it receives over a local
+Unix socket, and streams their output back to the thin client.
+
+The protocol is simple: the client sends a JSON object on one line, containing
+the command-line arguments, its working directory and its environment
+variables. The server runs the command in that directory and environment, so
+relative paths and settings given as environment variables mean the same as
+when running the command without the server. The server responds with the
+output of the command followed by a NUL byte and the exit code of the command.
+
+As the client sends its environment, which contains e.g. credentials, the
+socket is kept in a directory only accessible for the current user, and the
+client only talks to a server run by the same user.
+"""
+
+import contextlib
+import io
+import json
+import os
+import socket
+import socketserver
+import stat
+import struct
+import sys
+import tempfile
+import traceback
+
+import click
+
+
+def default_socket_path():
+    """
+    Return the path of the socket, unique for each user.
+
+    The socket is in the per-user runtime directory (XDG_RUNTIME_DIR) if there
+    is one, and otherwise in a directory of its own in the temp directory. The
+    path can be overridden using HHELPER_SOCKET environment variable.
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if not runtime_dir:
+        runtime_dir = os.path.join(tempfile.gettempdir(),
+                                   "hhelper-{}".format(os.getuid()))
+    return os.environ.get("HHELPER_SOCKET",
+                          os.path.join(runtime_dir, "hhelper.sock"))
+
+
+def _check_private_directory(path):
+    """
+    Create the directory of the socket if needed, and check that it is safe.
+
+    :path: Path of the directory
+    :raises RuntimeError: If the directory belongs to another user, is a
+                          symlink or can be written by other users
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    status = os.lstat(path)
+    if (not stat.S_ISDIR(status.st_mode) or status.st_uid != os.getuid()
+            or status.st_mode & 0o022):
+        raise RuntimeError("{} must be a directory that only the current user "
+                           "can write to".format(path))
+
+
+def _server_uid(client, socket_path):
+    """
+    Return the ID of the user running the server the client is connected to.
+
+    The credentials of the peer are used where available, and otherwise the
+    owner of the socket.
+    """
+    if hasattr(socket, "SO_PEERCRED"):
+        credentials = client.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+                                        struct.calcsize("3i"))
+        return struct.unpack("3i", credentials)[1]
+    return os.stat(socket_path).st_uid
+
+
+def run_command(command, args, output):
+    """
+    Run the given click command with args, writing its output to output.
+
+    :command: The click command or group to run
+    :args: List of command-line arguments
+    :output: Text stream to which the output is written
+    :returns: Exit code of the command
+    """
+    with contextlib.redirect_stdout(output), \
+            contextlib.redirect_stderr(output):
+        return invoke(command, args, output)
+
+
+def invoke(command, args, output):
+    """
+    Run the given click command with args, reporting errors to output.
+
+    Unlike `run_command`, this doesn't redirect stdout, so the normal output
+    of the command goes wherever sys.stdout points to.
+
+    :command: The click command or group to run
+    :args: List of command-line arguments
+    :output: Text stream to which error messages are written
+    :returns: Exit code of the command
+    """
+    # pylint: disable=broad-except
+    try:
+        command.main(args, prog_name="hhelper.py", standalone_mode=False)
+    except click.ClickException as err:
+        err.show(file=output)
+        return err.exit_code
+    except click.exceptions.Exit as err:
+        return err.exit_code
+    except click.Abort:
+        output.write("Aborted!\n")
+        return 1
+    except SystemExit as err:
+        if err.code is None or isinstance(err.code, int):
+            return err.code or 0
+        output.write("{}\n".format(err.code))
+        return 1
+    except Exception:
+        traceback.print_exc(file=output)
+        return 1
+    return 0
+
+
+@contextlib.contextmanager
+def _client_context(cwd, environment):
+    """
+    Use the working directory and environment of the client temporarily.
+
+    Commands are run one at a time, so changing them for the whole process
+    doesn't affect other commands.
+    """
+    old_cwd = os.getcwd()
+    old_environment = dict(os.environ)
+    os.chdir(cwd)
+    os.environ.clear()
+    os.environ.update(environment)
+    try:
+        yield
+    finally:
+        os.chdir(old_cwd)
+        os.environ.clear()
+        os.environ.update(old_environment)
+
+
+class _CommandHandler(socketserver.StreamRequestHandler):
+    """
+    Run a command received from a client and stream its output back.
+    """
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            # A client checking whether the server is running
+            return
+        request = json.loads(line.decode("utf-8"))
+        output = io.TextIOWrapper(self.wfile, encoding="utf-8",
+                                  line_buffering=True, write_through=True)
+        try:
+            with _client_context(request["cwd"], request["env"]):
+                exit_code = run_command(self.server.command, request["args"],
+                                        output)
+        except OSError as err:
+            output.write("Cannot use the working directory {}: {}\n".format(
+                request["cwd"], err))
+            exit_code = 1
+        output.flush()
+        output.detach()
+        self.wfile.write("\0{}".format(exit_code).encode("utf-8"))
+
+
+def is_running(socket_path=None):
+    """
+    Return True if a server is listening to the socket.
+
+    :socket_path: Path of the Unix socket. Defaults to
+                  `default_socket_path()`.
+    """
+    socket_path = socket_path or default_socket_path()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            return False
+    return True
+
+
+def make_server(command, socket_path=None):
+    """
+    Return a server that runs the given command for each client.
+
+    The commands are run one at a time, so their API use does not overlap.
+    The socket is only accessible for the current user, as the commands run
+    with their credentials, and its directory is created if needed.
+
+    :command: The click command or group to run
+    :socket_path: Path of the Unix socket. Defaults to
+                  `default_socket_path()`.
+    :raises RuntimeError: If another server is already listening to the
+                          socket, or if other users can write to the
+                          directory of the socket
+    """
+    socket_path = socket_path or default_socket_path()
+    _check_private_directory(os.path.dirname(os.path.abspath(socket_path)))
+    if is_running(socket_path):
+        raise RuntimeError("A daemon is already listening to {}"
+                           "".format(socket_path))
+    if os.path.exists(socket_path):
+        # The socket was left behind by a daemon that is no longer running
+        os.unlink(socket_path)
+    old_umask = os.umask(0o177)
+    try:
+        server = socketserver.UnixStreamServer(socket_path, _CommandHandler)
+    finally:
+        os.umask(old_umask)
+    server.command = command
+    return server
+
+
+def serve(command, socket_path=None):
+    """
+    Run commands received from clients until interrupted.
+
+    :command: The click command or group to run
+    :socket_path: Path of the Unix socket. Defaults to
+                  `default_socket_path()`.
+    """
+    socket_path = socket_path or default_socket_path()
+    server = make_server(command, socket_path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(socket_path)
+
+
+def forward(args, socket_path=None, output=None):
+    """
+    Run a command in the server and stream its output.
+
+    The command is run in the current working directory and environment.
+    Nothing is sent to a server run by another user.
+
+    :args: List of command-line arguments
+    :socket_path: Path of the Unix socket. Defaults to
+                  `default_socket_path()`.
+    :output: Binary stream to which the output is written. Defaults to
+             stdout.
+    :returns: Exit code of the command, or None if no server of the current
+              user is running
+    """
+    socket_path = socket_path or default_socket_path()
+    if output is None:
+        output = sys.stdout.buffer
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        client.close()
+        return None
+    if _server_uid(client, socket_path) != os.getuid():
+        client.close()
+        sys.stderr.write("Not using {}, as it belongs to another user.\n"
+                         "".format(socket_path))
+        return None
+
+    with client:
+        request = {"args": args, "cwd": os.getcwd(), "env": dict(os.environ)}
+        client.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        received = b""
+        while True:
+            chunk = client.recv(4096)
+            if not chunk:
+                break
+            received += chunk
+            # Everything up to a possible NUL byte is output of the command
+            end = received.find(b"\0")
+            if end == -1:
+                output.write(received)
+                output.flush()
+                received = b""
+            else:
+                output.write(received[:end])
+                output.flush()
+                received = received[end:]
+    if not received.startswith(b"\0"):
+        return 1
+    return int(received[1:].decode("utf-8"))
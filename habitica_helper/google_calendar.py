@@ -1,13 +1,41 @@
 """
 Functionality for interacting with Google calendar.
+
+The Google API client libraries are slow to import, so they are imported only
+when a calendar is actually used.
+
+Calls to the calendar API go through a circuit breaker shared by all calendars,
+so that during Google outages they fail fast with CircuitOpenError.
 """
 from __future__ import print_function
 import datetime
 import pickle
 import os.path
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+
+from habitica_helper.circuit import CircuitBreaker
+from habitica_helper import tracing
+
+_CIRCUIT = CircuitBreaker("Google calendar")
+
+
+def _is_outage(error):
+    """
+    Return True if the error raised by an API call means Google is unavailable.
+    """
+    # pylint: disable=import-outside-toplevel
+    from googleapiclient.errors import HttpError
+    from httplib2 import HttpLib2Error
+
+    if isinstance(error, HttpError):
+        return error.resp.status >= 500
+    return isinstance(error, (OSError, HttpLib2Error))
+
+
+def _execute(request):
+    """
+    Execute a Google API request through the circuit breaker.
+    """
+    return _CIRCUIT.call(request.execute, _is_outage)
 
 class GoogleCalendar():
     """
@@ -17,10 +45,16 @@ class GoogleCalendar():
     client_secret_path = "conf/secrets/googlecredentials.json"
     credentials = None
 
+    @tracing.traced("calendar connection")
     def __init__(self, calendar_id):
         """
         Ensure that we have credentials for accessing the calendar.
         """
+        # pylint: disable=import-outside-toplevel
+        from googleapiclient.discovery import build
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        from google.auth.transport.requests import Request
+
         self.calendar_id = calendar_id
 
         if os.path.exists(self.credential_path):
@@ -72,8 +106,9 @@ class GoogleCalendar():
                 "date": self._date_timestamp(date),
                 },
             }
-        self.service.events().insert(calendarId=self.calendar_id,
-                                     body=new_event).execute()
+        with tracing.span("calendar event insertion"):
+            _execute(self.service.events().insert(calendarId=self.calendar_id,
+                                                  body=new_event))
 
     def events_for_date(self, date):
         """
@@ -85,12 +120,14 @@ class GoogleCalendar():
         next_page = None
         events = []
         while True:
-            new_events = self.service.events().list(
-                calendarId=self.calendar_id,
-                pageToken=next_page,
-                timeMin=self._datetime_timestamp(date),
-                timeMax=self._datetime_timestamp(date + datetime.timedelta(days=1)),
-                ).execute()
+            with tracing.span("calendar event listing", date=str(date)):
+                new_events = _execute(self.service.events().list(
+                    calendarId=self.calendar_id,
+                    pageToken=next_page,
+                    timeMin=self._datetime_timestamp(date),
+                    timeMax=self._datetime_timestamp(
+                        date + datetime.timedelta(days=1)),
+                    ))
             events = events + new_events['items']
 
             next_page = new_events.get('nextPageToken')
@@ -101,7 +138,8 @@ class GoogleCalendar():
         """
         Updates an event with event ID matching to the given one.
         """
-        self.service.events().update(
-            calendarId=self.calendar_id,
-            eventId=event["id"],
-            body=event).execute()
+        with tracing.span("calendar event update"):
+            _execute(self.service.events().update(
+                calendarId=self.calendar_id,
+                eventId=event["id"],
+                body=event))
@@ -7,82 +7,215 @@ https://habitica.fandom.com/wiki/Guidance_for_Comrades#Rules_for_API_Calls
 
 from __future__ import print_function
 
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import date
+import fnmatch
+import threading
 
 from habitica_helper.google_calendar import GoogleCalendar
 from habitica_helper import habrequest
 from habitica_helper.member import Member
+from habitica_helper import planner
+from habitica_helper import tracing
 from habitica_helper import utils
 
 
-class PartyTool(object):
+class GroupTool(object):
     """
-    A class that provides methods for doing party-related things.
+    A class that provides methods for doing group-related things.
+
+    The group can be the party or any guild the user belongs to.
+
+    The challenge listing, challenge participants, their eligibility for
+    winning and the member profiles fetched by the tool are cached, so that
+    e.g. a member participating in multiple challenges is only fetched once.
+    For large groups the member cache can be disabled to keep memory use
+    bounded when streaming through the members. The tool can be shared
+    between threads.
     """
 
-    def __init__(self, header):
+    def __init__(self, header, group_id, cache_members=True):
         """
         Initialize the class.
 
         :header: Habitica requires specific fields to be present in all API
                  calls. This dict must contain them.
+        :group_id: ID of the group, or "party" for the party of the user
+        :cache_members: Whether fetched members are kept in memory
         """
         self._header = header
+        self.group_id = group_id
+        self._real_group_id = None if group_id == "party" else group_id
+        self._cache_members = cache_members
+        self._description = None
+        self._member_count = None
+        self._challenges = None
+        self._members = {}
+        self._member_lock = threading.Lock()
+        self._calendars = {}
+        self._participants = {}
+        self._eligibility = {}
+
+    def _group_url(self):
+        """
+        Return the API URL of the group.
+        """
+        return "https://habitica.com/api/v3/groups/{}".format(self.group_id)
 
-    def party_description(self):
+    def group_data(self):
         """
-        Return the description of the party
+        Fetch the data of the group.
+
+        :returns: A dict representing the group
         """
-        data = utils.get_dict_from_api(
-                self._header,
-                "https://habitica.com/api/v3/groups/party")
-        return data["description"]
+        data = utils.get_dict_from_api(self._header, self._group_url())
+        self._real_group_id = data.get("id", self._real_group_id)
+        self._description = data.get("description", self._description)
+        self._member_count = data.get("memberCount", self._member_count)
+        return data
 
-    def update_party_description(self, new_description, user_id=None,
-                                 api_token=None):
+    def real_group_id(self):
         """
-        Set the given string as the party description.
+        Return the ID of the group, even if the tool was created for "party".
+
+        The ID of the party is only fetched if no group data has been fetched
+        by this tool yet.
+        """
+        if self._real_group_id is None:
+            self.group_data()
+        return self._real_group_id
+
+    def plan_real_group_id(self, plan):
+        """
+        Add the request made by `real_group_id` to the plan.
+
+        :plan: RequestPlan to which the requests are added
+        """
+        if self._real_group_id is None:
+            plan.add(planner.HABITICA, "GET /groups/:groupId")
+
+    def description(self):
+        """
+        Return the description of the group
+        """
+        return self.group_data()["description"]
+
+    def update_description(self, new_description, user_id=None,
+                           api_token=None):
+        """
+        Set the given string as the group description.
 
         Allows giving user ID and API token that differ from ones in the header
         used for other actions. If they are not provided, the header given when
         creating the object is used as is.
+
+        The new description is only sent if it differs from the current one.
+        The description last fetched or set using this tool is used as the
+        current one, and if there is none, the current description is fetched,
+        as a fetch doesn't change anything in Habitica unlike an update.
+
+        :returns: True if the description was sent to Habitica, otherwise
+                  False
         """
+        if self._description is None:
+            self.description()
+        if new_description == self._description:
+            return False
+
         header = self._header.copy()
         if user_id:
             header["x-api-user"] = user_id
             header["x-api-key"] = api_token
 
-        response = habrequest.put("https://habitica.com/api/v3/groups/party",
+        response = habrequest.put(self._group_url(),
                                   header,
                                   data={"description": new_description})
         response.raise_for_status()
+        self._description = new_description
+        return True
 
-    def _fetch_all_ids(self, url, pagelimit):
+    def _iter_ids(self, url, pagelimit, phase="pagination"):
         """
-        Return all user IDs returned by url, even from multiple pages.
+        Yield all user IDs returned by url, even from multiple pages.
 
         If not all users fit into one page returned by Habitica, a new query is
-        run for the next page of users until all have been found.
+        run for the next page of users when the previous page has been
+        consumed, so only one page is held in memory at a time.
 
         :url: Habitica API url for the interesting query
         :pagelimit: Maximum number of returned items per request.
+        :phase: Name of the tracing span recorded for fetching each page
         """
-        user_ids = []
         last_id = None
         current_url = url
         while True:
             if last_id:
                 current_url = "{}?lastId={}".format(url, last_id)
-            data = utils.get_dict_from_api(self._header, current_url)
+            with tracing.span(phase, url=current_url):
+                data = utils.get_dict_from_api(self._header, current_url)
 
             for user in data:
-                user_ids.append(user["id"])
+                yield user["id"]
             if len(data) < pagelimit:
                 break
             else:
                 last_id = data[len(data) - 1]["id"]
 
-        return user_ids
+    def _fetch_all_ids(self, url, pagelimit):
+        """
+        Return all user IDs returned by url, even from multiple pages.
+
+        :url: Habitica API url for the interesting query
+        :pagelimit: Maximum number of returned items per request.
+        """
+        return list(self._iter_ids(url, pagelimit))
+
+    def challenges(self):
+        """
+        Return a list of all challenges in the group.
+
+        The challenge list is fetched only once per tool.
+
+        :returns: A list of dicts representing the challenges
+        """
+        if self._challenges is None:
+            with tracing.span("challenge lookup", group=self.group_id):
+                self._challenges = utils.get_dict_from_api(
+                    self._header,
+                    "https://habitica.com/api/v3/challenges/groups/{}"
+                    "".format(self.group_id))
+        return self._challenges
+
+    def member(self, user_id):
+        """
+        Return a Member for the given user.
+
+        If members are cached, each member is fetched from the API only once,
+        even if requested by several threads at the same time.
+
+        :user_id: User ID of the member
+        :returns: A Member object
+        """
+        if not self._cache_members:
+            with tracing.span("member resolution", user=user_id):
+                return Member(user_id, header=self._header)
+
+        with self._member_lock:
+            future = self._members.get(user_id)
+            fetch = future is None
+            if fetch:
+                future = Future()
+                self._members[user_id] = future
+        if fetch:
+            try:
+                with tracing.span("member resolution", user=user_id):
+                    member = Member(user_id, header=self._header)
+                future.set_result(member)
+            except Exception as err:  # pylint: disable=broad-except
+                with self._member_lock:
+                    del self._members[user_id]
+                future.set_exception(err)
+        return future.result()
 
     def newest_matching_challenge(self, must_haves, no_gos):
         """
@@ -97,9 +230,7 @@ class PartyTool(object):
         :no_gos: iterable of strings that must not be present in the name
         :returns: A dict representing the newest matching challenge
         """
-        challenges = utils.get_dict_from_api(
-            self._header,
-            "https://habitica.com/api/v3/challenges/groups/party")
+        challenges = self.challenges()
 
         matching_challenge = None
         for challenge in challenges:
@@ -125,28 +256,77 @@ class PartyTool(object):
 
         return matching_challenge
 
-    def current_sharing_weekend(self):
+    def challenges_matching_pattern(self, pattern):
         """
-        Return the current sharing weekend challenge.
+        Return the challenges whose name matches the given pattern.
 
-        The challenge is chosen based on the title containing words "Sharing
-        Weekend Challenge" but not "TEMPLATE". If there are multiple, the one
-        that has the most recent "created at" is returned.
-
-        :returns: A dict representing the newest Sharing Weekend Challenge
+        :pattern: Shell-style pattern such as "Sharing Weekend *", matched
+                  case-sensitively against the whole name
+        :returns: A list of dicts representing the matching challenges, the
+                  newest first
         """
-        return self.newest_matching_challenge(
-            ["Sharing Weekend"], ["TEMPLATE", "template", "Template"])
-
-    def challenge_participants(self, challenge_id):
+        matching = [challenge for challenge in self.challenges()
+                    if fnmatch.fnmatchcase(challenge["name"], pattern)]
+        return sorted(
+            matching, reverse=True,
+            key=lambda challenge: utils.timestamp_to_datetime(
+                challenge["createdAt"]))
+
+    def iter_challenge_participants(self, challenge_id):
         """
-        Return a list of user_id's of all challenge participants.
+        Yield the user_id's of all challenge participants, page by page.
         """
         url = "https://habitica.com/api/v3/challenges/{}/members".format(
             challenge_id
             )
 
-        return self._fetch_all_ids(url, 30)
+        return self._iter_ids(url, 30, phase="participant pagination")
+
+    def challenge_participants(self, challenge_id):
+        """
+        Return a list of user_id's of all challenge participants.
+
+        The participants of each challenge are fetched only once per tool.
+        """
+        if challenge_id not in self._participants:
+            self._participants[challenge_id] = list(
+                self.iter_challenge_participants(challenge_id))
+        return self._participants[challenge_id]
+
+    def iter_eligible_winners(self, challenge_id, user_ids):
+        """
+        Yield the eligible challenge winners one at a time.
+
+        See `eligible_winners` for the eligibility criteria.
+
+        :challenge_id: ID of challenge for which eligibility is assessed.
+        :user_ids: An iterable of IDs for users whose eligibility is to be
+                   tested.
+        """
+        for user_id in user_ids:
+            key = (challenge_id, user_id)
+            if key not in self._eligibility:
+                with tracing.span("eligibility check", user=user_id):
+                    progress_dict = utils.get_dict_from_api(
+                        self._header,
+                        "https://habitica.com/api/v3/challenges/{}/members/{}"
+                        "".format(challenge_id, user_id))
+                self._eligibility[key] = completed_all_todos(progress_dict)
+            if self._eligibility[key]:
+                yield self.member(user_id)
+
+    def mark_eligible(self, challenge_id, user_ids):
+        """
+        Record the given users as eligible winners without checking them.
+
+        This allows using completions known from other sources, such as
+        webhook events, so that the progress of these users is not fetched.
+
+        :challenge_id: ID of the challenge
+        :user_ids: An iterable of IDs of users who have completed all todos
+        """
+        for user_id in user_ids:
+            self._eligibility[(challenge_id, user_id)] = True
 
     def eligible_winners(self, challenge_id, user_ids):
         """
@@ -157,34 +337,123 @@ class PartyTool(object):
 
         :challenge_id: ID of challenge for which eligibility is assessed.
         :user_ids: A list of IDs for users whose eligibility is to be tested.
-        :returns: A Member object.
+        :returns: A list of Member objects.
         """
-        eligible_winners = []
-        for user_id in user_ids:
-            progress_dict = utils.get_dict_from_api(
-                self._header,
-                "https://habitica.com/api/v3/challenges/{}/members/{}"
-                "".format(challenge_id, user_id))
-            eligible = True
-            for task in progress_dict["tasks"]:
-                if task["type"] == "todo" and not task["completed"]:
-                    eligible = False
-            if eligible:
-                eligible_winners.append(Member(user_id, header=self._header))
-        return eligible_winners
+        return list(self.iter_eligible_winners(challenge_id, user_ids))
 
-    def party_members(self):
+    def iter_members(self):
         """
-        Return a list of all party members.
+        Yield all group members one at a time.
+
+        Member IDs are fetched one page at a time, and each member is fetched
+        only when the previous one has been consumed.
+        """
+        for member_id in self._iter_ids(
+                "{}/members".format(self._group_url()), 30,
+                phase="member pagination"):
+            yield self.member(member_id)
+
+    def members(self):
+        """
+        Return a list of all group members.
 
         :returns: A list of Member objects.
         """
-        member_ids = self._fetch_all_ids(
-            "https://habitica.com/api/v3/groups/party/members",
-            30)
-        return [Member(member_id, header=self._header) for member_id in
-                member_ids]
+        return list(self.iter_members())
+
+    def plan_challenge_lookup(self, plan):
+        """
+        Add the requests made for finding challenges by name to the plan.
 
+        The challenge listing is fetched, as the plans for the challenges are
+        based on the member counts in it.
+
+        :plan: RequestPlan to which the requests are added
+        :returns: A list of dicts representing the challenges
+        """
+        if self._challenges is None:
+            plan.add(planner.HABITICA, "GET /challenges/groups/:groupId")
+        return self.challenges()
+
+    def plan_eligible_winners(self, plan, challenge_id, participant_count):
+        """
+        Add the requests made by `eligible_winners` for a challenge.
+
+        Already-fetched participants, eligibility checks and members are not
+        fetched again, so they are not included. As it is not known in advance
+        who have completed the challenge, every participant not known to be
+        ineligible is assumed to be fetched.
+
+        :plan: RequestPlan to which the requests are added
+        :challenge_id: ID of the challenge
+        :participant_count: Number of participants in the challenge, e.g. the
+                            "memberCount" in the challenge listing. Only used
+                            if the participants have not been fetched.
+        """
+        participants = self._participants.get(challenge_id)
+        if participants is None:
+            plan.add(planner.HABITICA, "GET /challenges/:challengeId/members",
+                     planner.page_count(participant_count))
+            unchecked = participant_count
+            unknown_members = participant_count
+        else:
+            unchecked = sum(1 for user_id in participants
+                            if (challenge_id, user_id)
+                            not in self._eligibility)
+            unknown_members = sum(
+                1 for user_id in participants
+                if self._eligibility.get((challenge_id, user_id), True)
+                and user_id not in self._members)
+        plan.add(planner.HABITICA,
+                 "GET /challenges/:challengeId/members/:memberId", unchecked)
+        plan.add(planner.HABITICA, "GET /members/:memberId", unknown_members)
+
+    def plan_members(self, plan):
+        """
+        Add the requests made by `iter_members` to the plan.
+
+        The group data is fetched for finding out the number of members,
+        unless it has already been fetched by this tool, and the request is
+        included in the plan.
+
+        :plan: RequestPlan to which the requests are added
+        :returns: The number of members in the group
+        """
+        if self._member_count is None:
+            plan.add(planner.HABITICA, "GET /groups/:groupId")
+            self.group_data()
+        member_count = self._member_count
+        plan.add(planner.HABITICA, "GET /groups/:groupId/members",
+                 planner.page_count(member_count))
+        plan.add(planner.HABITICA, "GET /members/:memberId",
+                 max(0, member_count - len(self._members)))
+        return member_count
+
+    def plan_birthdays(self, plan):
+        """
+        Add the requests made by `ensure_birthday` for all members.
+
+        It is assumed that every birthday event needs to be created or
+        updated.
+
+        :plan: RequestPlan to which the requests are added
+        """
+        member_count = self.plan_members(plan)
+        plan.add(planner.GOOGLE_CALENDAR, "events.list", member_count)
+        plan.add(planner.GOOGLE_CALENDAR, "events.insert or events.update",
+                 member_count)
+
+    def _calendar(self, calendar_id):
+        """
+        Return a GoogleCalendar for the given ID, creating it on first use.
+
+        :calendar_id: ID of the Google calendar
+        """
+        if calendar_id not in self._calendars:
+            self._calendars[calendar_id] = GoogleCalendar(calendar_id)
+        return self._calendars[calendar_id]
+
+    @tracing.traced("calendar sync")
     def ensure_birthday(self, calendar_id, member):
         """
         Ensure that there is an up-to-date birthday event for the member.
@@ -203,7 +472,6 @@ class PartyTool(object):
         :member: Member object representing a Habitician
         :returns: A tuple of (status_code, message)
         """
-        # pylint: disable=no-self-use
 
         def _next_birthday(creationdate):
             """
@@ -273,7 +541,7 @@ class PartyTool(object):
                 changed = True
             return changed
 
-        calendar = GoogleCalendar(calendar_id)
+        calendar = self._calendar(calendar_id)
         creation = member.habitica_birthday
         next_bday = _next_birthday(creation)
         bday_events = calendar.events_for_date(next_bday)
@@ -295,3 +563,102 @@ class PartyTool(object):
                            u"".format(member.displayname))
             return (2, u"Birthday event for {} already up to date"
                        u"".format(member.displayname))
+
+
+class PartyTool(GroupTool):
+    """
+    A class that provides methods for doing party-related things.
+    """
+
+    def __init__(self, header, cache_members=True):
+        """
+        Initialize the class.
+
+        :header: Habitica requires specific fields to be present in all API
+                 calls. This dict must contain them.
+        :cache_members: Whether fetched members are kept in memory
+        """
+        super().__init__(header, "party", cache_members=cache_members)
+
+    def party_description(self):
+        """
+        Return the description of the party
+        """
+        return self.description()
+
+    def update_party_description(self, new_description, user_id=None,
+                                 api_token=None):
+        """
+        Set the given string as the party description.
+
+        See `GroupTool.update_description` for details.
+        """
+        return self.update_description(new_description, user_id, api_token)
+
+    def party_challenges(self):
+        """
+        Return a list of all challenges in the party.
+        """
+        return self.challenges()
+
+    def current_sharing_weekend(self):
+        """
+        Return the current sharing weekend challenge.
+
+        The challenge is chosen based on the title containing words "Sharing
+        Weekend Challenge" but not "TEMPLATE". If there are multiple, the one
+        that has the most recent "created at" is returned.
+
+        :returns: A dict representing the newest Sharing Weekend Challenge
+        """
+        return self.newest_matching_challenge(
+            ["Sharing Weekend"], ["TEMPLATE", "template", "Template"])
+
+    def party_members(self):
+        """
+        Return a list of all party members.
+
+        :returns: A list of Member objects.
+        """
+        return self.members()
+
+
+def completed_all_todos(progress):
+    """
+    Return True if all todo tasks in the challenge progress are completed.
+
+    :progress: Challenge progress of a member as returned by Habitica API
+    """
+    for task in progress["tasks"]:
+        if task["type"] == "todo" and not task["completed"]:
+            return False
+    return True
+
+
+def user_groups(header):
+    """
+    Return all groups the user belongs to: the party and all guilds.
+
+    :header: Habitica API header
+    :returns: A list of dicts representing the groups
+    """
+    return utils.get_dict_from_api(
+        header, "https://habitica.com/api/v3/groups?type=party,guilds")
+
+
+def all_group_challenges(header, max_workers=4):
+    """
+    Return the challenges of every group the user belongs to.
+
+    The challenge listings of different groups are fetched concurrently.
+
+    :header: Habitica API header
+    :max_workers: Maximum number of concurrent requests
+    :returns: A dict mapping group IDs to lists of challenge dicts
+    """
+    group_ids = [group["id"] for group in user_groups(header)]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        challenge_lists = executor.map(habrequest.with_current_priority(
+            lambda group_id: GroupTool(header, group_id).challenges()),
+            group_ids)
+        return dict(zip(group_ids, challenge_lists))
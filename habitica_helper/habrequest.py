@@ -1,11 +1,490 @@
 """
 Habitica API calls functionality wrapper for requests.
+
+All requests made through this module share one rate limit budget: Habitica
+reports the remaining number of requests and the time when the limit resets in
+response headers, and when the budget has been used up, new requests wait
+until the reset. This allows making requests from multiple threads without
+exceeding the limit. With `share_rate_limits`, the budget is also shared with
+other processes on the same host.
+
+The requests share one HTTP session, so connections to Habitica are reused
+between requests.
+
+Habitica limits the request rate of each user separately. Users added with
+`add_account` get their own rate limit budget and HTTP session, so that
+commands run concurrently for several accounts don't slow each other down.
+Requests of other users share the default budget and session.
+
+Requests have a priority: when the budget has been used up, the waiting
+requests are made in order of priority, so that interactive commands don't
+wait behind requests of background jobs. Background requests also leave the
+last INTERACTIVE_RESERVE requests of each window to interactive ones, which
+works across processes when the budget is shared. Background requests are
+not starved, as the priority of a waiting request rises the longer it has
+waited. The priority of the requests made by a thread is set using `priority`.
+
+During Habitica outages, a circuit breaker makes requests fail fast with
+CircuitOpenError instead of waiting for each of them to fail. While the circuit
+is open, GET requests are answered with the most recent response to the same
+request if one from the last CACHE_TTL seconds is available. Requests made
+within `fresh_responses` never get cached responses.
 """
 
+from collections import OrderedDict
+import contextlib
+from datetime import datetime, timedelta, timezone
+import fcntl
+import itertools
+import json
+import os
+import re
+import threading
 import time
 
 import requests
 
+from habitica_helper.circuit import CircuitBreaker, CircuitOpenError
+
+# Number of GET responses kept for answering requests during outages
+CACHE_SIZE = 256
+
+# Seconds for which a cached GET response may be used during an outage
+CACHE_TTL = 300
+
+# Request priorities, smaller is more urgent
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# Seconds of waiting after which a request is as urgent as a new request whose
+# priority is one step higher
+PRIORITY_AGING = 30
+
+# Number of requests in each rate limit window that only interactive requests,
+# and background requests that have waited PRIORITY_AGING seconds, may use
+INTERACTIVE_RESERVE = 5
+
+_PRIORITY = threading.local()
+_FRESH = threading.local()
+
+# Habitica resets the rate limit budget at least this often, in seconds.
+# Reset times further in the future are bogus and ignored.
+RATE_LIMIT_WINDOW = 60
+
+# Budget shared with other processes, set by `share_rate_limits`
+_SHARED_BUDGET = None
+
+
+def _is_valid_budget(budget, now):
+    """
+    Return True if the budget is well-formed and resets within a window.
+    """
+    return (isinstance(budget, dict)
+            and isinstance(budget.get("remaining"), int)
+            and isinstance(budget.get("reset"), (int, float))
+            and budget["reset"] <= now + RATE_LIMIT_WINDOW)
+
+
+class _Budget():
+    """
+    The remaining rate limit budget of each user, kept in memory.
+    """
+
+    def __init__(self):
+        self._budgets = {}
+
+    @contextlib.contextmanager
+    def _state(self):
+        """
+        Give exclusive access to a dict mapping user IDs to their budgets.
+        """
+        yield self._budgets
+
+    def reserve(self, user_id, keep=0):
+        """
+        Reserve a request from the budget of the user.
+
+        :user_id: Habitica user ID
+        :keep: Number of requests that must be left in the budget for others
+        :returns: None if a request was reserved or the budget is not known,
+                  or the time when the used-up budget resets
+        """
+        with self._state() as budgets:
+            budget = budgets.get(user_id)
+            if budget is None:
+                return None
+            if not _is_valid_budget(budget, time.time()):
+                del budgets[user_id]
+                return None
+            if budget["remaining"] > keep:
+                budget["remaining"] -= 1
+                return None
+            return budget["reset"]
+
+    def expire(self, user_id, reset):
+        """
+        Forget the budget of the user if it is from before the given reset.
+        """
+        with self._state() as budgets:
+            budget = budgets.get(user_id)
+            if budget is not None and budget["reset"] <= reset:
+                del budgets[user_id]
+
+    def update(self, user_id, remaining, reset):
+        """
+        Set the budget of the user as reported by Habitica.
+
+        Reset times more than RATE_LIMIT_WINDOW seconds in the future are
+        ignored.
+        """
+        now = time.time()
+        if reset > now + RATE_LIMIT_WINDOW:
+            return
+        with self._state() as budgets:
+            budget = budgets.get(user_id)
+            if budget is not None and _is_valid_budget(budget, now):
+                if abs(reset - budget["reset"]) < 1:
+                    # Responses to concurrent requests can arrive in any
+                    # order, so the smallest remaining count is the most up
+                    # to date.
+                    remaining = min(remaining, budget["remaining"])
+                elif reset < budget["reset"]:
+                    # A late response from an earlier rate limit window
+                    return
+            budgets[user_id] = {"remaining": remaining, "reset": reset}
+
+
+class _FileBudget(_Budget):
+    """
+    The remaining rate limit budget of each user, shared between processes.
+
+    The budgets are stored in a JSON file, which is locked while it is read
+    and updated. The file is only accessible for the current user, and it is
+    not opened through a symlink. Malformed budgets in the file and ones
+    resetting too far in the future are ignored, so a corrupted file can't
+    make the requests wait for long. If the file can't be opened, e.g.
+    because its directory doesn't exist, the budgets are kept in this process
+    only.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+
+    @contextlib.contextmanager
+    def _state(self):
+        try:
+            descriptor = os.open(
+                self.path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+        except OSError:
+            yield self._budgets
+            return
+        with os.fdopen(descriptor, "r+") as state_file:
+            fcntl.flock(state_file, fcntl.LOCK_EX)
+            try:
+                budgets = json.loads(state_file.read() or "{}")
+            except ValueError:
+                budgets = {}
+            if not isinstance(budgets, dict):
+                budgets = {}
+            now = time.time()
+            budgets = {user_id: budget for user_id, budget in budgets.items()
+                       if _is_valid_budget(budget, now)}
+            yield budgets
+            now = time.time()
+            state_file.seek(0)
+            state_file.truncate()
+            json.dump({user_id: budget for user_id, budget in budgets.items()
+                       if budget["reset"] > now}, state_file)
+
+
+class _RateLimiter():
+    """
+    Book-keeping of the remaining Habitica API rate limit budget.
+    """
+
+    def __init__(self):
+        self._lock = threading.Condition()
+        self._budget = _Budget()
+        self._waiting = []
+        self._tickets = itertools.count()
+
+    @property
+    def budget(self):
+        """
+        The budget shared between processes if enabled, else our own one.
+        """
+        return _SHARED_BUDGET or self._budget
+
+    def _next_waiter(self):
+        """
+        Return the waiting request that is let through next.
+
+        A waiting request becomes one priority step more urgent every
+        PRIORITY_AGING seconds, and requests with equal urgency are let
+        through in the order they arrived.
+        """
+        now = time.time()
+        return min(self._waiting, key=lambda waiter: (
+            waiter[0] - (now - waiter[1]) / PRIORITY_AGING, waiter[2]))
+
+    @staticmethod
+    def _keep(waiter):
+        """
+        Return the number of requests the waiting request must leave unused.
+
+        Background requests leave INTERACTIVE_RESERVE requests of the budget
+        to interactive ones, also in other processes sharing the budget,
+        until they have waited for PRIORITY_AGING seconds.
+        """
+        priority, arrived, _ = waiter
+        if (priority > INTERACTIVE
+                and time.time() - arrived < PRIORITY_AGING):
+            return INTERACTIVE_RESERVE
+        return 0
+
+    def wait(self, user_id, priority=INTERACTIVE):
+        """
+        Wait until the rate limit allows making a request and reserve it.
+
+        :user_id: Habitica user ID of the request
+        :priority: Priority of the request, e.g. INTERACTIVE or BACKGROUND
+        """
+        with self._lock:
+            waiter = (priority, time.time(), next(self._tickets))
+            self._waiting.append(waiter)
+            while True:
+                if self._next_waiter() is not waiter:
+                    self._lock.wait()
+                    continue
+                reset = self.budget.reserve(user_id, self._keep(waiter))
+                if reset is None:
+                    break
+                # Sleep without holding the lock, so that more urgent
+                # requests arriving meanwhile can get ahead of this one
+                delay = min(reset - time.time(), RATE_LIMIT_WINDOW)
+                if delay > 0:
+                    self._lock.release()
+                    try:
+                        time.sleep(delay)
+                    finally:
+                        self._lock.acquire()
+                self.budget.expire(user_id, reset)
+                self._lock.notify_all()
+            self._waiting.remove(waiter)
+            self._lock.notify_all()
+
+    def update(self, user_id, response):
+        """
+        Update the budget based on the rate limit headers of a response.
+        """
+        try:
+            remaining = int(response.headers["X-RateLimit-Remaining"])
+            reset = _parse_reset(response.headers["X-RateLimit-Reset"])
+        except (KeyError, ValueError):
+            return
+        with self._lock:
+            self.budget.update(user_id, remaining, reset)
+
+
+def _parse_reset(timestamp):
+    """
+    Return the rate limit reset time from the header as a unix timestamp.
+
+    Habitica gives the reset time as a JavaScript date string, e.g.
+    "Wed Jun 02 2021 18:26:58 GMT+0000 (Coordinated Universal Time)".
+    """
+    match = re.match(r"\w{3} (\w{3} \d{2} \d{4} \d{2}:\d{2}:\d{2}) "
+                     r"GMT([+-])(\d{2})(\d{2})", timestamp)
+    if not match:
+        raise ValueError("Unrecognized rate limit reset time {}"
+                         "".format(timestamp))
+    offset = timedelta(hours=int(match.group(3)), minutes=int(match.group(4)))
+    if match.group(2) == "-":
+        offset = -offset
+    reset = datetime.strptime(match.group(1), "%b %d %Y %H:%M:%S")
+    return reset.replace(tzinfo=timezone(offset)).timestamp()
+
+
+class _ResponseCache():
+    """
+    The most recent successful GET responses, for use during outages.
+
+    Responses older than ttl seconds are not used.
+    """
+
+    def __init__(self, size=CACHE_SIZE, ttl=CACHE_TTL):
+        self._lock = threading.Lock()
+        self._size = size
+        self._ttl = ttl
+        self._responses = OrderedDict()
+
+    def get(self, key):
+        """
+        Return the cached response for the key, or None.
+        """
+        with self._lock:
+            stored_at, response = self._responses.get(key, (0, None))
+            if time.time() - stored_at > self._ttl:
+                self._responses.pop(key, None)
+                return None
+            return response
+
+    def put(self, key, response):
+        """
+        Cache the response, dropping the least recently stored one if needed.
+        """
+        with self._lock:
+            self._responses.pop(key, None)
+            self._responses[key] = (time.time(), response)
+            if len(self._responses) > self._size:
+                self._responses.popitem(last=False)
+
+
+class _Account():
+    """
+    The rate limit budget and HTTP session of a Habitica user.
+    """
+
+    def __init__(self):
+        self.rate_limiter = _RateLimiter()
+        self.session = requests.Session()
+
+
+_RATE_LIMITER = _RateLimiter()
+_SESSION = requests.Session()
+_ACCOUNTS = {}
+_ACCOUNTS_LOCK = threading.Lock()
+_CIRCUIT = CircuitBreaker("Habitica")
+_RESPONSE_CACHE = _ResponseCache()
+
+# Directory of secret configuration, such as credentials
+_CONF_SECRETS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "conf", "secrets")
+
+
+def default_rate_limit_path():
+    """
+    Return the path of the file for sharing rate limits.
+
+    The file is in the per-user runtime directory (XDG_RUNTIME_DIR) if there
+    is one, and otherwise in the conf/secrets directory next to this package,
+    regardless of the working directory. The path can be overridden using
+    HHELPER_RATE_LIMIT_FILE environment variable. If it is set to an empty
+    string, the budget is not shared.
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        default = os.path.join(runtime_dir, "hhelper-ratelimit.json")
+    else:
+        default = os.path.join(_CONF_SECRETS, "ratelimit.json")
+    return os.environ.get("HHELPER_RATE_LIMIT_FILE", default)
+
+
+def share_rate_limits(path):
+    """
+    Share the rate limit budgets with other processes using the same file.
+
+    All processes on the host that make requests with the same Habitica
+    account then take turns using its budget, instead of each of them
+    assuming that it has the whole budget to itself.
+
+    :path: Path of the file in which the budgets are kept, or None for
+           keeping them in this process only
+    """
+    global _SHARED_BUDGET  # pylint: disable=global-statement
+    _SHARED_BUDGET = _FileBudget(path) if path else None
+
+
+def current_priority():
+    """
+    Return the priority of the requests made by the current thread.
+    """
+    return getattr(_PRIORITY, "level", INTERACTIVE)
+
+
+@contextlib.contextmanager
+def priority(level):
+    """
+    Make the requests of the current thread with the given priority.
+
+    :level: INTERACTIVE, BACKGROUND or another integer, smaller being more
+            urgent
+    """
+    previous = current_priority()
+    _PRIORITY.level = level
+    try:
+        yield
+    finally:
+        _PRIORITY.level = previous
+
+
+@contextlib.contextmanager
+def fresh_responses():
+    """
+    Make GET requests of the current thread fail during outages.
+
+    Normally a GET request made while Habitica is unavailable is answered
+    with a recent cached response if there is one. Within this context,
+    CircuitOpenError is raised instead, e.g. so that winners are never drawn
+    from outdated completers.
+    """
+    previous = getattr(_FRESH, "enabled", False)
+    _FRESH.enabled = True
+    try:
+        yield
+    finally:
+        _FRESH.enabled = previous
+
+
+def with_current_priority(func):
+    """
+    Return func wrapped to make its requests with the current priority.
+
+    Threads don't inherit the priority of the thread that starts them, so
+    functions run in thread pools should be wrapped using this. Whether the
+    requests may be answered from the cache, see `fresh_responses`, is passed
+    on the same way.
+    """
+    level = current_priority()
+    fresh = getattr(_FRESH, "enabled", False)
+
+    def _wrapper(*args, **kwargs):
+        with priority(level), (fresh_responses() if fresh
+                               else contextlib.nullcontext()):
+            return func(*args, **kwargs)
+    return _wrapper
+
+
+def add_account(user_id):
+    """
+    Give the user their own rate limit budget and HTTP session.
+
+    Adding an account that has already been added does nothing.
+
+    :user_id: Habitica user ID, as in the x-api-user header
+    """
+    with _ACCOUNTS_LOCK:
+        if user_id not in _ACCOUNTS:
+            _ACCOUNTS[user_id] = _Account()
+
+
+def _rate_limiter(headers):
+    """
+    Return the rate limiter for requests made with the given headers.
+    """
+    account = _ACCOUNTS.get(headers["x-api-user"])
+    return account.rate_limiter if account else _RATE_LIMITER
+
+
+def _session(headers):
+    """
+    Return the HTTP session for requests made with the given headers.
+    """
+    account = _ACCOUNTS.get(headers["x-api-user"])
+    return account.session if account else _SESSION
+
 
 def _validate_headers(headers):
     """
@@ -17,6 +496,33 @@ def _validate_headers(headers):
                          "encountered.")
 
 
+def _is_outage(error):
+    """
+    Return True if the error raised by a request means Habitica is unavailable.
+    """
+    if isinstance(error, requests.HTTPError):
+        return (error.response is not None
+                and error.response.status_code >= 500)
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+def _make_request(request_func, url, headers, retry, **kwargs):
+    """
+    Make a request, remaking it if the rate limit was exceeded.
+    """
+    rate_limiter = _rate_limiter(headers)
+    user_id = headers["x-api-user"]
+    rate_limiter.wait(user_id, current_priority())
+    response = request_func(url, headers, **kwargs)
+    rate_limiter.update(user_id, response)
+    if response.status_code == 429 and retry:
+        time.sleep(float(response.headers["Retry-After"]))
+        response = request_func(url, headers=headers, **kwargs)
+        rate_limiter.update(user_id, response)
+    response.raise_for_status()
+    return response
+
+
 def _handle_retry(request_func):
     """
     A wrapper for adding retry functionality to requests.
@@ -24,7 +530,15 @@ def _handle_retry(request_func):
     If the server responds with status 429, i.e. the rate limit has been
     exceeded, and retry is set to True, the request is remade after the
     required cooldown period.
+
+    Connection errors, timeouts and server errors are reported to the circuit
+    breaker. When the circuit is open, the request fails with CircuitOpenError
+    unless it is a GET request with a cached response less than CACHE_TTL
+    seconds old, made outside `fresh_responses`.
     """
+    # Only GET requests are safe to answer from the cache
+    cacheable = request_func.__name__ == "get"
+
     def _wrapper(url, headers, retry=True, **kwargs):
         """
         :url: URL to make the request to
@@ -34,11 +548,18 @@ def _handle_retry(request_func):
                 exceeded.
         """
         _validate_headers(headers)
-        response = request_func(url, headers, **kwargs)
-        if response.status_code == 429 and retry:
-            time.sleep(float(response.headers["Retry-After"]))
-            response = request_func(url, headers=headers, **kwargs)
-        response.raise_for_status()
+        cache_key = (url, headers["x-api-user"], repr(kwargs.get("params")))
+        try:
+            response = _CIRCUIT.call(_make_request, _is_outage, request_func,
+                                     url, headers, retry, **kwargs)
+        except CircuitOpenError:
+            use_cache = cacheable and not getattr(_FRESH, "enabled", False)
+            cached = _RESPONSE_CACHE.get(cache_key) if use_cache else None
+            if cached is None:
+                raise
+            return cached
+        if cacheable:
+            _RESPONSE_CACHE.put(cache_key, response)
         return response
     return _wrapper
 
@@ -54,7 +575,7 @@ def get(url, headers, **kwargs):
     :retry: True if request should be remade if API call rate limit was
             exceeded.
     """
-    return requests.get(url, headers=headers, **kwargs)
+    return _session(headers).get(url, headers=headers, **kwargs)
 
 
 @_handle_retry
@@ -69,7 +590,7 @@ def put(url, headers, data=None, **kwargs):
     :retry: True if request should be remade if API call rate limit was
             exceeded.
     """
-    return requests.put(url, headers=headers, data=data, **kwargs)
+    return _session(headers).put(url, headers=headers, data=data, **kwargs)
 
 
 @_handle_retry
@@ -83,4 +604,18 @@ def post(url, headers, **kwargs):
     :retry: True if request should be remade if API call rate limit was
             exceeded.
     """
-    return requests.post(url, headers=headers, **kwargs)
+    return _session(headers).post(url, headers=headers, **kwargs)
+
+
+@_handle_retry
+def delete(url, headers, **kwargs):
+    """
+    Make a delete request to Habitica API using requests, allowing retry.
+
+    :url: URL to make the request to
+    :headers: Headers used with the request. Must match Habitica API
+              specifications.
+    :retry: True if request should be remade if API call rate limit was
+            exceeded.
+    """
+    return _session(headers).delete(url, headers=headers, **kwargs)
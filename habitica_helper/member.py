@@ -2,8 +2,6 @@
 A class for representing Habitica user data.
 """
 
-from datetime import datetime
-
 from habitica_helper import utils
 
 
@@ -17,13 +15,22 @@ class Member():
     login_name          Player handle used for logging in
     habitica_birthday   Date of character creation
     last_login          Date of the last login to Habitica
+
+    Members are compared and hashed based on their user ID, so they can be
+    used in sets and as dict keys. The attributes are stored in slots to keep
+    the memory footprint of large rosters small.
     """
 
-    def __init__(self, user_id, header=None, profile_data=None):
+    __slots__ = ["id", "displayname", "login_name", "habitica_birthday",
+                 "last_login"]
+
+    def __init__(self, user_id, header=None, profile_data=None,
+                 api_data=None):
         """
         Initialize the class with data from API/dict.
 
-        If header is provided, data is fetched from the api, otherwise given
+        If header is provided, data is fetched from the api. Otherwise, if
+        already-fetched api_data is given, it is used, and if neither is given,
         profile_data is used.
 
         :user_id: User ID for the represented Habitica user
@@ -34,20 +41,21 @@ class Member():
                         loginname: Login name (str)
                         birthday: Habitica birthday (datetime)
                         last_login: Last time the user logged in (datetime)
+        :api_data: Member data dict in the format returned by Habitica API
         """
         if header:
-            profile_data = utils.get_dict_from_api(
+            api_data = utils.get_dict_from_api(
                 header,
                 "https://habitica.com/api/v3/members/{}".format(user_id))
-            self.id = profile_data["_id"]  # pylint: disable=invalid-name
-            self.displayname = profile_data["profile"]["name"]
-            self.login_name = profile_data["auth"]["local"]["username"]
-            self.habitica_birthday = datetime.strptime(
-                profile_data["auth"]["timestamps"]["created"],
-                "%Y-%m-%dT%H:%M:%S.%fZ")
-            self.last_login = datetime.strptime(
-                profile_data["auth"]["timestamps"]["loggedin"],
-                "%Y-%m-%dT%H:%M:%S.%fZ")
+        if api_data:
+            timestamps = api_data["auth"]["timestamps"]
+            self.id = api_data["_id"]  # pylint: disable=invalid-name
+            self.displayname = api_data["profile"]["name"]
+            self.login_name = api_data["auth"]["local"]["username"]
+            self.habitica_birthday = utils.timestamp_to_datetime(
+                timestamps["created"])
+            self.last_login = utils.timestamp_to_datetime(
+                timestamps["loggedin"])
         elif profile_data:
             self.id = profile_data["id"]
             self.displayname = profile_data["displayname"]
@@ -55,8 +63,9 @@ class Member():
             self.habitica_birthday = profile_data["birthday"]
             self.last_login = profile_data["last_login"]
         else:
-            raise AttributeError("Either header or profile_data must be "
-                                 "provided for initializing a Member.")
+            raise AttributeError("Either header, api_data or profile_data "
+                                 "must be provided for initializing a "
+                                 "Member.")
 
     def __lt__(self, member):
         return self.id < member.id
@@ -65,11 +74,16 @@ class Member():
         return self.id > member.id
 
     def __eq__(self, member):
+        if not isinstance(member, Member):
+            return NotImplemented
         return self.id == member.id
 
     def __ge__(self, member):
         return self.id > member.id or self.id == member.id
 
+    def __hash__(self):
+        return hash(self.id)
+
     def __str__(self):
         """
         Return a string in format "Displayname (@loginname)".
@@ -0,0 +1,100 @@
+"""
+Estimates of the requests a command makes and the time they take.
+
+Commands processing large groups can make thousands of requests, and with the
+Habitica rate limit of 30 requests per minute that can take hours. A
+RequestPlan is filled in by the planning methods of the tools, which follow
+the same code paths as the real work but use only cached and listing-level
+data, such as the member counts in challenge listings.
+"""
+
+from collections import Counter
+import math
+
+
+HABITICA = "Habitica"
+GOOGLE_CALENDAR = "Google Calendar"
+YAHOO_FINANCE = "Yahoo! Finance"
+
+# Habitica allows this many requests per window
+HABITICA_RATE_LIMIT = 30
+HABITICA_RATE_WINDOW = 60
+
+# Typical round-trip time of a single request in seconds
+REQUEST_LATENCY = 0.25
+
+# Maximum number of items in one page of Habitica member listings
+PAGE_SIZE = 30
+
+
+def page_count(item_count):
+    """
+    Return the number of requests needed for paginating the given items.
+
+    A listing ends when a page is not full, so an extra request is needed
+    when the items fill up the last page exactly.
+    """
+    return item_count // PAGE_SIZE + 1
+
+
+class RequestPlan():
+    """
+    Estimated number of requests to each endpoint of the used services.
+
+    Counts that depend on data which is not known in advance, e.g. how many
+    participants have completed a challenge, are upper bounds.
+    """
+
+    def __init__(self):
+        self.requests = Counter()
+
+    def add(self, service, endpoint, count=1):
+        """
+        Add requests to the plan.
+
+        :service: Name of the service, e.g. HABITICA
+        :endpoint: Description of the endpoint, e.g. "GET /members/:memberId"
+        :count: Number of requests made to the endpoint
+        """
+        if count > 0:
+            self.requests[(service, endpoint)] += count
+
+    def total(self, service=None):
+        """
+        Return the total number of planned requests.
+
+        :service: If given, only requests to this service are counted
+        """
+        return sum(count for (request_service, _), count
+                   in self.requests.items()
+                   if service is None or request_service == service)
+
+    def duration(self, latency=REQUEST_LATENCY):
+        """
+        Return the projected duration of making the requests in seconds.
+
+        The projection assumes the requests are made one at a time and that
+        the whole Habitica rate limit budget is available at the start.
+
+        :latency: Round-trip time of a single request in seconds
+        """
+        windows = math.ceil(self.total(HABITICA) / HABITICA_RATE_LIMIT)
+        rate_limit_wait = max(0, windows - 1) * HABITICA_RATE_WINDOW
+        return rate_limit_wait + self.total() * latency
+
+    def report(self):
+        """
+        Return a human-readable description of the plan as a list of lines.
+        """
+        lines = ["Estimated requests:"]
+        for (service, endpoint), count in sorted(self.requests.items()):
+            lines.append(u"  {:<16}{:<48}{:>6}".format(service, endpoint,
+                                                       count))
+        services = sorted({service for service, _ in self.requests})
+        lines.append(u"Total: {}".format(", ".join(
+            u"{} {} requests".format(self.total(service), service)
+            for service in services) or "no requests"))
+        minutes, seconds = divmod(int(math.ceil(self.duration())), 60)
+        lines.append(u"Projected duration: {} min {} s".format(minutes,
+                                                               seconds))
+        return lines
@@ -0,0 +1,117 @@
+"""
+Activity analytics for the members of a group.
+
+The member data is stored in columns of NumPy arrays, so that questions about
+large rosters can be answered using vectorised operations instead of looping
+over Member objects.
+"""
+
+import datetime
+
+import numpy as np
+
+
+class Roster():
+    """
+    Columnar representation of a set of Habitica users.
+
+    Has the following columns, each a NumPy array with one item per member:
+    ids                 User IDs
+    displaynames        Nicknames shown to others
+    login_names         Player handles used for logging in
+    habitica_birthdays  Times of character creation
+    last_logins         Times of the last login to Habitica
+    """
+
+    def __init__(self, members):
+        """
+        Create a roster from the given members.
+
+        :members: An iterable of Member objects
+        """
+        members = list(members)
+        self.ids = np.array([member.id for member in members], dtype=object)
+        self.displaynames = np.array(
+            [member.displayname for member in members], dtype=object)
+        self.login_names = np.array(
+            [member.login_name for member in members], dtype=object)
+        self.habitica_birthdays = np.array(
+            [member.habitica_birthday for member in members],
+            dtype="datetime64[ms]")
+        self.last_logins = np.array(
+            [member.last_login for member in members], dtype="datetime64[ms]")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _subset(self, selection):
+        """
+        Return a new roster containing only the selected members.
+
+        :selection: A boolean mask or an array of indices
+        """
+        subset = Roster([])
+        for column in ["ids", "displaynames", "login_names",
+                       "habitica_birthdays", "last_logins"]:
+            setattr(subset, column, getattr(self, column)[selection])
+        return subset
+
+    def days_since_login(self, now=None):
+        """
+        Return the number of days since the last login of each member.
+
+        :now: Datetime from which the time is counted. Defaults to the current
+              UTC time.
+        :returns: An array of floats
+        """
+        if now is None:
+            now = datetime.datetime.now(
+                datetime.timezone.utc).replace(tzinfo=None)
+        elapsed = np.datetime64(now, "ms") - self.last_logins
+        return elapsed / np.timedelta64(1, "D")
+
+    def inactive(self, days, now=None):
+        """
+        Return the members who haven't logged in for more than the given time.
+
+        The members are ordered from the longest inactivity to the shortest.
+
+        :days: Number of days without a login after which a member is inactive
+        :now: Datetime from which the time is counted. Defaults to the current
+              UTC time.
+        :returns: A Roster of the inactive members
+        """
+        idle_days = self.days_since_login(now)
+        inactive = np.flatnonzero(idle_days > days)
+        return self._subset(inactive[np.argsort(-idle_days[inactive],
+                                                kind="stable")])
+
+    def login_recency_percentiles(self, percentiles=(50, 90, 99), now=None):
+        """
+        Return percentiles of the days since the last login of the members.
+
+        :percentiles: An iterable of percentiles between 0 and 100
+        :now: Datetime from which the time is counted. Defaults to the current
+              UTC time.
+        :returns: A dict mapping each percentile to a number of days
+        """
+        percentiles = list(percentiles)
+        if not len(self):
+            return {percentile: None for percentile in percentiles}
+        values = np.percentile(self.days_since_login(now), percentiles)
+        return dict(zip(percentiles, values.tolist()))
+
+    def join_cohorts(self, unit="Y"):
+        """
+        Return the number of members who joined Habitica in each period.
+
+        :unit: Length of the cohort period as a NumPy datetime unit: "Y" for
+               years or "M" for months.
+        :returns: A dict mapping the start date of each period to the number
+                  of members who joined during it
+        """
+        periods, counts = np.unique(
+            self.habitica_birthdays.astype("datetime64[{}]".format(unit)),
+            return_counts=True)
+        return {period.astype("datetime64[D]").item(): int(count)
+                for period, count in zip(periods, counts)}
@@ -0,0 +1,179 @@
+"""
+A simple in-process scheduler for running recurring jobs.
+
+Jobs are scheduled using cron-like specifications, and all jobs are run one
+at a time in the same process. This way jobs scheduled close to each other can
+share fetched data, and their API calls never compete for the rate limit.
+"""
+
+import datetime
+import time
+import traceback
+
+
+class CronSchedule():
+    """
+    A schedule given in the same format as in crontab.
+
+    The schedule consists of five whitespace-separated fields: minute (0-59),
+    hour (0-23), day of month (1-31), month (1-12) and day of week (0-7, where
+    both 0 and 7 are Sunday). Each field can be "*", a number, a range such as
+    "1-5", a list such as "1,15" or any of these with a step such as "*/15".
+    As in cron, if both day of month and day of week are restricted, a day
+    matching either of them matches.
+    """
+
+    _RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+    def __init__(self, spec):
+        """
+        Parse the given schedule specification.
+
+        :spec: The schedule, e.g. "0 18 * * 2" for every Tuesday at 18:00.
+        :raises: ValueError if the specification is not valid
+        """
+        self.spec = spec
+        fields = spec.split()
+        if len(fields) != 5:
+            raise ValueError("Schedule '{}' must have five fields"
+                             "".format(spec))
+        parsed = [_parse_field(field, min_, max_)
+                  for field, (min_, max_) in zip(fields, self._RANGES)]
+        (self.minutes, self.hours, self.days, self.months,
+         self.weekdays) = parsed
+        if 7 in self.weekdays:
+            self.weekdays = self.weekdays | {0}
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    def _day_matches(self, date):
+        """
+        Return True if the jobs are run on the given date.
+        """
+        if date.month not in self.months:
+            return False
+        day_ok = date.day in self.days
+        weekday_ok = (date.weekday() + 1) % 7 in self.weekdays
+        if self._any_day:
+            return weekday_ok
+        if self._any_weekday:
+            return day_ok
+        return day_ok or weekday_ok
+
+    def matches(self, moment):
+        """
+        Return True if the schedule matches the given datetime.
+
+        Seconds and smaller units are ignored.
+        """
+        return (moment.minute in self.minutes and moment.hour in self.hours
+                and self._day_matches(moment))
+
+    def next_after(self, moment):
+        """
+        Return the first matching time after the given datetime.
+
+        :moment: Datetime after which the next run time is searched.
+        :raises: ValueError if the schedule never matches, e.g. "0 0 31 2 *"
+        """
+        candidate = (moment.replace(second=0, microsecond=0)
+                     + datetime.timedelta(minutes=1))
+        # Every possible day occurs within eight years, including 29th of
+        # February on a specific weekday
+        for _ in range(8 * 366):
+            if self._day_matches(candidate):
+                for hour in sorted(self.hours):
+                    for minute in sorted(self.minutes):
+                        match = candidate.replace(hour=hour, minute=minute)
+                        if match >= candidate:
+                            return match
+            candidate = (candidate.replace(hour=0, minute=0)
+                         + datetime.timedelta(days=1))
+        raise ValueError("Schedule '{}' never matches".format(self.spec))
+
+
+def _parse_field(field, min_, max_):
+    """
+    Return the set of values a field of a schedule specification matches.
+    """
+    values = set()
+    for part in field.split(","):
+        value_range, _, step = part.partition("/")
+        if value_range == "*":
+            start, end = min_, max_
+        elif "-" in value_range:
+            start, end = [int(value) for value in value_range.split("-", 1)]
+        else:
+            start = end = int(value_range)
+        step = int(step) if step else 1
+        if start < min_ or end > max_ or start > end or step < 1:
+            raise ValueError("Illegal schedule field '{}'".format(field))
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class Scheduler():
+    """
+    Run jobs according to their schedules, one job at a time.
+    """
+
+    def __init__(self, jobs, run_job, clock=datetime.datetime.now,
+                 sleep=time.sleep):
+        """
+        Create a scheduler for the given jobs.
+
+        :jobs: An iterable of (schedule, job) tuples, where schedule is a
+               cron-like specification string (see `CronSchedule`) and job is
+               anything run_job accepts.
+        :run_job: A function that runs the given job
+        :clock: A function returning the current local time
+        :sleep: A function for waiting the given number of seconds
+        """
+        self.jobs = [(CronSchedule(spec), job) for spec, job in jobs]
+        self._run_job = run_job
+        self._clock = clock
+        self._sleep = sleep
+        self._last_run = None
+
+    def next_run(self, after=None):
+        """
+        Return the next time when jobs are run and the jobs to run then.
+
+        :after: Datetime after which the next run is searched. Defaults to the
+                current time.
+        :returns: A tuple of (datetime, list of jobs)
+        """
+        if after is None:
+            after = self._clock()
+            if self._last_run is not None:
+                after = max(after, self._last_run)
+        next_times = [(schedule.next_after(after), job)
+                      for schedule, job in self.jobs]
+        first = min(run_time for run_time, _ in next_times)
+        return (first, [job for run_time, job in next_times
+                        if run_time == first])
+
+    def run_next(self):
+        """
+        Wait until the next jobs are due and run them in order.
+
+        An error in one job is printed, but it does not prevent running the
+        other jobs.
+        """
+        run_time, jobs = self.next_run()
+        delay = (run_time - self._clock()).total_seconds()
+        if delay > 0:
+            self._sleep(delay)
+        self._last_run = run_time
+        for job in jobs:
+            try:
+                self._run_job(job)
+            except Exception:  # pylint: disable=broad-except
+                traceback.print_exc()
+
+    def run_forever(self):
+        """
+        Keep running the jobs according to their schedules.
+        """
+        while True:
+            self.run_next()
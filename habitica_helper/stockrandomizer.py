@@ -1,11 +1,22 @@
 """
 A tool for doing confirmable random selection based on public data.
+
+The stock data libraries are slow to import, so they are imported only when
+the stock data is actually needed.
 """
 
-from datetime import timedelta
+from datetime import datetime, timedelta
 from math import modf
 import random
-import yfinance as yf
+
+from habitica_helper import planner
+from habitica_helper import tracing
+
+
+SEED_KEYS = ["Open", "High", "Low", "Close"]
+
+# Seeds and prices fetched in advance using prefetch_seed
+_PREFETCHED_SEEDS = {}
 
 
 class StockRandomizer(object):
@@ -16,15 +27,34 @@ class StockRandomizer(object):
     be predicted before the date of the stock data retrieval.
     """
 
-    def __init__(self, ticker, date):
+    def __init__(self, ticker, date, seed=None, prices=None):
         """
         Initialize the randomizer with a stock-based seed.
 
+        Each randomizer has its own random number generator, so using it does
+        not affect the global state of the random module nor other
+        randomizers.
+
+        The stock prices the seed is based on are available in the `prices`
+        attribute as a dict with the keys in SEED_KEYS, or None if the seed
+        was given without them.
+
         :ticker: The stock symbol used by Yahoo! finance
         :date: Datetime of the day to be used
+        :seed: The already-known seed for the given ticker and date. If not
+               given, the seed is determined based on the stock data.
+        :prices: The already-known prices the given seed is based on
         """
-        self.seed = self._stock_seed(ticker, date)
-        random.seed(self.seed)
+        self.ticker = ticker
+        self.date = date
+        self.prices = prices
+        if seed is None:
+            seed, self.prices = _PREFETCHED_SEEDS.get(
+                _seed_key(ticker, date), (None, None))
+        if seed is None:
+            seed = self._stock_seed(ticker, date)
+        self.seed = seed
+        self._random = random.Random(self.seed)
 
     def pick_integer(self, min_, max_):
         """
@@ -36,7 +66,7 @@ class StockRandomizer(object):
         :min_: Minimum value (inclusive)
         :max_: Maximum value (not inclusive)
         """
-        return random.randint(min_, max_)
+        return self._random.randint(min_, max_)
 
     def _stock_seed(self, ticker, date):
         """
@@ -49,11 +79,99 @@ class StockRandomizer(object):
         :ticker: The stock symbol used by Yahoo! finance
         :date: Datetime of the day to be used
         """
-        stock = yf.Ticker(ticker)
-        data = stock.history(start=date, end = date + timedelta(days=1))
-        keys = ["Open", "High", "Low", "Close"]
+        import yfinance as yf  # pylint: disable=import-outside-toplevel
+
+        with tracing.span("stock fetch", ticker=ticker, date=str(date)):
+            stock = yf.Ticker(ticker)
+            data = stock.history(start=date, end = date + timedelta(days=1))
+        self.prices = {key: float(data.iloc[0][key]) for key in SEED_KEYS}
         seed = 0
-        for index, key in enumerate(keys):
+        for key in SEED_KEYS:
             decimals, _ = modf(data.iloc[0][key])
             seed = seed*100 + int(round(decimals*100))
         return seed
+
+
+def seeds_from_history(data):
+    """
+    Return the seeds for all days in the given stock history.
+
+    The seeds are computed for all rows at once, but using the same arithmetic
+    as `StockRandomizer`, so the seed for each day is identical to the one
+    a `StockRandomizer` would use for that day.
+
+    :data: Stock history DataFrame as returned by yfinance, containing at
+           least "Open", "High", "Low" and "Close" columns.
+    :returns: A dict mapping each date in the history to its seed
+    """
+    import numpy as np  # pylint: disable=import-outside-toplevel
+
+    decimals, _ = np.modf(data[SEED_KEYS].to_numpy(dtype=np.float64))
+    cents = np.rint(decimals * 100).astype(np.int64)
+    weights = 100 ** np.arange(len(SEED_KEYS) - 1, -1, -1, dtype=np.int64)
+    seeds = cents @ weights
+    return {timestamp.date(): int(seed)
+            for timestamp, seed in zip(data.index, seeds)}
+
+
+def stock_seeds(ticker, start_date, end_date):
+    """
+    Return the seeds for every trading day within the given date range.
+
+    The stock history is downloaded only once for the whole range, so this is
+    much faster than creating a `StockRandomizer` for each date separately when
+    e.g. auditing past draws.
+
+    :ticker: The stock symbol used by Yahoo! finance
+    :start_date: First date of the range (inclusive)
+    :end_date: Last date of the range (inclusive)
+    :returns: A dict mapping each trading day to its seed
+    """
+    import yfinance as yf  # pylint: disable=import-outside-toplevel
+
+    with tracing.span("stock fetch", ticker=ticker, start=str(start_date),
+                      end=str(end_date)):
+        stock = yf.Ticker(ticker)
+        data = stock.history(start=start_date,
+                             end=end_date + timedelta(days=1))
+    return seeds_from_history(data)
+
+
+def _seed_key(ticker, date):
+    """
+    Return the key used for storing a prefetched seed.
+    """
+    if isinstance(date, datetime):
+        date = date.date()
+    return (ticker, date)
+
+
+def prefetch_seed(ticker, date):
+    """
+    Fetch the seed for the given stock and date in advance.
+
+    StockRandomizers created later in the same process for the same stock and
+    date use the prefetched seed instead of fetching the stock data again.
+    Only prefetch the seed after the stock has closed for the day: otherwise
+    the values used for the seed can still change.
+
+    :ticker: The stock symbol used by Yahoo! finance
+    :date: Datetime of the day to be used
+    :returns: The seed
+    """
+    randomizer = StockRandomizer(ticker, date)
+    _PREFETCHED_SEEDS[_seed_key(ticker, date)] = (randomizer.seed,
+                                                  randomizer.prices)
+    return randomizer.seed
+
+
+def plan_seed(plan, ticker, date):
+    """
+    Add the requests made for determining a seed to the given plan.
+
+    :plan: RequestPlan to which the requests are added
+    :ticker: The stock symbol used by Yahoo! finance
+    :date: Datetime of the day to be used
+    """
+    if _seed_key(ticker, date) not in _PREFETCHED_SEEDS:
+        plan.add(planner.YAHOO_FINANCE, "stock history")
@@ -0,0 +1,50 @@
+"""
+Shared helpers for the local SQLite databases.
+
+The chat index, the webhook state and the archive of drawn winners are SQLite
+databases that can be used by several processes at once, e.g. a webhook server
+and a command run from cron, and they store times as milliseconds since the
+epoch.
+"""
+
+import datetime
+import sqlite3
+
+from habitica_helper import utils
+
+
+# Seconds to wait for other processes writing to the same database
+BUSY_TIMEOUT = 30
+
+
+def connect(path, schema):
+    """
+    Open a database, creating the tables in the schema if needed.
+
+    The connection can be used from another thread than the one opening it,
+    e.g. the thread of a server, but only from one thread at a time.
+
+    :path: Path of the database file, or ":memory:"
+    :schema: SQL script creating the tables if they don't exist
+    :returns: A sqlite3.Connection
+    """
+    connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT,
+                                 check_same_thread=False)
+    connection.executescript(schema)
+    return connection
+
+
+def milliseconds(moment):
+    """
+    Return the given time as milliseconds since the epoch.
+
+    :moment: A datetime, or a timestamp in Habitica format or as milliseconds.
+             Naive datetimes are interpreted as UTC.
+    """
+    if isinstance(moment, (int, float)):
+        return int(moment)
+    if isinstance(moment, str):
+        moment = utils.timestamp_to_datetime(moment)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return int(moment.timestamp() * 1000)
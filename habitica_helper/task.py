@@ -45,7 +45,9 @@ class Task():
                     the task is created as an easy one.
         uppable: Whether the '+' of a habit is active. "true" or "false".
         downable: Whether the '-' of a habit is active. "true" or "false"
+        id: The ID of the task in Habitica, if it already exists there.
         """
+        self.id = task_data.get("id", None)  # pylint: disable=invalid-name
         self.text = task_data.get("text", None)
         self.tasktype = task_data.get("tasktype", None)
         self.notes = task_data.get("notes", "")
@@ -54,6 +56,42 @@ class Task():
         self.difficulty = task_data.get("difficulty", "easy")
         self.uppable = task_data.get("uppable", "true")
         self.downable = task_data.get("downable", "false")
+        # Kept for telling the given values apart from the default ones when
+        # needed, which is much rarer than creating a task
+        self._task_data = task_data
+
+    @classmethod
+    def from_api(cls, task_data):
+        """
+        Create a task from a task dict in the format used by Habitica API.
+
+        This allows creating tasks from data fetched from Habitica as well as
+        from templates using the same keys, such as the ones in conf/tasks.py.
+
+        :task_data: A dict with Habitica API keys, e.g. "type", "text",
+                    "notes", "priority", "up", "down", "frequency", "date" and
+                    "id".
+        :returns: A Task
+        """
+        api_keys = {api_key: key for key, api_key
+                    in cls.habitica_keys.items()}
+        api_keys["type"] = "tasktype"
+        api_keys["_id"] = "id"
+        supported_keys = ["text", "tasktype", "notes", "date", "frequency",
+                          "difficulty", "uppable", "downable", "id"]
+
+        data = {}
+        for api_key, value in task_data.items():
+            key = api_keys.get(api_key, api_key)
+            if key in supported_keys and value is not None:
+                data[key] = value
+        if isinstance(data.get("date"), str):
+            # Habitica gives due dates as full timestamps
+            data["date"] = data["date"][:10]
+        if data.get("tasktype") == "todo":
+            # Todos don't have a frequency, even if Habitica reports one
+            data.pop("frequency", None)
+        return cls(data)
 
     def __eq__(self, obj):
         """
@@ -99,6 +137,57 @@ class Task():
                         data=self._task_dict()
                         )
 
+    @staticmethod
+    def create_many_to_challenge(tasks, challenge_id, header):
+        """
+        Add all the given tasks to the given challenge using a single request.
+
+        The IDs of the created tasks are stored in the `id` attribute of the
+        corresponding Task objects.
+
+        :tasks: An iterable of Tasks
+        :challenge_id: The unique identifier of the challenge.
+        :header: Habitica API header
+        """
+        _create_tasks("https://habitica.com/api/v3/tasks/challenge/{}"
+                      "".format(challenge_id), tasks, header)
+
+    @staticmethod
+    def add_many_to_user(tasks, header):
+        """
+        Add all the given tasks to the user using a single request.
+
+        The IDs of the created tasks are stored in the `id` attribute of the
+        corresponding Task objects.
+
+        :tasks: An iterable of Tasks
+        :header: Habitica API header.
+        """
+        _create_tasks("https://habitica.com/api/v3/tasks/user", tasks, header)
+
+    def update(self, header, changes=None):
+        """
+        Send changes of this already-existing task to Habitica.
+
+        :header: Habitica API header
+        :changes: A dict of the changed values using Habitica API keys. By
+                  default the whole task is sent.
+        """
+        if changes is None:
+            changes = self._task_dict()
+        habrequest.put("https://habitica.com/api/v3/tasks/{}".format(self.id),
+                       headers=header, json=changes)
+
+    def delete(self, header):
+        """
+        Delete this task from Habitica.
+
+        :header: Habitica API header
+        """
+        habrequest.delete(
+            "https://habitica.com/api/v3/tasks/{}".format(self.id),
+            headers=header)
+
     def _task_dict(self):
         """
         Return this task in the standard Habitica API form.
@@ -110,6 +199,16 @@ class Task():
                 datadict[self.habitica_keys.get(key, key)] = getattr(self, key)
         return datadict
 
+    def _given_task_dict(self):
+        """
+        Return the values given explicitly for this task in Habitica API form.
+        """
+        given_api_keys = {self.habitica_keys.get(key, key)
+                          for key, value in self._task_data.items()
+                          if value is not None}
+        return {key: value for key, value in self._task_dict().items()
+                if key in given_api_keys}
+
     @property
     def text(self):
         """
@@ -234,8 +333,8 @@ class Task():
     @uppable.setter
     def uppable(self, uppable):
         if isinstance(uppable, bool):
-            self._uppable = str(uppable).lower()
-        elif uppable not in [None, "True", "False", "true", "false"]:
+            uppable = str(uppable)
+        if uppable not in [None, "True", "False", "true", "false"]:
             raise ValueError("Illegal value encountered when setting whether "
                              "a task should have the '+' enabled: must be "
                              "either 'true' or 'false' but {} was encountered."
@@ -251,9 +350,82 @@ class Task():
 
     @downable.setter
     def downable(self, downable):
-        if downable not in [None, "True", "False", "true", "false"] and not isinstance(downable, bool):
+        if isinstance(downable, bool):
+            downable = str(downable)
+        if downable not in [None, "True", "False", "true", "false"]:
             raise ValueError("Illegal value encountered when setting whether "
                              "a task should have the '+' enabled: must be a "
                              "boolean but {} was encountered."
                              "".format(type(downable)))
         self._downable = downable.lower()
+
+
+def _create_tasks(url, tasks, header):
+    """
+    Create the given tasks by posting them to the given URL as one array.
+
+    :url: Habitica API URL for creating tasks
+    :tasks: An iterable of Tasks
+    :header: Habitica API header
+    """
+    tasks = list(tasks)
+    if not tasks:
+        return
+    # pylint: disable=protected-access
+    response = habrequest.post(url, headers=header,
+                               json=[task._task_dict() for task in tasks])
+    created = response.json()["data"]
+    # Habitica responds with a single task instead of a list if only one task
+    # was created
+    if isinstance(created, dict):
+        created = [created]
+    for task, task_data in zip(tasks, created):
+        task.id = task_data["id"]
+
+
+def task_diff(existing, desired):
+    """
+    Determine how the existing tasks must change to match the desired ones.
+
+    Tasks are matched based on their type, text and notes, i.e. the same
+    attributes that are used for comparing tasks. A matched task needs
+    updating if any value set in the desired task differs from the existing
+    one: values not set in the desired task are not compared.
+
+    :existing: An iterable of Tasks that currently exist, with their IDs
+    :desired: An iterable of Tasks that should exist
+    :returns: A tuple (to_create, to_update, to_delete), where to_create and
+              to_delete are lists of Tasks, and to_update is a list of
+              (task, changes) tuples where task is the existing task and
+              changes is a dict of the values to send using Habitica API keys.
+    """
+    # pylint: disable=protected-access
+    existing_tasks = {}
+    to_delete = []
+    for task in existing:
+        if task in existing_tasks:
+            to_delete.append(task)
+        else:
+            existing_tasks[task] = task
+
+    to_create = []
+    to_update = []
+    desired_tasks = set()
+    for task in desired:
+        if task in desired_tasks:
+            continue
+        desired_tasks.add(task)
+        if task not in existing_tasks:
+            to_create.append(task)
+            continue
+        old_task = existing_tasks[task]
+        old_values = old_task._task_dict()
+        changes = {key: value
+                   for key, value in task._given_task_dict().items()
+                   if old_values.get(key) != value}
+        if changes:
+            to_update.append((old_task, changes))
+
+    to_delete.extend(task for task in existing_tasks
+                     if task not in desired_tasks)
+    return (to_create, to_update, to_delete)
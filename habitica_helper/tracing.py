@@ -0,0 +1,107 @@
+"""
+Lightweight tracing of the phases of commands.
+
+The phases of the work done by the tools, such as challenge lookup,
+participant pagination or stock fetch, are wrapped in spans. When tracing is
+not enabled, a span costs only a single check. When it is enabled, the start
+time and duration of each span are recorded, and they can be written in the
+Chrome trace event format for viewing e.g. in chrome://tracing or Perfetto.
+"""
+
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+
+# Recorded spans, or None when tracing is not enabled
+_EVENTS = None
+_EVENTS_LOCK = threading.Lock()
+
+
+def start():
+    """
+    Start recording spans, discarding any previously recorded ones.
+    """
+    global _EVENTS  # pylint: disable=global-statement
+    _EVENTS = []
+
+
+def stop():
+    """
+    Stop recording spans.
+
+    :returns: A list of the recorded spans as Chrome trace event dicts
+    """
+    global _EVENTS  # pylint: disable=global-statement
+    events, _EVENTS = _EVENTS, None
+    return events or []
+
+
+def enabled():
+    """
+    Return True if spans are currently being recorded.
+    """
+    return _EVENTS is not None
+
+
+@contextlib.contextmanager
+def span(name, **args):
+    """
+    Record the time spent in the with block as a span.
+
+    Spans can be nested, and they can be recorded from multiple threads.
+
+    :name: Name of the phase in lowercase words, e.g. "challenge lookup"
+    :args: Additional details shown for the span, e.g. the challenge ID
+    """
+    if _EVENTS is None:
+        yield
+        return
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        end_time = time.perf_counter()
+        event = {
+            "name": name,
+            "cat": name.split(":")[0],
+            "ph": "X",
+            "ts": start_time * 1e6,
+            "dur": (end_time - start_time) * 1e6,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args,
+            }
+        with _EVENTS_LOCK:
+            if _EVENTS is not None:
+                _EVENTS.append(event)
+
+
+def traced(name):
+    """
+    Return a decorator that records each call of a function as a span.
+
+    :name: Name of the phase
+    """
+    def _decorator(function):
+        @functools.wraps(function)
+        def _wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return _wrapper
+    return _decorator
+
+
+def write_chrome_trace(path, events):
+    """
+    Write the given spans to a file in Chrome trace event format.
+
+    :path: Path of the written JSON file
+    :events: A list of spans as returned by `stop`
+    """
+    with open(path, "w", encoding="utf-8") as trace_file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"},
+                  trace_file)
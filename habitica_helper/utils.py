@@ -65,4 +65,12 @@ def timestamp_to_datetime(timestamp_str):
 
     :returns: corresponding datetime
     """
+    # Parsing with strptime is slow, so timestamps in the exact format
+    # Habitica uses are parsed using fromisoformat instead.
+    if (len(timestamp_str) == 24 and timestamp_str[10] == "T"
+            and timestamp_str[19] == "." and timestamp_str[23] == "Z"):
+        try:
+            return datetime.datetime.fromisoformat(timestamp_str[:23])
+        except ValueError:
+            pass
     return datetime.datetime.strptime(timestamp_str, "%Y-%m-%dT%H:%M:%S.%fZ")
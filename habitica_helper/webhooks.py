@@ -0,0 +1,187 @@
+"""
+A receiver for Habitica webhooks.
+
+Instead of polling the progress of every participant when drawing a winner,
+Habitica can send the events to a local listener as they happen. The listener
+records completed challenge todos and party chat messages in a local SQLite
+database, from which they can be read at draw time without API calls.
+
+Note that Habitica sends task events only for the tasks of the user who
+registered the webhook. Completions are therefore only known for participants
+who have registered a webhook pointing to the listener using their own
+credentials, and the progress of the other participants still needs to be
+polled.
+"""
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+
+from habitica_helper import habrequest
+from habitica_helper import storage
+from habitica_helper import utils
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS todo_completions (
+    challenge_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    completed INTEGER NOT NULL,
+    PRIMARY KEY (challenge_id, user_id, task_id)
+);
+"""
+
+WEBHOOK_URL = "https://habitica.com/api/v3/user/webhook"
+
+
+class WebhookState():
+    """
+    Challenge todo completions received from Habitica webhooks.
+    """
+
+    def __init__(self, path=":memory:"):
+        """
+        Open the state database, creating it if it doesn't exist yet.
+
+        :path: Path of the database file
+        """
+        self._connection = storage.connect(path, _SCHEMA)
+
+    def close(self):
+        """
+        Close the database.
+        """
+        self._connection.close()
+
+    def record_task_activity(self, event):
+        """
+        Record a scored challenge todo from a taskActivity event.
+
+        Other events are ignored.
+
+        :event: The event as sent by Habitica
+        :returns: True if the event was recorded
+        """
+        task = event.get("task", {})
+        challenge = task.get("challenge") or {}
+        if (event.get("type") != "scored" or task.get("type") != "todo"
+                or "id" not in challenge or "taskId" not in challenge):
+            return False
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO todo_completions VALUES (?, ?, ?, ?)",
+                (challenge["id"], event["user"]["_id"], challenge["taskId"],
+                 int(bool(task.get("completed")))))
+        return True
+
+    def completers(self, challenge_id, todo_ids):
+        """
+        Return the users known to have completed all the given todos.
+
+        :challenge_id: ID of the challenge
+        :todo_ids: IDs of all todos of the challenge
+        :returns: A set of user IDs
+        """
+        todo_ids = set(todo_ids)
+        completed = {}
+        for user_id, task_id in self._connection.execute(
+                "SELECT user_id, task_id FROM todo_completions "
+                "WHERE challenge_id = ? AND completed = 1", (challenge_id,)):
+            completed.setdefault(user_id, set()).add(task_id)
+        return {user_id for user_id, task_ids in completed.items()
+                if todo_ids <= task_ids}
+
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    """
+    Record an event sent by Habitica.
+    """
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """
+        Handle an event. Only requests to the secret path are accepted.
+        """
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        if self.path.strip("/") != self.server.secret:
+            self.send_response(404)
+            self.end_headers()
+            return
+        try:
+            event = json.loads(body.decode("utf-8"))
+        except ValueError:
+            self.send_response(400)
+            self.end_headers()
+            return
+        handle_event(event, self.server.state, self.server.chat_index)
+        self.send_response(200)
+        self.end_headers()
+
+
+def handle_event(event, state, chat_index=None):
+    """
+    Update the local state based on a webhook event.
+
+    :event: The event as sent by Habitica
+    :state: WebhookState in which task events are recorded
+    :chat_index: ChatIndex in which chat messages are stored under the ID of
+                 their group, or None
+    """
+    webhook_type = event.get("webhookType")
+    if webhook_type == "taskActivity":
+        state.record_task_activity(event)
+    elif webhook_type == "groupChatReceived" and chat_index is not None:
+        chat_index.add([event["chat"]], event["group"]["id"])
+
+
+def make_server(address, secret, state, chat_index=None):
+    """
+    Return a server that records the events sent by Habitica.
+
+    The events are handled one at a time.
+
+    :address: A tuple of (host, port) to listen to
+    :secret: Hard-to-guess path to which the events must be sent, so that
+             others can't send forged events
+    :state: WebhookState in which task events are recorded
+    :chat_index: ChatIndex in which chat messages are stored, or None
+    """
+    server = HTTPServer(address, _WebhookHandler)
+    server.secret = secret.strip("/")
+    server.state = state
+    server.chat_index = chat_index
+    return server
+
+
+def register(header, url, party_id=None):
+    """
+    Register webhooks sending events to the given URL.
+
+    A taskActivity webhook is registered for the user in the header, and if
+    party_id is given, a groupChatReceived webhook for the party. Webhooks
+    that already exist for the URL are not registered again.
+
+    :header: Habitica API header of the user whose events are sent
+    :url: Public URL of the listener, including the secret path
+    :party_id: ID of the party whose chat messages are sent, or None
+    :returns: A list of the types of the registered webhooks
+    """
+    existing = {(webhook["url"], webhook["type"])
+                for webhook in utils.get_dict_from_api(header, WEBHOOK_URL)}
+    webhooks = [{"type": "taskActivity",
+                 "options": {"scored": True}}]
+    if party_id:
+        webhooks.append({"type": "groupChatReceived",
+                         "options": {"groupId": party_id}})
+    registered = []
+    for webhook in webhooks:
+        if (url, webhook["type"]) in existing:
+            continue
+        webhook.update({"url": url, "label": "habitica-helper",
+                        "enabled": True})
+        habrequest.post(WEBHOOK_URL, headers=header, json=webhook)
+        registered.append(webhook["type"])
+    return registered
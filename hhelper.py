@@ -3,27 +3,182 @@ Scripts for automating actions related to Habitica.
 """
 
 from __future__ import print_function
+from concurrent.futures import ThreadPoolExecutor
+import csv
 import datetime
+import json
 import sys
+import time
 
 import click
 
+from conf.accounts import ACCOUNTS
+from conf.archive import ARCHIVE
 from conf import calendars
+from conf import chat
 from conf.header import HEADER
+from conf.webhooks import WEBHOOK_PORT, WEBHOOK_STATE
+from habitica_helper import accounts
+from habitica_helper.archive import ResultArchive
 from habitica_helper.challenge import Challenge
-from habitica_helper.habiticatool import PartyTool
+from habitica_helper.chat import ChatIndex
+from habitica_helper import daemon
+from habitica_helper import habrequest
+from habitica_helper.habiticatool import GroupTool, PartyTool
+from habitica_helper.planner import RequestPlan
+from habitica_helper.scheduler import Scheduler
+from habitica_helper.stockrandomizer import (StockRandomizer, plan_seed,
+                                             prefetch_seed)
+from habitica_helper import tracing
+from habitica_helper import webhooks
+
+
+# Maximum number of challenges processed concurrently
+MAX_WORKERS = 4
+
+# Maximum age of cached Habitica data in seconds, relevant in daemon mode
+CACHE_TTL = 300
+
+_PARTY_TOOL = {"tools": {}, "ttl": CACHE_TTL}
+
+
+def _header():
+    """
+    Return the Habitica API header of the account the command is run for.
+
+    This is HEADER from conf/header.py, except when running a command for
+    each account in conf/accounts.py.
+    """
+    return accounts.current_header(HEADER)
+
+
+def _party_tool():
+    """
+    Return a PartyTool shared between commands run for the same account.
+
+    When running as a daemon or a scheduler, the cached data in the tool is
+    reused by the following commands until it is older than CACHE_TTL.
+    """
+    header = _header()
+    tool, created = _PARTY_TOOL["tools"].get(header["x-api-user"], (None, 0))
+    if tool is None or time.time() - created > _PARTY_TOOL["ttl"]:
+        tool = PartyTool(header)
+        _PARTY_TOOL["tools"][header["x-api-user"]] = (tool, time.time())
+    return tool
+
+
+def _party_id():
+    """
+    Return the ID of the party of the current account.
+
+    Local data shared by several accounts, such as the chat index and the
+    archive, is stored under this ID to keep the data of each party separate.
+    The ID is only fetched once for each cached PartyTool.
+    """
+    return _party_tool().real_group_id()
+
+
+# Number of the most expensive functions shown with --profile
+PROFILE_ROWS = 30
+
+
+def _write_trace(trace_path):
+    """
+    Stop tracing and write the recorded spans to the given file.
+    """
+    tracing.write_chrome_trace(trace_path, tracing.stop())
+
+
+def _print_profile(profiler):
+    """
+    Stop the profiler and print the most expensive functions to stderr.
+    """
+    import pstats  # pylint: disable=import-outside-toplevel
+
+    profiler.disable()
+    stats = pstats.Stats(profiler, stream=sys.stderr)
+    stats.sort_stats("cumulative").print_stats(PROFILE_ROWS)
 
 
 @click.group()
-def cli():
+@click.option("--trace", "trace_path", default=None,
+              type=click.Path(dir_okay=False, writable=True),
+              help=("Record the time spent in each phase of the command and "
+                    "write it to the given file in Chrome trace format."))
+@click.option("--profile", is_flag=True,
+              help=("Profile the command using cProfile and print the most "
+                    "expensive functions to stderr."))
+@click.option("--background", is_flag=True,
+              help=("Make Habitica requests with background priority, letting "
+                    "requests of interactive commands go first."))
+@click.pass_context
+def cli(ctx, trace_path, profile, background):
     """
     Command-line helpers for actions related to Habitica.
     """
-    pass
+    habrequest.share_rate_limits(habrequest.default_rate_limit_path())
+    if background:
+        ctx.with_resource(habrequest.priority(habrequest.BACKGROUND))
+    if trace_path:
+        tracing.start()
+        ctx.call_on_close(lambda: _write_trace(trace_path))
+    if profile:
+        import cProfile  # pylint: disable=import-outside-toplevel
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        ctx.call_on_close(lambda: _print_profile(profiler))
+
+
+_NO_ARCHIVE_OPTION = click.option(
+    "--no-archive", is_flag=True,
+    help="Don't store the result in the archive of drawn winners.")
+
+
+def _open_archive(no_archive):
+    """
+    Return the archive of drawn winners, or None if it isn't used.
+
+    The archive is closed when the command finishes. Until then, requests
+    aren't answered with cached responses during Habitica outages, so that
+    draws are never archived from outdated data.
+    """
+    if no_archive:
+        return None
+    ctx = click.get_current_context()
+    ctx.with_resource(habrequest.fresh_responses())
+    archive = ResultArchive(ARCHIVE)
+    ctx.call_on_close(archive.close)
+    return archive
+
+
+def _winner_str(challenge, randomizer, archive):
+    """
+    Return the winner string of the challenge and archive the draw.
+
+    :challenge: The Challenge whose winner is drawn
+    :randomizer: An unused StockRandomizer
+    :archive: ResultArchive in which the draw is stored, or None
+    """
+    winner = challenge.random_winner(randomizer=randomizer)
+    text = challenge.winner_str(randomizer.date, randomizer.ticker,
+                                randomizer=randomizer, winner=winner)
+    if archive is not None:
+        archive.record(challenge, randomizer, winner,
+                       challenge.completer_str() + "\n\n" + text,
+                       party_id=_party_id())
+    return text
 
 
 @cli.command()
-def sharing_winners():
+@click.option("--verify-chat", is_flag=True,
+              help=("Also list the completers who haven't posted in the "
+                    "party chat since the challenge was created."))
+@click.option("--use-webhooks", is_flag=True,
+              help=("Don't poll the progress of participants whose completion "
+                    "is known from events received by webhook-server."))
+@_NO_ARCHIVE_OPTION
+def sharing_winners(verify_chat, use_webhooks, no_archive):
     """
     Pick winner from amongst all users who are eligible winners.
 
@@ -37,47 +192,279 @@ def sharing_winners():
     order to make sure that the result is indeed deterministic, make sure that
     the stock has already closed for the day before calling the script:
     otherwise e.g. the closing price can still change.
+
+    The result is stored in the archive of drawn winners (ARCHIVE in
+    conf/archive.py) unless --no-archive is given.
     """
-    tool = PartyTool(HEADER)
-    challenge_id = tool.current_sharing_weekend()["id"]
-    challenge = Challenge(HEADER, challenge_id)
+    archive = _open_archive(no_archive)
+    tool = _party_tool()
+    challenge_data = tool.current_sharing_weekend()
+    challenge = Challenge(_header(), challenge_data["id"], challenge_data,
+                          party_tool=tool)
+
+    if use_webhooks:
+        state = webhooks.WebhookState(WEBHOOK_STATE)
+        known = challenge.use_webhook_state(state)
+        state.close()
+        click.echo(u"Completion of {} participants known from webhooks."
+                   u"".format(known))
+        click.echo("")
 
     click.echo(challenge.completer_str())
     click.echo("")
 
+    if verify_chat:
+        party_id = _party_id()
+        chat_index = ChatIndex(chat.CHAT_INDEX)
+        chat_index.sync(_header(), party_id)
+        verified = set(challenge.verified_completers(chat_index,
+                                                     group_id=party_id))
+        chat_index.close()
+        unverified = [member for member in challenge.completers
+                      if member not in verified]
+        if unverified:
+            click.echo("Completers without party chat messages since the "
+                       "challenge was created:")
+            for member in unverified:
+                click.echo(u"{} (@{})".format(member.displayname,
+                                              member.login_name))
+        else:
+            click.echo("All completers have posted in the party chat.")
+        click.echo("")
+
+    click.echo(_winner_str(challenge, StockRandomizer("^AEX", _last_tuesday()),
+                           archive))
+
+
+@cli.command()
+def prefetch_sharing_winners():
+    """
+    Fetch the data needed by sharing-winners in advance.
+
+    The completers of the newest sharing challenge and the stock data are
+    fetched and kept in memory, so that a following sharing-winners command
+    run by the same daemon or scheduler doesn't need to fetch them again. Run
+    this only after the stock has closed for the day.
+    """
+    tool = _party_tool()
+    challenge_data = tool.current_sharing_weekend()
+    challenge = Challenge(_header(), challenge_data["id"], challenge_data,
+                          party_tool=tool)
+    completers = challenge.completers
+    seed = prefetch_seed("^AEX", _last_tuesday())
+    click.echo(u"Prefetched {} completers for challenge \"{}\" and seed {}."
+               u"".format(len(completers), challenge.name, seed))
+
+
+@cli.command()
+def sync_chat():
+    """
+    Add new party chat messages to the local chat index.
+
+    Habitica only returns the 200 newest messages, so run this often enough
+    that no messages are missed, e.g. using the scheduler. The index is used
+    by e.g. sharing-winners --verify-chat. Messages are indexed under the ID
+    of the party, so the index can be shared by several accounts.
+    """
+    party_id = _party_id()
+    chat_index = ChatIndex(chat.CHAT_INDEX)
+    new_messages = chat_index.sync(_header(), party_id)
+    chat_index.close()
+    click.echo(u"{} new messages indexed.".format(new_messages))
+
+
+@cli.command()
+@click.option("--host", default="127.0.0.1", show_default=True,
+              help="Address to listen to.")
+@click.option("--port", default=WEBHOOK_PORT, show_default=True,
+              help="Port to listen to.")
+@click.option("--secret", envvar="HHELPER_WEBHOOK_SECRET", required=True,
+              help=("Secret path to which Habitica sends the events. Can "
+                    "also be given as HHELPER_WEBHOOK_SECRET environment "
+                    "variable."))
+def webhook_server(host, port, secret):
+    """
+    Keep running and record the events sent by Habitica webhooks.
+
+    Completed challenge todos are stored in WEBHOOK_STATE in
+    conf/webhooks.py, and party chat messages in the chat index. Register the
+    webhooks using register-webhooks. Stop the server with Ctrl+C.
+    """
+    state = webhooks.WebhookState(WEBHOOK_STATE)
+    chat_index = ChatIndex(chat.CHAT_INDEX)
+    server = webhooks.make_server((host, port), secret, state, chat_index)
+    click.echo(u"Listening to {}:{}".format(host, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        state.close()
+        chat_index.close()
+
+
+@cli.command()
+@click.argument("url")
+def register_webhooks(url):
+    """
+    Make Habitica send task and party chat events to URL.
+
+    URL must be the public address of webhook-server including the secret
+    path, e.g. https://example.com/SECRET. Habitica only sends the events of
+    the tasks of the user whose credentials are used, so each party member
+    whose progress should be known must register a webhook of their own.
+    """
+    registered = webhooks.register(_header(), url, _party_id())
+    if registered:
+        click.echo(u"Registered webhooks: {}".format(", ".join(registered)))
+    else:
+        click.echo("The webhooks were already registered.")
+
+
+def _last_tuesday():
+    """
+    Return the date of the latest Tuesday, today if it is Tuesday.
+    """
     today = datetime.date.today()
-    last_tuesday = today - datetime.timedelta(today.weekday() - 1)
+    return today - datetime.timedelta(today.weekday() - 1)
 
-    click.echo(challenge.winner_str(last_tuesday, "^AEX"))
+
+_FORMAT_OPTION = click.option(
+    "--format", "output_format", default="text", show_default=True,
+    type=click.Choice(["text", "ndjson", "csv"]),
+    help=("Output format. With ndjson and csv, one record per member is "
+          "printed as soon as the member has been processed."))
+
+_MEMBER_FIELDS = ["id", "displayname", "login_name", "habitica_birthday",
+                  "last_login"]
+
+
+def _member_record(member):
+    """
+    Return a dict representing the given member for machine-readable output.
+    """
+    return {
+        "id": member.id,
+        "displayname": member.displayname,
+        "login_name": member.login_name,
+        "habitica_birthday": member.habitica_birthday.isoformat(),
+        "last_login": member.last_login.isoformat(),
+        }
+
+
+def _stream_records(records, output_format, fields):
+    """
+    Print the given records one at a time as they become available.
+
+    :records: An iterable of dicts
+    :output_format: Either "ndjson" or "csv"
+    :fields: Keys of the records, used as the csv header
+    """
+    if output_format == "csv":
+        writer = csv.DictWriter(sys.stdout, fieldnames=fields,
+                                lineterminator="\n")
+        writer.writeheader()
+    for record in records:
+        if output_format == "csv":
+            writer.writerow(record)
+        else:
+            sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+
+
+def _plan_options(command):
+    """
+    Add the --plan and --max-requests options to the given command.
+    """
+    command = click.option(
+        "--max-requests", type=int, default=None,
+        help=("Do not run the command if it is estimated to make more "
+              "requests than this."))(command)
+    return click.option(
+        "--plan", "show_plan", is_flag=True,
+        help=("Only show the estimated number of requests the command would "
+              "make and how long they would take."))(command)
+
+
+def _follow_plan(plan, show_plan, max_requests):
+    """
+    Show the plan if requested and check that it is within the request budget.
+
+    If the plan exceeds the budget, the program exits with an error message.
+
+    :plan: RequestPlan for the command
+    :show_plan: If True, the plan is printed and the command is not run
+    :max_requests: Maximum number of requests allowed, or None
+    :returns: True if the command should be run
+    """
+    if show_plan:
+        for line in plan.report():
+            click.echo(line)
+        return False
+    if max_requests is not None and plan.total() > max_requests:
+        click.echo("The command would make up to {} requests, which is more "
+                   "than the maximum of {}. Use --plan for details."
+                   "".format(plan.total(), max_requests))
+        sys.exit(1)
+    return True
 
 
 @cli.command()
-def party_members():
+@_FORMAT_OPTION
+def party_members(output_format):
     """
     Show current party members.
     """
-    tool = PartyTool(HEADER)
-    members = tool.party_members()
+    tool = _party_tool()
+    members = tool.iter_members()
+    if output_format != "text":
+        _stream_records((_member_record(member) for member in members),
+                        output_format, _MEMBER_FIELDS)
+        return
     for member in members:
-        print(u"{:<20}(@{})".format(
+        click.echo(u"{:<20}(@{})".format(
             member.displayname.replace("\n", " "),
             member.login_name
             ))
 
 
 @cli.command()
-def party_birthdays():
+@_FORMAT_OPTION
+@_plan_options
+def party_birthdays(output_format, show_plan, max_requests):
     """
     Update party birthdays in the birthday calendar and print them.
 
     The birthdays are stored in the Google calendar whose ID is specified as
     BIRTHDAYS in conf/calendars.py.
     """
-    tool = PartyTool(HEADER)
-    members = tool.party_members()
-    for member in members:
+    tool = _party_tool()
+    if show_plan or max_requests is not None:
+        plan = RequestPlan()
+        tool.plan_birthdays(plan)
+        if not _follow_plan(plan, show_plan, max_requests):
+            return
+
+    results = ((member, tool.ensure_birthday(calendars.BIRTHDAYS, member))
+               for member in tool.iter_members())
+
+    if output_format != "text":
+        def _birthday_records():
+            """
+            Yield a record for each member as soon as it has been processed.
+            """
+            for member, (status, message) in results:
+                record = _member_record(member)
+                record["status"] = status
+                record["message"] = message
+                yield record
+
+        _stream_records(_birthday_records(), output_format,
+                        _MEMBER_FIELDS + ["status", "message"])
+        return
+    for member, result in results:
         bday = member.habitica_birthday
-        result = tool.ensure_birthday(calendars.BIRTHDAYS, member)
         output = u"{:<20} {}.{}.{}\t{}".format(
             member.login_name,
             bday.day,
@@ -88,39 +475,153 @@ def party_birthdays():
 
 
 @cli.command()
-@click.argument("challenge_name")
-def participants(challenge_name):
+@click.option("--days", default=30, show_default=True,
+              help="Days without a login after which a member is inactive.")
+@click.option("--group", "group_id", default="party", show_default=True,
+              help="ID of the group whose members are inspected.")
+def inactive_members(days, group_id):
     """
-    Print list of everyone who completed CHALLENGE_NAME
+    Show group members who haven't logged in recently.
 
-    The given challenge name can be a substring of the whole name. If there are
-    more than one matchin challenge, the newest one of them is returned.
+    In addition to the inactive members, percentiles of the time since the
+    last login and the number of members who joined Habitica each year are
+    shown.
     """
-    tool = PartyTool(HEADER)
-    challenge_id = tool.newest_matching_challenge([challenge_name], [])["id"]
-    challenge = Challenge(HEADER, challenge_id)
+    # numpy is slow to import, so it is only imported when needed
+    # pylint: disable=import-outside-toplevel
+    from habitica_helper.roster import Roster
 
-    click.echo(challenge.completer_str())
+    tool = GroupTool(_header(), group_id, cache_members=False)
+    roster = Roster(tool.iter_members())
+    inactive = roster.inactive(days)
+    idle_days = inactive.days_since_login()
+
+    click.echo(u"{} of {} members have not logged in for {} days:".format(
+        len(inactive), len(roster), days))
+    if not len(roster):  # pylint: disable=len-as-condition
+        return
+    for login_name, last_login, idle in zip(
+            inactive.login_names, inactive.last_logins, idle_days):
+        click.echo(u"{:<20} last login {} ({:.0f} days ago)".format(
+            login_name, last_login.astype("datetime64[D]"), idle))
+
+    click.echo("")
+    click.echo("Days since last login:")
+    for percentile, value in roster.login_recency_percentiles().items():
+        click.echo(u"  {:>3}th percentile: {:.1f}".format(percentile, value))
+
+    click.echo("")
+    click.echo("Members by the year they joined Habitica:")
+    for year_start, count in roster.join_cohorts().items():
+        click.echo(u"  {}: {}".format(year_start.year, count))
+
+
+def _matching_challenges(tool, challenge_names):
+    """
+    Return the challenges matching the given names.
+
+    A name containing any of the characters *?[ is a shell-style pattern
+    matched against whole challenge names, and all matching challenges are
+    returned, the newest first. Other names match the newest challenge whose
+    name contains them. Each challenge is returned only once.
+
+    All challenges share the given tool, so that participants of multiple
+    challenges are fetched only once. If a name doesn't match any challenge,
+    the program exits with an error message.
+
+    :tool: PartyTool used for finding the challenges
+    :challenge_names: Iterable of (partial) challenge names and patterns
+    :returns: A list of Challenge objects
+    """
+    matching = {}
+    for challenge_name in challenge_names:
+        if any(char in challenge_name for char in "*?["):
+            found = tool.challenges_matching_pattern(challenge_name)
+        else:
+            newest = tool.newest_matching_challenge([challenge_name], [])
+            found = [] if newest is None else [newest]
+        if not found:
+            click.echo("No challenge matching \"{}\" found."
+                       "".format(challenge_name))
+            sys.exit(1)
+        for challenge_data in found:
+            matching.setdefault(challenge_data["id"], challenge_data)
+    return [Challenge(_header(), challenge_id, challenge_data,
+                      party_tool=tool)
+            for challenge_id, challenge_data in matching.items()]
+
+
+def _fetch_completers(challenges):
+    """
+    Determine the completers of all given challenges concurrently.
+
+    :challenges: Iterable of Challenge objects
+    """
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        for _ in executor.map(habrequest.with_current_priority(
+                lambda challenge: challenge.completers), challenges):
+            pass
+
+
+@cli.command()
+@click.argument("challenge_names", nargs=-1, required=True)
+@_FORMAT_OPTION
+def participants(challenge_names, output_format):
+    """
+    Print list of everyone who completed CHALLENGE_NAMES
+
+    The given challenge names can be substrings of the whole names. If there
+    are more than one matching challenge for a name, the newest one of them is
+    used. A name containing *, ? or [ is a pattern matched against whole
+    names, e.g. "Sharing Weekend *", and all matching challenges are used.
+    If multiple challenge names are given, the challenges are processed
+    concurrently, except with machine-readable output formats, where the
+    completers of each challenge are streamed in order.
+    """
+    tool = _party_tool()
+    challenges = _matching_challenges(tool, challenge_names)
+
+    if output_format != "text":
+        def _completer_records():
+            """
+            Yield a record for each completer as soon as it is found.
+            """
+            for challenge in challenges:
+                for member in challenge.iter_completers():
+                    record = _member_record(member)
+                    record["challenge_id"] = challenge.id
+                    record["challenge_name"] = challenge.name
+                    yield record
+
+        _stream_records(_completer_records(), output_format,
+                        _MEMBER_FIELDS + ["challenge_id", "challenge_name"])
+        return
+
+    _fetch_completers(challenges)
+    click.echo("\n\n".join(challenge.completer_str()
+                           for challenge in challenges))
 
 
 @cli.command()
-@click.argument("challenge_name")
+@click.argument("challenge_names", nargs=-1, required=True)
 @click.option("--stock_date", "stock_timestamp", default=None,
               help=("Date for which the stock data is used. Defaults to "
                     "today. Must be given in format YYYYMMDD."))
 @click.option("--stock-name", default="^AEX",
               help="Stock exhange symbol (defaults to '^AEX')")
-def pick_winner(challenge_name, stock_timestamp, stock_name):
-    """
-    Print participants and random-selected winner for a challenge.
+@_plan_options
+@_NO_ARCHIVE_OPTION
+def pick_winner(challenge_names, stock_timestamp, stock_name, show_plan,
+                max_requests, no_archive):
     """
-    tool = PartyTool(HEADER)
-    challenge_id = tool.newest_matching_challenge([challenge_name], [])["id"]
-    challenge = Challenge(HEADER, challenge_id)
-
-    click.echo(challenge.completer_str())
-    click.echo("")
+    Print participants and random-selected winner for challenges.
 
+    CHALLENGE_NAMES are matched as with participants. If there are multiple
+    challenges, they are processed concurrently and the stock data is fetched
+    only once. Each challenge gets the same winner as it would if it was drawn
+    alone. The results are stored in the archive of drawn winners unless
+    --no-archive is given.
+    """
     if not stock_timestamp:
         stock_date = datetime.date.today()
     else:
@@ -132,8 +633,169 @@ def pick_winner(challenge_name, stock_timestamp, stock_name):
                        "`YYYYMMDD`.")
             sys.exit(1)
 
-    click.echo(challenge.winner_str(stock_date, stock_name))
+    tool = _party_tool()
+    if show_plan or max_requests is not None:
+        plan = RequestPlan()
+        tool.plan_challenge_lookup(plan)
+        for challenge in _matching_challenges(tool, challenge_names):
+            challenge.plan_completers(plan)
+        plan_seed(plan, stock_name, stock_date)
+        if not no_archive:
+            tool.plan_real_group_id(plan)
+        if not _follow_plan(plan, show_plan, max_requests):
+            return
+
+    archive = _open_archive(no_archive)
+
+    challenges = _matching_challenges(tool, challenge_names)
+    _fetch_completers(challenges)
+    stock = StockRandomizer(stock_name, stock_date)
+
+    outputs = []
+    for challenge in challenges:
+        randomizer = StockRandomizer(stock_name, stock_date, seed=stock.seed,
+                                     prices=stock.prices)
+        outputs.append(challenge.completer_str() + "\n\n" +
+                       _winner_str(challenge, randomizer, archive))
+    click.echo("\n\n".join(outputs))
+
+
+@cli.command()
+@click.option("--days", default=365, show_default=True,
+              help="Number of past days whose draws are included.")
+@click.option("--limit", default=10, show_default=True,
+              help="Number of members shown.")
+def most_wins(days, limit):
+    """
+    Show the members who have won most challenges according to the archive.
+
+    Only the newest draw of each challenge is counted, so drawing a winner
+    again for the same challenge doesn't count twice. Only draws for the party
+    of the current account are included.
+    """
+    party_id = _party_id()
+    archive = ResultArchive(ARCHIVE)
+    since = (datetime.datetime.now(datetime.timezone.utc)
+             - datetime.timedelta(days=days))
+    for _, login_name, wins in archive.most_wins(since, limit, party_id):
+        click.echo(u"{:<20} {}".format(login_name, wins))
+    archive.close()
+
+
+@cli.command()
+@click.option("--min-length", default=4, show_default=True,
+              help="Minimum number of consecutive weeks shown.")
+@click.option("--challenge", "challenge_name", default=None,
+              help="Only consider challenges whose name contains this.")
+def streaks(min_length, challenge_name):
+    """
+    Show members who completed archived challenges many weeks in a row.
+
+    Only challenges of the party of the current account are considered.
+    """
+    party_id = _party_id()
+    archive = ResultArchive(ARCHIVE)
+    for _, login_name, length, first_monday in archive.completion_streaks(
+            min_length, challenge_name, party_id):
+        click.echo(u"{:<20} {} weeks from {}".format(
+            login_name, length, first_monday.isoformat()))
+    archive.close()
+
+
+@cli.command(name="daemon")
+@click.option("--socket", "socket_path", default=None,
+              help=("Path of the Unix socket to listen to. Defaults to "
+                    "HHELPER_SOCKET environment variable or a per-user "
+                    "socket in XDG_RUNTIME_DIR or the temp directory."))
+def run_daemon(socket_path):
+    """
+    Keep running and execute commands sent by other hhelper.py invocations.
+
+    While the daemon is running, other invocations of hhelper.py send their
+    commands to it instead of running them themselves. This way the HTTP
+    connections, cached Habitica data and calendar credentials are reused
+    between commands. Stop the daemon with Ctrl+C.
+    """
+    socket_path = socket_path or daemon.default_socket_path()
+    if daemon.is_running(socket_path):
+        click.echo("A daemon is already listening to {}".format(socket_path))
+        sys.exit(1)
+    click.echo("Listening to {}".format(socket_path))
+    try:
+        daemon.serve(cli, socket_path)
+    except RuntimeError as err:
+        click.echo(str(err))
+        sys.exit(1)
+
+
+@cli.command()
+def scheduler():
+    """
+    Keep running and execute the jobs scheduled in conf/schedule.py.
+
+    The jobs are run one at a time in this process, and data fetched by a job
+    is reused by jobs run within SHARE_WINDOW seconds from it. The jobs make
+    their requests with background priority. Stop the scheduler with Ctrl+C.
+    """
+    # pylint: disable=import-outside-toplevel
+    from conf import schedule
+
+    def _run_job(args):
+        """
+        Run a scheduled hhelper.py command and report its exit code.
+        """
+        click.echo(u"[{:%Y-%m-%d %H:%M}] hhelper.py {}".format(
+            datetime.datetime.now(), " ".join(args)))
+        with habrequest.priority(habrequest.BACKGROUND):
+            exit_code = daemon.run_command(cli, args, sys.stdout)
+        if exit_code:
+            click.echo(u"Command failed with exit code {}".format(exit_code))
+
+    _PARTY_TOOL["ttl"] = schedule.SHARE_WINDOW
+    job_scheduler = Scheduler(schedule.JOBS, _run_job)
+    for spec, args in schedule.JOBS:
+        click.echo(u"{:<16}hhelper.py {}".format(spec, " ".join(args)))
+    try:
+        job_scheduler.run_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+@cli.command(context_settings={"ignore_unknown_options": True})
+@click.argument("args", nargs=-1, type=click.UNPROCESSED, required=True)
+def all_accounts(args):
+    """
+    Run the given hhelper.py command for every account in conf/accounts.py.
+
+    The command is run for all accounts concurrently, each with its own rate
+    limit budget and HTTP connections, and the output for each account is
+    printed once all of them have finished. For example:
+
+        hhelper.py all-accounts party-birthdays
+    """
+    if "all-accounts" in args:
+        raise click.UsageError("all-accounts can't run all-accounts.")
+    results = accounts.run_for_accounts(cli, ACCOUNTS, list(args))
+    failed = False
+    for name, (exit_code, output) in results.items():
+        click.echo(u"=== {} ===".format(name))
+        click.echo(output, nl=False)
+        if exit_code:
+            click.echo(u"Command failed with exit code {}".format(exit_code))
+            failed = True
+        click.echo("")
+    if failed:
+        sys.exit(1)
+
+
+# Long-running commands that must not be forwarded to a running daemon, as
+# they would block it from running other commands
+_LOCAL_COMMANDS = {"daemon", "scheduler", "webhook-server"}
 
 
 if __name__ == "__main__":
+    if not _LOCAL_COMMANDS.intersection(sys.argv[1:]):
+        EXIT_CODE = daemon.forward(sys.argv[1:])
+        if EXIT_CODE is not None:
+            sys.exit(EXIT_CODE)
     cli()
@@ -17,11 +17,12 @@ setuptools.setup(
         "Programming Language :: Python :: 3",
         "Operating System :: OS Independent",
     ],
-    python_requires='>=3.6',
+    python_requires='>=3.7',
     install_requires=[
         "click",
         "requests",
         "yfinance",
+        "numpy",
         "google-api-python-client",
         "google-auth-httplib2",
         "google-auth-oauthlib",
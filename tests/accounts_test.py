@@ -0,0 +1,82 @@
+"""
+Test running commands for multiple accounts
+"""
+
+import sys
+import threading
+
+import click
+import requests_mock
+
+from habitica_helper import accounts
+from habitica_helper import habrequest
+
+
+ACCOUNTS = {
+    "Party A": {"x-client": "habot-testing", "x-api-user": "user-a",
+                "x-api-key": "key-a"},
+    "Party B": {"x-client": "habot-testing", "x-api-user": "user-b",
+                "x-api-key": "key-b"},
+}
+
+USER_URL = "https://habitica.com/api/v3/user"
+
+_BARRIER = threading.Barrier(len(ACCOUNTS), timeout=5)
+
+
+@click.group()
+def cli():
+    """
+    A command group for testing.
+    """
+
+
+@cli.command()
+def whoami():
+    """
+    Print the name of the current user once all accounts are running.
+    """
+    header = accounts.current_header(None)
+    _BARRIER.wait()
+    name = habrequest.get(USER_URL, header).json()["data"][
+        header["x-api-user"]]
+    click.echo("Hello {}!".format(name))
+    if name == "Bob":
+        sys.exit(2)
+
+
+@cli.command()
+def nested():
+    """
+    Try to run whoami for all accounts from a command run for an account.
+    """
+    accounts.run_for_accounts(cli, ACCOUNTS, ["whoami"])
+
+
+# pylint: disable=protected-access
+def test_run_for_accounts():
+    """
+    Test that commands run concurrently with separate output and sessions.
+    """
+    with requests_mock.Mocker() as mock:
+        mock.get(USER_URL, json={"data": {"user-a": "Alice",
+                                          "user-b": "Bob"}})
+        results = accounts.run_for_accounts(cli, ACCOUNTS, ["whoami"])
+
+    assert results == {"Party A": (0, "Hello Alice!\n"),
+                       "Party B": (2, "Hello Bob!\n")}
+    sessions = {id(habrequest._session(header))
+                for header in ACCOUNTS.values()}
+    assert len(sessions) == 2
+    assert habrequest._SESSION is not habrequest._session(ACCOUNTS["Party A"])
+    assert accounts.current_header("default") == "default"
+
+
+def test_nested_run_is_rejected():
+    """
+    Test that a command run for an account can't run commands for all of them.
+    """
+    results = accounts.run_for_accounts(cli, ACCOUNTS, ["nested"])
+    for exit_code, output in results.values():
+        assert exit_code == 1
+        assert "RuntimeError" in output
@@ -0,0 +1,158 @@
+"""
+Test the archive of drawn winners
+"""
+
+import datetime
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+from habitica_helper.archive import ResultArchive
+from habitica_helper.stockrandomizer import StockRandomizer
+
+
+PRICES = {"Open": 595.95, "High": 597.73, "Low": 590.66, "Close": 591.91}
+
+
+def _member(name):
+    """
+    Return a stand-in for a Member with the given login name.
+    """
+    return SimpleNamespace(id="id-" + name, login_name=name,
+                           displayname=name.title())
+
+
+def _challenge(number, completers, name="Sharing Weekend"):
+    """
+    Return a stand-in for a Challenge whose completers are already known.
+    """
+    return SimpleNamespace(id="challenge-{}".format(number),
+                           name="{} {}".format(name, number),
+                           completers=[_member(name) for name in completers])
+
+
+def _randomizer():
+    """
+    Return a randomizer based on known stock prices.
+    """
+    return StockRandomizer("^AEX", datetime.date(2020, 3, 10), seed=95957366,
+                           prices=PRICES)
+
+
+def _record(archive, challenge, winner, week, party_id="party-1"):
+    """
+    Archive a draw made on Tuesday of the given week of 2020.
+    """
+    drawn_at = datetime.datetime(2020, 1, 7) + datetime.timedelta(weeks=week)
+    return archive.record(challenge, _randomizer(), _member(winner),
+                          "{} wins the challenge!".format(winner), drawn_at,
+                          party_id)
+
+
+def test_draw_is_stored():
+    """
+    Test that the seed, prices, winner and completers of a draw are stored.
+    """
+    archive = ResultArchive()
+    _record(archive, _challenge(1, ["alice", "bob"]), "bob", 0)
+    draw, = archive.draws("challenge-1")
+    assert draw["seed"] == 95957366
+    assert [draw[key] for key in ["open", "high", "low", "close"]] == [
+        595.95, 597.73, 590.66, 591.91]
+    assert draw["winner_id"] == "id-bob"
+    assert draw["output"] == "bob wins the challenge!"
+    archive.close()
+
+
+def test_archive_is_append_only():
+    """
+    Test that archived draws can't be changed or removed.
+    """
+    archive = ResultArchive()
+    _record(archive, _challenge(1, ["alice"]), "alice", 0)
+    # pylint: disable=protected-access
+    with pytest.raises(sqlite3.DatabaseError):
+        archive._connection.execute("UPDATE draws SET winner_id = 'id-eve'")
+    with pytest.raises(sqlite3.DatabaseError):
+        archive._connection.execute("DELETE FROM completions")
+    archive.close()
+
+
+def test_most_wins_counts_latest_draws():
+    """
+    Test that redrawn challenges are only counted once, for the latest winner.
+    """
+    archive = ResultArchive()
+    _record(archive, _challenge(1, ["alice", "bob"]), "alice", 0)
+    _record(archive, _challenge(1, ["alice", "bob"]), "bob", 0)
+    _record(archive, _challenge(2, ["alice", "bob"]), "bob", 1)
+    _record(archive, _challenge(3, ["alice", "bob"]), "alice", 40)
+    assert archive.most_wins(datetime.datetime(2020, 1, 1)) == [
+        ("id-bob", "bob", 2), ("id-alice", "alice", 1)]
+    assert archive.most_wins(datetime.datetime(2020, 6, 1)) == [
+        ("id-alice", "alice", 1)]
+    archive.close()
+
+
+def test_completion_streaks():
+    """
+    Test that runs of consecutive weeks are found for each user.
+    """
+    archive = ResultArchive()
+    weeks = {0: ["alice", "bob"], 1: ["alice", "bob"], 2: ["alice"],
+             4: ["alice", "bob"], 5: ["bob"]}
+    for week, completers in weeks.items():
+        _record(archive, _challenge(week, completers), completers[0], week)
+    _record(archive, _challenge(9, ["bob"], name="Other"), "bob", 3)
+
+    assert archive.completion_streaks(2, "sharing") == [
+        ("id-alice", "alice", 3, datetime.date(2020, 1, 6)),
+        ("id-bob", "bob", 2, datetime.date(2020, 2, 3)),
+        ("id-bob", "bob", 2, datetime.date(2020, 1, 6)),
+        ]
+    assert archive.completion_streaks(3) == [
+        ("id-bob", "bob", 3, datetime.date(2020, 1, 27)),
+        ("id-alice", "alice", 3, datetime.date(2020, 1, 6)),
+        ]
+    archive.close()
+
+
+def test_parties_are_separate():
+    """
+    Test that results can be limited to the draws of one party.
+    """
+    archive = ResultArchive()
+    _record(archive, _challenge(1, ["alice", "bob"]), "alice", 0)
+    _record(archive, _challenge(2, ["bob"]), "bob", 1)
+    _record(archive, _challenge(3, ["carol"]), "carol", 0, "party-2")
+    _record(archive, _challenge(4, ["carol"]), "carol", 1, "party-2")
+    since = datetime.datetime(2020, 1, 1)
+    assert archive.most_wins(since, party_id="party-1") == [
+        ("id-alice", "alice", 1), ("id-bob", "bob", 1)]
+    assert archive.most_wins(since, party_id="party-2") == [
+        ("id-carol", "carol", 2)]
+    assert archive.completion_streaks(2, party_id="party-1") == [
+        ("id-bob", "bob", 2, datetime.date(2020, 1, 6))]
+    assert len(archive.most_wins(since)) == 3
+    archive.close()
+
+
+def test_party_column_is_added(tmp_path):
+    """
+    Test that archives created before draws had a party can still be used.
+    """
+    path = str(tmp_path / "archive.sqlite")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE draws (id INTEGER PRIMARY KEY, "
+                       "challenge_id TEXT NOT NULL, challenge_name TEXT, "
+                       "drawn_at INTEGER NOT NULL, week INTEGER NOT NULL, "
+                       "ticker TEXT, stock_date TEXT, seed INTEGER, "
+                       "open REAL, high REAL, low REAL, close REAL, "
+                       "winner_id TEXT, winner_name TEXT, output TEXT)")
+    connection.close()
+    archive = ResultArchive(path)
+    _record(archive, _challenge(1, ["alice"]), "alice", 0)
+    draw, = archive.draws("challenge-1")
+    assert draw["party_id"] == "party-1"
+    archive.close()
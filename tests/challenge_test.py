@@ -0,0 +1,325 @@
+"""
+Test Challenge class
+"""
+
+import datetime
+import random
+from urllib.parse import parse_qs
+
+import pytest
+import requests
+import requests_mock
+
+from habitica_helper import challenge as challenge_module
+from habitica_helper.challenge import Challenge
+from habitica_helper.chat import ChatIndex
+from habitica_helper.stockrandomizer import StockRandomizer
+from habitica_helper.task import Task
+from habitica_helper.webhooks import WebhookState
+
+
+CHALLENGE_ID = "6a6b6ee6-2b68-4d4d-9b1c-8e2f7a2d3f01"
+COMPLETER_IDS = [
+    "1b3c2d4e-0000-4000-8000-000000000001",
+    "1b3c2d4e-0000-4000-8000-000000000002",
+    "1b3c2d4e-0000-4000-8000-000000000003",
+    ]
+SLACKER_ID = "1b3c2d4e-0000-4000-8000-000000000004"
+
+
+@pytest.fixture
+def api_header():
+    """
+    Return a structurally valid API header
+    """
+    return {
+        "x-client": "f687a6c7-860a-4c7c-8a07-9d0dcbb7c831-habot-testing",
+        "x-api-user": "8415a003-ef41-4168-9f8e-50baa099d37e",
+        "x-api-key": "4f1f9c07-0dab-4820-a80b-cf47a5f54ecf",
+    }
+
+
+def _member_data(user_id):
+    """
+    Return member data for the given user as returned by Habitica API.
+    """
+    number = user_id[-1]
+    return {
+        "_id": user_id,
+        "auth": {"local": {"username": "user{}".format(number)},
+                 "timestamps": {
+                     "created": "2020-01-04T21:11:35.201Z",
+                     "loggedin": "2022-01-06T08:09:17.096Z"}},
+        "profile": {"name": "User {}".format(number)},
+        }
+
+
+@pytest.fixture
+def mock_challenge_api():
+    """
+    Respond to API calls regarding a challenge with four participants.
+
+    Three of the participants have completed all todos, one hasn't.
+    """
+    api = "https://habitica.com/api/v3"
+    with requests_mock.Mocker() as mock:
+        mock.get("{}/challenges/{}".format(api, CHALLENGE_ID),
+                 json={"data": {"id": CHALLENGE_ID,
+                                "name": "Test Challenge",
+                                "summary": "Testing things",
+                                "description": "A challenge for tests"}})
+        mock.get("{}/challenges/{}/members".format(api, CHALLENGE_ID),
+                 json={"data": [{"id": uid} for uid
+                                in COMPLETER_IDS + [SLACKER_ID]]})
+        for uid in COMPLETER_IDS + [SLACKER_ID]:
+            completed = uid != SLACKER_ID
+            mock.get("{}/challenges/{}/members/{}".format(
+                         api, CHALLENGE_ID, uid),
+                     json={"data": {"tasks": [
+                         {"type": "habit"},
+                         {"type": "todo", "completed": True},
+                         {"type": "todo", "completed": completed},
+                         ]}})
+            mock.get("{}/members/{}".format(api, uid),
+                     json={"data": _member_data(uid)})
+        yield mock
+
+
+# pylint doesn't understand fixtures
+# pylint: disable=redefined-outer-name
+@pytest.mark.usefixtures("mock_challenge_api")
+def test_completers(api_header):
+    """
+    Test that only participants who completed all todos are completers.
+    """
+    challenge = Challenge(api_header, CHALLENGE_ID)
+    assert [member.id for member in challenge.completers] == COMPLETER_IDS
+
+
+@pytest.mark.usefixtures("mock_challenge_api")
+def test_iter_completers(api_header):
+    """
+    Test that streamed completers are the same as the sorted completers.
+    """
+    challenge = Challenge(api_header, CHALLENGE_ID)
+    assert sorted(member.id for member in challenge.iter_completers()) \
+        == COMPLETER_IDS
+
+
+def test_verified_completers(api_header, mock_challenge_api):
+    """
+    Test that only completers who posted in the chat are verified.
+    """
+    mock_challenge_api.get(
+        "https://habitica.com/api/v3/groups/party/chat",
+        json={"data": [
+            {"id": "message-2", "uuid": COMPLETER_IDS[2],
+             "timestamp": "2020-05-02T10:00:00.000Z", "text": "A success"},
+            {"id": "message-1", "uuid": COMPLETER_IDS[0],
+             "timestamp": "2020-04-20T10:00:00.000Z", "text": "Too early"},
+            ]})
+    chat_index = ChatIndex()
+    chat_index.sync(api_header)
+    challenge = Challenge(api_header, CHALLENGE_ID,
+                          {"createdAt": "2020-05-01T12:00:00.000Z"})
+    assert [member.id for member
+            in challenge.verified_completers(chat_index)] == [
+                COMPLETER_IDS[2]]
+
+
+def test_completers_from_webhook_state(api_header, mock_challenge_api):
+    """
+    Test that participants known to be completers from webhooks aren't polled.
+    """
+    mock_challenge_api.get(
+        "https://habitica.com/api/v3/tasks/challenge/{}".format(CHALLENGE_ID),
+        json={"data": [{"id": "todo-1", "type": "todo", "text": "Share"},
+                       {"id": "habit-1", "type": "habit", "text": "Cheer"}]})
+    state = WebhookState()
+    state.record_task_activity({
+        "type": "scored", "user": {"_id": COMPLETER_IDS[0]},
+        "task": {"type": "todo", "completed": True,
+                 "challenge": {"id": CHALLENGE_ID, "taskId": "todo-1"}}})
+    challenge = Challenge(api_header, CHALLENGE_ID)
+    assert challenge.use_webhook_state(state) == 1
+    assert [member.id for member in challenge.completers] == COMPLETER_IDS
+    polled = [request.path for request in mock_challenge_api.request_history
+              if "/challenges/{}/members/".format(CHALLENGE_ID)
+              in request.path]
+    assert len(polled) == 3
+    assert COMPLETER_IDS[0] not in " ".join(polled)
+
+
+@pytest.mark.usefixtures("mock_challenge_api")
+def test_stock_winner_does_not_touch_global_rng(api_header):
+    """
+    Test that picking a winner doesn't reseed the global random module.
+    """
+    challenge = Challenge(api_header, CHALLENGE_ID)
+    state = random.getstate()
+    randomizer = StockRandomizer("^AEX", datetime.date(2020, 3, 10),
+                                 seed=95957366)
+    winner = challenge.random_winner(randomizer=randomizer)
+    assert winner.id in COMPLETER_IDS
+    assert random.getstate() == state
+
+
+def test_nobody_wins_without_completers(api_header):
+    """
+    Test that a challenge nobody completed has no winner instead of an error.
+    """
+    challenge = Challenge(api_header, CHALLENGE_ID,
+                          {"id": CHALLENGE_ID, "name": "Empty Challenge"})
+    challenge._completers = []  # pylint: disable=protected-access
+    randomizer = StockRandomizer("^AEX", datetime.date(2020, 3, 10),
+                                 seed=95957366)
+    assert challenge.random_winner(randomizer=randomizer) is None
+    assert challenge.winner_str(randomizer.date, randomizer.ticker,
+                                randomizer=randomizer).endswith(
+                                    "Nobody completed the challenge, so "
+                                    "nobody wins.")
+
+
+@pytest.mark.usefixtures("mock_challenge_api")
+def test_winner_str_describes_given_winner(api_header):
+    """
+    Test that an already-picked winner is described without drawing again.
+    """
+    challenge = Challenge(api_header, CHALLENGE_ID)
+    randomizer = StockRandomizer("^AEX", datetime.date(2020, 3, 10),
+                                 seed=95957366)
+    winner = challenge.random_winner(randomizer=randomizer)
+    text = challenge.winner_str(randomizer.date, randomizer.ticker,
+                                randomizer=randomizer, winner=winner)
+    assert text.endswith("{} wins the challenge!".format(winner))
+    fresh = StockRandomizer("^AEX", datetime.date(2020, 3, 10),
+                            seed=95957366)
+    fresh.pick_integer(0, len(challenge.completers) - 1)
+    assert (randomizer.pick_integer(0, 10**6)
+            == fresh.pick_integer(0, 10**6))
+
+
+@pytest.mark.usefixtures("mock_challenge_api")
+def test_draw_winners_fetches_stock_once(monkeypatch, api_header):
+    """
+    Test that drawing winners for many challenges fetches stock data once.
+
+    The result for each challenge must also be the same as when drawing the
+    winner for that challenge alone.
+    """
+    seed_fetches = []
+
+    def _fake_seed(self, ticker, date):
+        # pylint: disable=unused-argument
+        seed_fetches.append((ticker, date))
+        return 95957366
+
+    monkeypatch.setattr(StockRandomizer, "_stock_seed", _fake_seed)
+    date = datetime.date(2020, 3, 10)
+    challenges = [Challenge(api_header, CHALLENGE_ID) for _ in range(3)]
+
+    seed, winners = challenge_module.draw_winners(challenges, date, "^AEX")
+
+    assert seed == 95957366
+    assert len(seed_fetches) == 1
+    single_winner = challenges[0].random_winner(date, "^AEX")
+    assert winners == [single_winner] * 3
+
+
+def test_preloaded_challenge_is_not_fetched(api_header, mock_challenge_api):
+    """
+    Test that challenge data is not fetched when all needed data is given.
+    """
+    challenge = Challenge(api_header, CHALLENGE_ID,
+                          {"id": CHALLENGE_ID, "name": "Listed Challenge"})
+    assert challenge.name == "Listed Challenge"
+    assert mock_challenge_api.call_count == 0
+
+
+def test_missing_field_is_fetched_once(api_header, mock_challenge_api):
+    """
+    Test that the full data is fetched once when a missing field is needed.
+    """
+    challenge = Challenge(api_header, CHALLENGE_ID,
+                          {"id": CHALLENGE_ID, "name": "Listed Challenge"})
+    assert challenge.summary == "Testing things"
+    assert challenge.description == "A challenge for tests"
+    assert challenge.name == "Listed Challenge"
+    assert mock_challenge_api.call_count == 1
+
+
+def test_update_without_changes(api_header, mock_challenge_api):
+    """
+    Test that nothing is sent when the challenge data hasn't changed.
+    """
+    challenge = Challenge(api_header, CHALLENGE_ID,
+                          {"id": CHALLENGE_ID, "name": "Test Challenge"})
+    challenge.name = "Test Challenge"
+    assert not challenge.update()
+    assert mock_challenge_api.call_count == 0
+
+
+def test_update_sends_only_changes(api_header, mock_challenge_api):
+    """
+    Test that only the changed fields are sent when updating a challenge.
+    """
+    mock_challenge_api.put(
+        "https://habitica.com/api/v3/challenges/{}".format(CHALLENGE_ID),
+        json={"data": {}})
+    challenge = Challenge(api_header, CHALLENGE_ID)
+    challenge.name = challenge.name
+    challenge.summary = "A new summary"
+
+    assert challenge.update()
+    assert parse_qs(mock_challenge_api.last_request.text) == {
+        "summary": ["A new summary"]}
+    assert challenge.summary == "A new summary"
+
+    assert not challenge.update()
+
+
+def test_failed_update_keeps_changes(api_header, mock_challenge_api):
+    """
+    Test that changes are sent again after a failed update.
+    """
+    url = "https://habitica.com/api/v3/challenges/{}".format(CHALLENGE_ID)
+    mock_challenge_api.put(url, status_code=400, json={})
+    challenge = Challenge(api_header, CHALLENGE_ID)
+    challenge.summary = "A new summary"
+
+    with pytest.raises(requests.HTTPError):
+        challenge.update()
+    assert challenge.summary == "A new summary"
+
+    mock_challenge_api.put(url, json={"data": {}})
+    assert challenge.update()
+    assert parse_qs(mock_challenge_api.last_request.text) == {
+        "summary": ["A new summary"]}
+
+
+def test_sync_tasks(api_header, mock_challenge_api):
+    """
+    Test that syncing makes only the needed requests.
+    """
+    api = "https://habitica.com/api/v3"
+    existing = [{"id": "keep", "type": "todo", "text": "keep"},
+                {"id": "remove", "type": "todo", "text": "remove"}]
+    mock_challenge_api.get("{}/tasks/challenge/{}".format(api, CHALLENGE_ID),
+                           json={"data": existing})
+    mock_challenge_api.post(
+        "{}/tasks/challenge/{}".format(api, CHALLENGE_ID),
+        json={"data": [{"id": "created"}]})
+    mock_challenge_api.delete("{}/tasks/remove".format(api),
+                              json={"data": {}})
+    challenge = Challenge(api_header, CHALLENGE_ID, {"id": CHALLENGE_ID})
+
+    created, updated, deleted = challenge.sync_tasks([
+        Task.from_api({"type": "todo", "text": "keep"}),
+        Task.from_api({"type": "todo", "text": "add"}),
+        ])
+
+    assert [task.id for task in created] == ["created"]
+    assert updated == []
+    assert [task.id for task in deleted] == ["remove"]
+    assert [request.method for request in mock_challenge_api.request_history
+            ] == ["GET", "POST", "DELETE"]
@@ -0,0 +1,62 @@
+"""
+Test the party chat index
+"""
+
+from datetime import datetime
+
+import pytest
+import requests_mock
+
+from habitica_helper.chat import ChatIndex
+
+
+CHAT_URL = "https://habitica.com/api/v3/groups/party/chat"
+
+
+@pytest.fixture
+def api_header():
+    """
+    Return a structurally valid API header
+    """
+    return {
+        "x-client": "f687a6c7-860a-4c7c-8a07-9d0dcbb7c831-habot-testing",
+        "x-api-user": "8415a003-ef41-4168-9f8e-50baa099d37e",
+        "x-api-key": "4f1f9c07-0dab-4820-a80b-cf47a5f54ecf",
+    }
+
+
+def _message(number, user_id, timestamp):
+    """
+    Return a chat message as returned by Habitica API.
+    """
+    return {"id": "message-{}".format(number), "uuid": user_id,
+            "username": "user-{}".format(user_id), "timestamp": timestamp,
+            "text": "Message {}".format(number)}
+
+
+# pylint doesn't understand fixtures
+# pylint: disable=redefined-outer-name
+def test_incremental_sync(api_header):
+    """
+    Test that only new messages are added and posters are found by time.
+    """
+    old_messages = [_message(2, "user-b", "2020-05-02T10:00:00.000Z"),
+                    _message(1, "user-a", "2020-04-30T10:00:00.000Z")]
+    new_messages = [_message(4, "user-a", 1588672800000),
+                    _message(3, "user-c", "2020-05-04T10:00:00.000Z")]
+    index = ChatIndex()
+    with requests_mock.Mocker() as mock:
+        mock.get(CHAT_URL, json={"data": old_messages})
+        assert index.sync(api_header) == 2
+        mock.get(CHAT_URL, json={"data": new_messages + old_messages})
+        assert index.sync(api_header) == 2
+        assert index.sync(api_header) == 0
+
+    assert index.posters(datetime(2020, 5, 1)) == {"user-a", "user-b",
+                                                   "user-c"}
+    assert index.posters(datetime(2020, 5, 1),
+                         datetime(2020, 5, 4, 10)) == {"user-b"}
+    assert index.messages_by("user-a", datetime(2020, 4, 1)) == [
+        (datetime(2020, 4, 30, 10), "Message 1"),
+        (datetime(2020, 5, 5, 10), "Message 4")]
+    index.close()
@@ -0,0 +1,153 @@
+"""
+Test running commands in the daemon
+"""
+
+import io
+import json
+import os
+import socket
+import sys
+import threading
+
+import click
+import pytest
+
+from habitica_helper import daemon
+
+
+@click.group()
+def cli():
+    """
+    A command group for testing.
+    """
+
+
+@cli.command()
+@click.argument("name")
+def greet(name):
+    """
+    Greet the given name.
+    """
+    click.echo("Hello {}!".format(name))
+    click.echo("Bye {}!".format(name))
+
+
+@cli.command()
+def where():
+    """
+    Print the working directory and a setting from the environment.
+    """
+    click.echo("{} {}".format(os.getcwd(), os.environ.get("HHELPER_TEST")))
+
+
+@cli.command()
+def fail():
+    """
+    Exit with an error.
+    """
+    click.echo("Failing")
+    sys.exit(3)
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    """
+    Run a daemon for the test command group and return its socket path.
+    """
+    path = str(tmp_path / "hhelper.sock")
+    server = daemon.make_server(cli, path)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield path
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+# pylint doesn't understand fixtures
+# pylint: disable=redefined-outer-name
+def test_forward_output(socket_path):
+    """
+    Test that the output and exit code of a command are returned.
+    """
+    output = io.BytesIO()
+    exit_code = daemon.forward(["greet", "Üser"], socket_path, output)
+    assert exit_code == 0
+    assert output.getvalue().decode("utf-8") == "Hello Üser!\nBye Üser!\n"
+
+
+def test_forward_exit_code(socket_path):
+    """
+    Test that a failing command returns its exit code.
+    """
+    output = io.BytesIO()
+    assert daemon.forward(["fail"], socket_path, output) == 3
+    assert output.getvalue() == b"Failing\n"
+
+    output = io.BytesIO()
+    assert daemon.forward(["no-such-command"], socket_path, output) == 2
+    assert b"No such command" in output.getvalue()
+
+
+def test_no_daemon(tmp_path):
+    """
+    Test that None is returned if the daemon isn't running.
+    """
+    assert daemon.forward(["greet", "me"], str(tmp_path / "missing.sock"),
+                          io.BytesIO()) is None
+
+
+def test_client_directory_and_environment(socket_path, tmp_path):
+    """
+    Test that commands run in the working directory and environment sent by
+    the client, and that the daemon's own ones are restored afterwards.
+    """
+    daemon_cwd = os.getcwd()
+    request = {"args": ["where"], "cwd": str(tmp_path),
+               "env": {"HHELPER_TEST": "client"}}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        response = b""
+        while True:
+            chunk = client.recv(4096)
+            if not chunk:
+                break
+            response += chunk
+    assert response.decode("utf-8") == "{} client\n\x000".format(tmp_path)
+    assert os.getcwd() == daemon_cwd
+    assert "HHELPER_TEST" not in os.environ
+
+
+def test_refuse_running_daemon(socket_path):
+    """
+    Test that a second daemon doesn't take over the socket of a running one.
+    """
+    with pytest.raises(RuntimeError):
+        daemon.make_server(cli, socket_path)
+    assert daemon.forward(["greet", "me"], socket_path, io.BytesIO()) == 0
+
+
+def test_foreign_daemon_is_not_used(socket_path, monkeypatch):
+    """
+    Test that nothing is sent to a daemon run by another user.
+    """
+    monkeypatch.setattr(daemon.os, "getuid", lambda: os.geteuid() + 1)
+    output = io.BytesIO()
+    assert daemon.forward(["greet", "me"], socket_path, output) is None
+    assert output.getvalue() == b""
+
+
+def test_shared_directory_is_refused(tmp_path):
+    """
+    Test that the socket isn't created where other users could replace it.
+    """
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o777)
+    with pytest.raises(RuntimeError):
+        daemon.make_server(cli, str(shared / "hhelper.sock"))
+
+    path = tmp_path / "private" / "hhelper.sock"
+    daemon.make_server(cli, str(path)).server_close()
+    assert os.stat(path.parent).st_mode & 0o777 == 0o700
@@ -0,0 +1,240 @@
+"""
+Test PartyTool
+"""
+
+import pytest
+import requests_mock
+
+from habitica_helper import habiticatool
+from habitica_helper import planner
+from habitica_helper.habiticatool import GroupTool, PartyTool
+
+
+GUILD_ID = "f2db2a7f-13c5-454d-b3ee-ea1f5089e601"
+
+
+@pytest.fixture
+def api_header():
+    """
+    Return a structurally valid API header
+    """
+    return {
+        "x-client": "f687a6c7-860a-4c7c-8a07-9d0dcbb7c831-habot-testing",
+        "x-api-user": "8415a003-ef41-4168-9f8e-50baa099d37e",
+        "x-api-key": "4f1f9c07-0dab-4820-a80b-cf47a5f54ecf",
+    }
+
+
+def _member_data(user_id):
+    """
+    Return member data for the given user as returned by Habitica API.
+    """
+    return {
+        "_id": user_id,
+        "auth": {"local": {"username": "user-{}".format(user_id)},
+                 "timestamps": {
+                     "created": "2020-01-04T21:11:35.201Z",
+                     "loggedin": "2022-01-06T08:09:17.096Z"}},
+        "profile": {"name": "User {}".format(user_id)},
+        }
+
+
+# pylint doesn't understand fixtures
+# pylint: disable=redefined-outer-name
+def test_unchanged_party_description_is_not_sent(api_header):
+    """
+    Test that party description is only sent when it differs from the old one.
+    """
+    url = "https://habitica.com/api/v3/groups/party"
+    with requests_mock.Mocker() as mock:
+        mock.get(url, json={"data": {"description": "Old description"}})
+        mock.put(url, json={"data": {}})
+        tool = PartyTool(api_header)
+        tool.party_description()
+
+        assert not tool.update_party_description("Old description")
+        assert tool.update_party_description("New description")
+        assert not tool.update_party_description("New description")
+        assert [request.method for request in mock.request_history] == [
+            "GET", "PUT"]
+
+        tool = PartyTool(api_header)
+        assert not tool.update_party_description("Old description")
+        assert [request.method for request in mock.request_history] == [
+            "GET", "PUT", "GET"]
+
+
+def test_member_is_fetched_once(api_header):
+    """
+    Test that each member is fetched from the API only once.
+    """
+    user_id = "3c3858fb-8bd9-4119-ad50-e2f6fe3523c7"
+    with requests_mock.Mocker() as mock:
+        mock.get("https://habitica.com/api/v3/members/{}".format(user_id),
+                 json={"data": {
+                     "_id": user_id,
+                     "auth": {"local": {"username": "SomeUser"},
+                              "timestamps": {
+                                  "created": "2020-01-04T21:11:35.201Z",
+                                  "loggedin": "2022-01-06T08:09:17.096Z"}},
+                     "profile": {"name": "Some Üser"},
+                     }})
+        tool = PartyTool(api_header)
+        first = tool.member(user_id)
+        second = tool.member(user_id)
+        assert mock.call_count == 1
+    assert first is second
+
+
+def test_streaming_guild_members(api_header):
+    """
+    Test that guild members are fetched one page at a time while streaming.
+    """
+    api = "https://habitica.com/api/v3"
+    member_ids = ["member-{:02d}".format(i) for i in range(45)]
+    with requests_mock.Mocker() as mock:
+        mock.get("{}/groups/{}/members".format(api, GUILD_ID),
+                 json={"data": [{"id": uid} for uid in member_ids[:30]]})
+        mock.get("{}/groups/{}/members?lastId={}".format(
+                     api, GUILD_ID, member_ids[29]),
+                 complete_qs=True,
+                 json={"data": [{"id": uid} for uid in member_ids[30:]]})
+        for uid in member_ids:
+            mock.get("{}/members/{}".format(api, uid),
+                     json={"data": _member_data(uid)})
+
+        members = GroupTool(api_header, GUILD_ID,
+                            cache_members=False).iter_members()
+        assert next(members).id == member_ids[0]
+        assert mock.call_count == 2
+        assert [member.id for member in members] == member_ids[1:]
+        assert mock.call_count == 2 + len(member_ids)
+
+
+def test_all_group_challenges(api_header):
+    """
+    Test fetching challenges of all groups the user belongs to.
+    """
+    api = "https://habitica.com/api/v3"
+    with requests_mock.Mocker() as mock:
+        mock.get("{}/groups?type=party,guilds".format(api),
+                 json={"data": [{"id": "party-id"}, {"id": GUILD_ID}]})
+        mock.get("{}/challenges/groups/party-id".format(api),
+                 json={"data": [{"id": "challenge-1"}]})
+        mock.get("{}/challenges/groups/{}".format(api, GUILD_ID),
+                 json={"data": [{"id": "challenge-2"}, {"id": "challenge-3"}]})
+        challenges = habiticatool.all_group_challenges(api_header)
+    assert challenges == {
+        "party-id": [{"id": "challenge-1"}],
+        GUILD_ID: [{"id": "challenge-2"}, {"id": "challenge-3"}],
+        }
+
+
+def test_plan_matches_requests(api_header):
+    """
+    Test that the planned requests match the ones made, and that already
+    fetched data is left out of the plan.
+    """
+    api = "https://habitica.com/api/v3"
+    challenge_id = "challenge-1"
+    member_ids = ["member-{:02d}".format(i) for i in range(30)]
+    with requests_mock.Mocker() as mock:
+        mock.get("{}/challenges/{}/members".format(api, challenge_id),
+                 json={"data": [{"id": uid} for uid in member_ids]})
+        mock.get("{}/challenges/{}/members?lastId={}".format(
+                     api, challenge_id, member_ids[-1]),
+                 complete_qs=True, json={"data": []})
+        for uid in member_ids:
+            mock.get("{}/challenges/{}/members/{}".format(
+                         api, challenge_id, uid),
+                     json={"data": {"tasks": [{"type": "todo",
+                                               "completed": True}]}})
+            mock.get("{}/members/{}".format(api, uid),
+                     json={"data": _member_data(uid)})
+
+        tool = PartyTool(api_header)
+        plan = planner.RequestPlan()
+        tool.plan_eligible_winners(plan, challenge_id, len(member_ids))
+        assert plan.total() == 2 + 2 * len(member_ids)
+
+        tool.eligible_winners(challenge_id,
+                              tool.challenge_participants(challenge_id))
+        assert mock.call_count == plan.total()
+
+    plan = planner.RequestPlan()
+    tool.plan_eligible_winners(plan, challenge_id, len(member_ids))
+    assert plan.total() == 0
+
+
+@pytest.mark.parametrize(
+    ["tasks", "correct_result"],
+    [
+        ([], True),
+        ([{"type": "todo", "completed": True},
+          {"type": "daily", "completed": False}], True),
+        ([{"type": "todo", "completed": True},
+          {"type": "todo", "completed": False}], False),
+    ]
+)
+def test_completed_all_todos(tasks, correct_result):
+    """
+    Test that only todos count when evaluating challenge progress.
+    """
+    assert habiticatool.completed_all_todos({"tasks": tasks}) \
+        == correct_result
+
+
+def test_challenges_matching_pattern(api_header):
+    """
+    Test that all challenges matching a pattern are found, the newest first.
+    """
+    challenges = [
+        {"id": "challenge-1", "name": "Sharing Weekend 1/2022",
+         "createdAt": "2022-01-07T10:00:00.000Z"},
+        {"id": "challenge-2", "name": "Sharing Weekend 2/2022",
+         "createdAt": "2022-01-14T10:00:00.000Z"},
+        {"id": "challenge-3", "name": "Not a Sharing Weekend 3/2022",
+         "createdAt": "2022-01-21T10:00:00.000Z"},
+        ]
+    with requests_mock.Mocker() as mock:
+        mock.get("https://habitica.com/api/v3/challenges/groups/party",
+                 json={"data": challenges})
+        tool = PartyTool(api_header)
+        assert [challenge["id"] for challenge
+                in tool.challenges_matching_pattern("Sharing Weekend *")] == [
+                    "challenge-2", "challenge-1"]
+        assert tool.challenges_matching_pattern("sharing weekend *") == []
+
+
+def test_party_id_is_fetched_once(api_header):
+    """
+    Test that the real ID of the party is only fetched once per tool.
+    """
+    with requests_mock.Mocker() as mock:
+        mock.get("https://habitica.com/api/v3/groups/party",
+                 json={"data": {"id": "party-id", "memberCount": 3}})
+        tool = PartyTool(api_header)
+        assert tool.real_group_id() == "party-id"
+        assert tool.real_group_id() == "party-id"
+        assert mock.call_count == 1
+    assert GroupTool(api_header, GUILD_ID).real_group_id() == GUILD_ID
+
+
+def test_plan_members_counts_group_data(api_header):
+    """
+    Test that fetching the member count is included in the plan once.
+    """
+    with requests_mock.Mocker() as mock:
+        mock.get("https://habitica.com/api/v3/groups/party",
+                 json={"data": {"id": "party-id", "memberCount": 3}})
+        tool = PartyTool(api_header)
+        plan = planner.RequestPlan()
+        assert tool.plan_members(plan) == 3
+        assert plan.requests[(planner.HABITICA, "GET /groups/:groupId")] == 1
+        assert mock.call_count == 1
+
+        plan = planner.RequestPlan()
+        tool.plan_members(plan)
+        tool.plan_real_group_id(plan)
+        assert (planner.HABITICA, "GET /groups/:groupId") not in plan.requests
+        assert mock.call_count == 1
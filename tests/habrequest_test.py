@@ -0,0 +1,326 @@
+"""
+Test Habitica request wrapper
+"""
+
+import io
+import json
+import multiprocessing
+import os
+import threading
+
+import click
+import pytest
+import requests
+import requests_mock
+
+from habitica_helper import daemon
+from habitica_helper import habrequest
+from habitica_helper.circuit import CircuitBreaker, CircuitOpenError
+
+
+HEADER = {
+    "x-client": "f687a6c7-860a-4c7c-8a07-9d0dcbb7c831-habot-testing",
+    "x-api-user": "8415a003-ef41-4168-9f8e-50baa099d37e",
+    "x-api-key": "4f1f9c07-0dab-4820-a80b-cf47a5f54ecf",
+}
+
+
+def test_parse_reset():
+    """
+    Test parsing the JavaScript date string Habitica gives as reset time.
+    """
+    assert habrequest._parse_reset(  # pylint: disable=protected-access
+        "Wed Jun 02 2021 18:26:58 GMT+0200 (Central European Summer Time)"
+        ) == 1622651218
+
+
+def test_wait_when_budget_used(monkeypatch):
+    """
+    Test that requests wait for the reset when the rate limit is used up.
+    """
+    sleeps = []
+    monkeypatch.setattr(habrequest.time, "sleep", sleeps.append)
+    monkeypatch.setattr(habrequest.time, "time", lambda: 1622651200)
+    monkeypatch.setattr(habrequest, "_RATE_LIMITER",
+                        habrequest._RateLimiter())  # pylint: disable=W0212
+    url = "https://habitica.com/api/v3/user"
+    with requests_mock.Mocker() as mock:
+        mock.get(url, json={"data": {}}, headers={
+            "X-RateLimit-Remaining": "1",
+            "X-RateLimit-Reset":
+                "Wed Jun 02 2021 16:26:58 GMT+0000 (Coordinated Universal "
+                "Time)",
+            })
+        habrequest.get(url, HEADER)
+        habrequest.get(url, HEADER)
+        assert not sleeps
+        habrequest.get(url, HEADER)
+    assert sleeps == [18]
+
+
+def test_circuit_breaker(monkeypatch):
+    """
+    Test that requests fail fast after failures until a probe succeeds.
+    """
+    now = [1622651200]
+    monkeypatch.setattr(habrequest.time, "time", lambda: now[0])
+    monkeypatch.setattr(habrequest, "_CIRCUIT",
+                        CircuitBreaker("Habitica", failure_threshold=2,
+                                       cooldown=30))
+    monkeypatch.setattr(habrequest, "_RESPONSE_CACHE",
+                        habrequest._ResponseCache())  # pylint: disable=W0212
+    url = "https://habitica.com/api/v3/user"
+    with requests_mock.Mocker() as mock:
+        mock.get(url, json={"data": {"cached": True}})
+        habrequest.get(url, HEADER)
+        mock.get(url, status_code=503)
+        for _ in range(2):
+            with pytest.raises(requests.HTTPError):
+                habrequest.get(url, HEADER)
+        assert mock.call_count == 3
+
+        assert habrequest.get(url, HEADER).json() == {"data": {"cached": True}}
+        with pytest.raises(CircuitOpenError):
+            habrequest.post(url, HEADER)
+        assert mock.call_count == 3
+
+        now[0] += 30
+        mock.get(url, exc=requests.ConnectionError)
+        with pytest.raises(requests.ConnectionError):
+            habrequest.get(url, HEADER)
+        assert mock.call_count == 4
+        habrequest.get(url, HEADER)
+        assert mock.call_count == 4
+
+        now[0] += 30
+        mock.get(url, json={"data": {}})
+        assert habrequest.get(url, HEADER).json() == {"data": {}}
+        habrequest.get(url, HEADER)
+        assert mock.call_count == 6
+
+
+def test_cached_responses_expire(monkeypatch):
+    """
+    Test that old or unwanted cached responses aren't used during outages.
+    """
+    now = [1622651200]
+    monkeypatch.setattr(habrequest.time, "time", lambda: now[0])
+    monkeypatch.setattr(habrequest, "_CIRCUIT",
+                        CircuitBreaker("Habitica", failure_threshold=1,
+                                       cooldown=3600))
+    monkeypatch.setattr(habrequest, "_RESPONSE_CACHE",
+                        habrequest._ResponseCache())  # pylint: disable=W0212
+    url = "https://habitica.com/api/v3/user"
+    with requests_mock.Mocker() as mock:
+        mock.get(url, json={"data": {"cached": True}})
+        habrequest.get(url, HEADER)
+        mock.get(url, status_code=503)
+        with pytest.raises(requests.HTTPError):
+            habrequest.get(url, HEADER)
+
+        with habrequest.fresh_responses(), pytest.raises(CircuitOpenError):
+            habrequest.get(url, HEADER)
+        assert habrequest.get(url, HEADER).json() == {"data": {"cached": True}}
+        now[0] += habrequest.CACHE_TTL + 1
+        with pytest.raises(CircuitOpenError):
+            habrequest.get(url, HEADER)
+
+
+def test_interrupted_probe():
+    """
+    Test that a probe interrupted by e.g. Ctrl+C lets the next call probe.
+    """
+    breaker = CircuitBreaker("Habitica", failure_threshold=1, cooldown=0)
+
+    def _fail(error):
+        raise error
+
+    with pytest.raises(requests.ConnectionError):
+        breaker.call(_fail, lambda err: True, requests.ConnectionError())
+    with pytest.raises(KeyboardInterrupt):
+        breaker.call(_fail, lambda err: True, KeyboardInterrupt())
+    assert breaker.call(lambda: "probe", lambda err: True) == "probe"
+
+
+# pylint: disable=protected-access
+def test_priority_order(monkeypatch):
+    """
+    Test that waiting requests are let through by their aged priority.
+    """
+    start = 1622651200
+    now = [start]
+    monkeypatch.setattr(habrequest.time, "time", lambda: now[0])
+    limiter = habrequest._RateLimiter()
+    release = threading.Event()
+    order = []
+
+    def _sleep(_):
+        release.wait(5)
+
+    monkeypatch.setattr(habrequest.time, "sleep", _sleep)
+
+    def _request(name, level):
+        limiter.wait("user", level)
+        order.append(name)
+
+    limiter.budget.update("user", 0, start + 60)
+    threads = [threading.Thread(target=_request, args=("first", 5))]
+    threads[0].start()
+    for name, level, arrived in [("old background", habrequest.BACKGROUND, 0),
+                                 ("background", habrequest.BACKGROUND, 20),
+                                 ("interactive", habrequest.INTERACTIVE, 40)]:
+        now[0] = start + arrived
+        threads.append(threading.Thread(target=_request, args=(name, level)))
+        threads[-1].start()
+        while len(limiter._waiting) < len(threads):
+            threading.Event().wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert order == ["old background", "interactive", "background", "first"]
+
+
+def _reserve_from_file(path, attempts, results):
+    """
+    Try reserving requests from a shared budget in a separate process.
+    """
+    budget = habrequest._FileBudget(path)
+    results.put(sum(budget.reserve("user") is None for _ in range(attempts)))
+
+
+def test_budget_shared_between_processes(tmp_path):
+    """
+    Test that processes sharing a budget file don't exceed it together.
+    """
+    path = str(tmp_path / "ratelimit.json")
+    reset = habrequest.time.time() + 30
+    habrequest._FileBudget(path).update("user", 10, reset)
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_reserve_from_file,
+                                         args=(path, 5, results))
+                 for _ in range(4)]
+    for process in processes:
+        process.start()
+    reserved = sum(results.get(timeout=10) for _ in processes)
+    for process in processes:
+        process.join(10)
+
+    assert reserved == 10
+    assert habrequest._FileBudget(path).reserve("user") == reset
+
+
+def test_bogus_shared_budget_is_ignored(monkeypatch, tmp_path):
+    """
+    Test that a budget resetting far in the future doesn't make requests wait.
+    """
+    sleeps = []
+    monkeypatch.setattr(habrequest.time, "sleep", sleeps.append)
+    path = tmp_path / "ratelimit.json"
+    path.write_text(json.dumps({
+        "user": {"remaining": 0, "reset": habrequest.time.time() + 1e7},
+        "other": "garbage"}))
+    monkeypatch.setattr(habrequest, "_SHARED_BUDGET",
+                        habrequest._FileBudget(str(path)))
+    habrequest._RateLimiter().wait("user")
+    assert not sleeps
+
+    habrequest._SHARED_BUDGET.update("user", 0,
+                                     habrequest.time.time() + 1e7)
+    habrequest._RateLimiter().wait("user")
+    assert not sleeps
+
+    new_path = tmp_path / "new.json"
+    habrequest._FileBudget(str(new_path)).reserve("user")
+    assert os.stat(new_path).st_mode & 0o777 == 0o600
+
+
+def test_shared_budget_refuses_symlinks(tmp_path):
+    """
+    Test that the budget file is not opened through a symlink.
+    """
+    target = tmp_path / "target"
+    target.write_text("precious")
+    link = tmp_path / "ratelimit.json"
+    link.symlink_to(target)
+    budget = habrequest._FileBudget(str(link))
+    budget.update("user", 5, habrequest.time.time() + 30)
+    assert budget.reserve("user") is None
+    assert target.read_text() == "precious"
+
+
+def test_unusable_budget_file(monkeypatch, tmp_path):
+    """
+    Test that the budget is kept in memory if its file can't be opened.
+    """
+    budget = habrequest._FileBudget(str(tmp_path / "missing" / "rl.json"))
+    reset = habrequest.time.time() + 30
+    budget.update("user", 1, reset)
+    assert budget.reserve("user") is None
+    assert budget.reserve("user") == reset
+
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    monkeypatch.delenv("HHELPER_RATE_LIMIT_FILE", raising=False)
+    monkeypatch.chdir(tmp_path)
+    path = habrequest.default_rate_limit_path()
+    assert os.path.isabs(path)
+    assert path.endswith(os.path.join("conf", "secrets", "ratelimit.json"))
+
+
+@click.group()
+@click.option("--background", is_flag=True)
+@click.pass_context
+def _cli(ctx, background):
+    """
+    A command group with the same priority option as hhelper.py.
+    """
+    if background:
+        ctx.with_resource(habrequest.priority(habrequest.BACKGROUND))
+
+
+@_cli.command()
+def fetch():
+    """
+    Make one request.
+    """
+    habrequest.get("https://habitica.com/api/v3/user", HEADER)
+
+
+def _run_fetch(path, args, results):
+    """
+    Run the fetch command in a separate process sharing the budget file.
+    """
+    habrequest.share_rate_limits(path)
+    sleeps = []
+    habrequest.time.sleep = sleeps.append
+    with requests_mock.Mocker() as mock:
+        mock.get("https://habitica.com/api/v3/user", json={"data": {}})
+        exit_code = daemon.invoke(_cli, args, io.StringIO())
+    results.put((args[0], exit_code, sleeps))
+
+
+def test_background_command_leaves_reserve(tmp_path):
+    """
+    Test that a background command in another process doesn't use the budget
+    reserved for interactive commands.
+    """
+    path = str(tmp_path / "ratelimit.json")
+    # The interactive commands leave two requests, which are still within
+    # the reserve, so the background command must wait for the reset
+    habrequest._FileBudget(path).update(HEADER["x-api-user"], 4,
+                                        habrequest.time.time() + 30)
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_run_fetch,
+                                         args=(path, args, results))
+                 for args in [["--background", "fetch"], ["fetch"],
+                              ["fetch"]]]
+    for process in processes:
+        process.start()
+    outcomes = sorted(results.get(timeout=10) for _ in processes)
+    for process in processes:
+        process.join(10)
+
+    background, interactive, _ = outcomes
+    assert background[:2] == ("--background", 0)
+    assert len(background[2]) == 1 and 0 < background[2][0] <= 30
+    assert interactive == ("fetch", 0, [])
+    assert outcomes[2] == ("fetch", 0, [])
@@ -0,0 +1,172 @@
+"""
+Test the command line tool
+"""
+
+import csv
+import datetime
+import io
+import json
+import sys
+from types import ModuleType, SimpleNamespace
+
+from click.testing import CliRunner
+import pytest
+
+from habitica_helper.member import Member
+
+# The credentials are not available when testing
+_CREDENTIALS = ModuleType("conf.secrets.habitica_credentials")
+_CREDENTIALS.PLAYER_USER_ID = "test-user-id"
+_CREDENTIALS.PLAYER_API_TOKEN = "test-api-token"
+sys.modules.setdefault("conf.secrets.habitica_credentials", _CREDENTIALS)
+
+import hhelper  # noqa: E402 pylint: disable=wrong-import-position
+
+
+MEMBERS = [
+    Member("id-1", profile_data={
+        "id": "id-1", "displayname": "Alice, \"the Bold\"",
+        "loginname": "alice",
+        "birthday": datetime.datetime(2020, 1, 4, 21, 11, 35),
+        "last_login": datetime.datetime(2022, 1, 6, 8, 9, 17)}),
+    Member("id-2", profile_data={
+        "id": "id-2", "displayname": "Bob", "loginname": "bob",
+        "birthday": datetime.datetime(2019, 5, 2, 10, 0, 0),
+        "last_login": datetime.datetime(2022, 1, 5, 12, 0, 0)}),
+    ]
+
+MEMBER_HEADER = "id,displayname,login_name,habitica_birthday,last_login"
+
+
+@pytest.fixture
+def run(monkeypatch):
+    """
+    Return a function running hhelper.py with the given arguments.
+
+    The party of the stand-in tool has the members in MEMBERS, and the
+    challenge "Sharing" has them as completers.
+    """
+    monkeypatch.setenv("HHELPER_RATE_LIMIT_FILE", "")
+    tool = SimpleNamespace(
+        iter_members=lambda: iter(MEMBERS),
+        ensure_birthday=lambda calendar, member: (
+            "added", "Added {}".format(member.login_name)))
+    challenge = SimpleNamespace(id="challenge-1", name="Sharing Weekend",
+                                iter_completers=lambda: iter(MEMBERS))
+    monkeypatch.setattr(hhelper, "_party_tool", lambda: tool)
+    monkeypatch.setattr(hhelper, "_matching_challenges",
+                        lambda tool, names: [challenge])
+
+    def _run(*args):
+        result = CliRunner().invoke(hhelper.cli, list(args))
+        assert result.exit_code == 0, result.output
+        return result.output
+    return _run
+
+
+# pylint doesn't understand fixtures
+# pylint: disable=redefined-outer-name
+def test_party_members_csv(run):
+    """
+    Test that party members are printed as a CSV header and a row each.
+    """
+    output = run("party-members", "--format", "csv")
+    assert output.splitlines()[0] == MEMBER_HEADER
+    rows = list(csv.DictReader(io.StringIO(output)))
+    assert rows == [
+        {"id": "id-1", "displayname": "Alice, \"the Bold\"",
+         "login_name": "alice", "habitica_birthday": "2020-01-04T21:11:35",
+         "last_login": "2022-01-06T08:09:17"},
+        {"id": "id-2", "displayname": "Bob", "login_name": "bob",
+         "habitica_birthday": "2019-05-02T10:00:00",
+         "last_login": "2022-01-05T12:00:00"},
+        ]
+
+
+def test_party_members_ndjson(run):
+    """
+    Test that each party member is printed as a JSON object on its own line.
+    """
+    lines = run("party-members", "--format", "ndjson").splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"id": "id-1", "displayname": "Alice, \"the Bold\"",
+         "login_name": "alice", "habitica_birthday": "2020-01-04T21:11:35",
+         "last_login": "2022-01-06T08:09:17"},
+        {"id": "id-2", "displayname": "Bob", "login_name": "bob",
+         "habitica_birthday": "2019-05-02T10:00:00",
+         "last_login": "2022-01-05T12:00:00"},
+        ]
+
+
+def test_party_birthdays(run):
+    """
+    Test that the result of updating each birthday is included.
+    """
+    output = run("party-birthdays", "--format", "csv")
+    assert output.splitlines()[0] == MEMBER_HEADER + ",status,message"
+    assert [(row["login_name"], row["status"], row["message"])
+            for row in csv.DictReader(io.StringIO(output))] == [
+                ("alice", "added", "Added alice"),
+                ("bob", "added", "Added bob")]
+
+    lines = run("party-birthdays", "--format", "ndjson").splitlines()
+    assert [(record["id"], record["status"], record["message"])
+            for record in map(json.loads, lines)] == [
+                ("id-1", "added", "Added alice"),
+                ("id-2", "added", "Added bob")]
+
+
+def test_participants(run):
+    """
+    Test that each completer is printed together with the challenge.
+    """
+    output = run("participants", "Sharing", "--format", "csv")
+    assert output.splitlines()[0] == (MEMBER_HEADER
+                                      + ",challenge_id,challenge_name")
+    assert [(row["id"], row["challenge_id"], row["challenge_name"])
+            for row in csv.DictReader(io.StringIO(output))] == [
+                ("id-1", "challenge-1", "Sharing Weekend"),
+                ("id-2", "challenge-1", "Sharing Weekend")]
+
+    lines = run("participants", "Sharing", "--format", "ndjson").splitlines()
+    assert [(record["login_name"], record["challenge_id"])
+            for record in map(json.loads, lines)] == [
+                ("alice", "challenge-1"), ("bob", "challenge-1")]
+
+
+def test_matching_challenges_with_pattern():
+    """
+    Test that patterns match several challenges, each returned only once.
+    """
+    first = {"id": "challenge-1", "name": "Sharing Weekend 1"}
+    second = {"id": "challenge-2", "name": "Sharing Weekend 2"}
+    tool = SimpleNamespace(
+        challenges_matching_pattern=lambda pattern: [second, first],
+        newest_matching_challenge=lambda must_haves, no_gos: first)
+    challenges = hhelper._matching_challenges(  # pylint: disable=W0212
+        tool, ["Sharing Weekend *", "Weekend 1"])
+    assert [challenge.id for challenge in challenges] == [
+        "challenge-2", "challenge-1"]
+
+
+def test_plan_doesnt_open_archive(monkeypatch, tmp_path):
+    """
+    Test that pick-winner --plan neither opens the archive nor draws.
+    """
+    monkeypatch.setenv("HHELPER_RATE_LIMIT_FILE", "")
+    archive_path = tmp_path / "results.sqlite"
+    monkeypatch.setattr(hhelper, "ARCHIVE", str(archive_path))
+    tool = SimpleNamespace(
+        plan_challenge_lookup=lambda plan: None,
+        plan_real_group_id=lambda plan: plan.add("Habitica",
+                                                 "GET /groups/:groupId"))
+    challenge = SimpleNamespace(plan_completers=lambda plan: None)
+    monkeypatch.setattr(hhelper, "_party_tool", lambda: tool)
+    monkeypatch.setattr(hhelper, "_matching_challenges",
+                        lambda tool, names: [challenge])
+
+    result = CliRunner().invoke(hhelper.cli, [
+        "pick-winner", "Sharing", "--stock_date", "20200310", "--plan"])
+    assert result.exit_code == 0, result.output
+    assert "GET /groups/:groupId" in result.output
+    assert not archive_path.exists()
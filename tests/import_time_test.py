@@ -0,0 +1,173 @@
+"""
+Test that the command line tool starts up fast.
+
+Heavy dependencies (stock data and Google API libraries) must only be imported
+in the code paths that use them, not when the tool starts. Every command is
+run through its real code path, with Habitica requests answered by stubs and
+local databases kept in memory, so that imports made while running a command
+are noticed too.
+"""
+
+import os
+import subprocess
+import sys
+import types
+
+import pytest
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Maximum total time spent on imports when running hhelper.py, in seconds
+STARTUP_BUDGET = 0.75
+
+HEAVY_MODULES = ["yfinance", "pandas", "numpy", "googleapiclient",
+                 "google_auth_oauthlib"]
+
+# Heavy modules that the code paths of some commands need
+ALLOWED_HEAVY_MODULES = {
+    "inactive-members": ["numpy"],
+    "party-birthdays": ["googleapiclient", "google_auth_oauthlib"],
+    "pick-winner": ["yfinance", "pandas", "numpy"],
+    "prefetch-sharing-winners": ["yfinance", "pandas", "numpy"],
+    "sharing-winners": ["yfinance", "pandas", "numpy"],
+}
+
+# Arguments of the commands that need some. Commands not listed here are run
+# without arguments.
+COMMAND_ARGS = {
+    "all-accounts": ["party-members"],
+    "participants": ["Sharing"],
+    "pick-winner": ["Sharing", "--stock_date", "20200310"],
+    "register-webhooks": ["https://example.com/s3cret"],
+    "webhook-server": ["--port", "0", "--secret", "s3cret"],
+}
+
+# Seconds after which commands that keep running, such as the daemon, are
+# interrupted as if by Ctrl+C
+INTERRUPT_AFTER = 1
+
+RUN_SCRIPT = """
+import datetime
+import signal
+import sys
+import threading
+import types
+
+credentials = types.ModuleType("conf.secrets.habitica_credentials")
+credentials.PLAYER_USER_ID = "test-user-id"
+credentials.PLAYER_API_TOKEN = "test-api-token"
+sys.modules["conf.secrets.habitica_credentials"] = credentials
+
+import conf.archive
+import conf.chat
+import conf.webhooks
+conf.archive.ARCHIVE = ":memory:"
+conf.chat.CHAT_INDEX = ":memory:"
+conf.webhooks.WEBHOOK_STATE = ":memory:"
+
+import hhelper
+
+import requests_mock
+from habitica_helper import stockrandomizer
+
+API = "https://habitica.com/api/v3"
+CHALLENGE = {{"id": "challenge-1", "name": "Sharing Weekend 1",
+              "createdAt": "2020-03-06T10:00:00.000Z", "memberCount": 0,
+              "summary": "Sharing", "description": "Sharing"}}
+PRICES = {{"Open": 595.95, "High": 597.73, "Low": 590.66, "Close": 591.91}}
+for date in [hhelper._last_tuesday(), datetime.date(2020, 3, 10)]:
+    stockrandomizer._PREFETCHED_SEEDS[
+        stockrandomizer._seed_key("^AEX", date)] = (95957366, PRICES)
+
+args = {args!r}
+timer = threading.Timer({interrupt_after!r}, signal.pthread_kill,
+                        [threading.main_thread().ident, signal.SIGINT])
+with requests_mock.Mocker() as mock:
+    mock.register_uri(requests_mock.ANY, requests_mock.ANY,
+                      json={{"data": []}})
+    mock.get(API + "/groups/party", json={{"data": {{
+        "id": "party-id", "memberCount": 0, "description": ""}}}})
+    mock.get(API + "/challenges/groups/party", json={{"data": [CHALLENGE]}})
+    mock.get(API + "/challenges/challenge-1", json={{"data": CHALLENGE}})
+    timer.start()
+    try:
+        hhelper.cli.main(args, prog_name="hhelper.py")
+    except SystemExit as err:
+        exit_code = err.code
+    finally:
+        timer.cancel()
+
+heavy = [module for module in {heavy_modules!r} if module in sys.modules]
+sys.stderr.write("heavy modules: " + ",".join(heavy) + "\\n")
+sys.stderr.write("exit code: {{}}\\n".format(exit_code))
+"""
+
+
+def _commands():
+    """
+    Return the names of all commands of hhelper.py.
+    """
+    credentials = types.ModuleType("conf.secrets.habitica_credentials")
+    credentials.PLAYER_USER_ID = "test-user-id"
+    credentials.PLAYER_API_TOKEN = "test-api-token"
+    sys.modules.setdefault("conf.secrets.habitica_credentials", credentials)
+    import hhelper  # pylint: disable=import-outside-toplevel
+    return sorted(hhelper.cli.commands)
+
+
+def _import_times(stderr):
+    """
+    Return the cumulative import times of top-level imports in seconds.
+
+    :stderr: Output of a python process run with `-X importtime`
+    :returns: A dict mapping module names to their cumulative import times
+    """
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if name.startswith("  ") or not cumulative.strip().isdigit():
+            continue
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+@pytest.mark.parametrize("command", _commands())
+def test_startup(command, tmp_path):
+    """
+    Test that running a command stays within the startup budget.
+    """
+    script = RUN_SCRIPT.format(
+        args=[command] + COMMAND_ARGS.get(command, []),
+        interrupt_after=INTERRUPT_AFTER, heavy_modules=HEAVY_MODULES)
+    environment = dict(os.environ, HHELPER_RATE_LIMIT_FILE="",
+                       HHELPER_SOCKET=str(tmp_path / "hhelper.sock"))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", script],
+                            cwd=REPO_ROOT, env=environment,
+                            capture_output=True, text=True, check=False,
+                            timeout=60)
+    lines = result.stderr.strip().splitlines()
+    assert lines[-1] == "exit code: 0", result.stdout + result.stderr
+
+    heavy_line = lines[-2]
+    assert heavy_line.startswith("heavy modules:")
+    heavy = heavy_line[len("heavy modules:"):].strip()
+    allowed = ALLOWED_HEAVY_MODULES.get(command, [])
+    assert not set(heavy.split(",")) - set(allowed) - {""}
+
+    import_times = _import_times(result.stderr)
+    assert "hhelper" in import_times
+    # Only the imports of the tool and the commands count, not the stubs
+    assert sum(time for name, time in import_times.items()
+               if name not in allowed + ["requests_mock"]) < STARTUP_BUDGET
+
+
+def test_all_commands_are_covered():
+    """
+    Test that the arguments are given for commands that exist.
+    """
+    commands = _commands()
+    assert set(COMMAND_ARGS) <= set(commands)
+    assert set(ALLOWED_HEAVY_MODULES) <= set(commands)
@@ -97,3 +97,16 @@ def test_member_from_profile_data():
     assert member.login_name == loginname
     assert member.habitica_birthday == birthday
     assert member.last_login == last_login
+
+
+def test_members_in_set(member_data_from_api):
+    """
+    Test that members with the same ID are the same set item.
+    """
+    first = Member("3c3858fb-8bd9-4119-ad50-e2f6fe3523c7",
+                   api_data=member_data_from_api["data"])
+    second = Member("3c3858fb-8bd9-4119-ad50-e2f6fe3523c7",
+                    api_data=member_data_from_api["data"])
+    assert first is not second
+    assert len({first, second}) == 1
+    assert first != "3c3858fb-8bd9-4119-ad50-e2f6fe3523c7"
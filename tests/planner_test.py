@@ -0,0 +1,36 @@
+"""
+Test request planning
+"""
+
+import pytest
+
+from habitica_helper import planner
+
+
+@pytest.mark.parametrize(
+    ["item_count", "correct_pages"],
+    [(0, 1), (29, 1), (30, 2), (31, 2), (90, 4)]
+)
+def test_page_count(item_count, correct_pages):
+    """
+    Test that an extra page is needed when the last page is full.
+    """
+    assert planner.page_count(item_count) == correct_pages
+
+
+def test_projected_duration():
+    """
+    Test that the rate limit is accounted for in the projected duration.
+    """
+    plan = planner.RequestPlan()
+    plan.add(planner.HABITICA, "GET /members/:memberId", 30)
+    assert plan.duration(latency=0) == 0
+
+    plan.add(planner.HABITICA, "GET /challenges/:challengeId/members", 31)
+    plan.add(planner.GOOGLE_CALENDAR, "events.list", 10)
+    plan.add(planner.GOOGLE_CALENDAR, "events.insert", 0)
+    assert plan.total(planner.HABITICA) == 61
+    assert plan.total() == 71
+    assert plan.duration(latency=0) == 2 * planner.HABITICA_RATE_WINDOW
+    assert plan.duration(latency=1) == 2 * planner.HABITICA_RATE_WINDOW + 71
+    assert len(plan.requests) == 3
@@ -0,0 +1,72 @@
+"""
+Test roster analytics
+"""
+
+from datetime import date, datetime
+
+import pytest
+
+from habitica_helper.member import Member
+from habitica_helper.roster import Roster
+
+
+NOW = datetime(2022, 3, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def roster():
+    """
+    Return a roster with four members with different activity.
+    """
+    data = [
+        ("id-a", datetime(2019, 5, 1), datetime(2022, 3, 1, 6, 0, 0)),
+        ("id-b", datetime(2019, 12, 31), datetime(2022, 1, 30, 12, 0, 0)),
+        ("id-c", datetime(2020, 1, 4), datetime(2021, 3, 1, 12, 0, 0)),
+        ("id-d", datetime(2021, 7, 7), datetime(2022, 2, 19, 12, 0, 0)),
+        ]
+    return Roster([
+        Member(uid, profile_data={"id": uid,
+                                  "displayname": "User {}".format(uid),
+                                  "loginname": uid,
+                                  "birthday": birthday,
+                                  "last_login": last_login})
+        for uid, birthday, last_login in data])
+
+
+# pylint doesn't understand fixtures
+# pylint: disable=redefined-outer-name
+def test_inactive(roster):
+    """
+    Test that inactive members are found and ordered by their inactivity.
+    """
+    inactive = roster.inactive(10, now=NOW)
+    assert list(inactive.ids) == ["id-c", "id-b"]
+    assert len(roster.inactive(1000, now=NOW)) == 0
+
+
+def test_login_recency_percentiles(roster):
+    """
+    Test login recency percentiles.
+    """
+    percentiles = roster.login_recency_percentiles([0, 50, 100], now=NOW)
+    assert percentiles == {0: 0.25, 50: 20.0, 100: 365.0}
+
+
+def test_join_cohorts(roster):
+    """
+    Test counting the members who joined in each year and month.
+    """
+    assert roster.join_cohorts() == {date(2019, 1, 1): 2,
+                                     date(2020, 1, 1): 1,
+                                     date(2021, 1, 1): 1}
+    assert roster.join_cohorts("M")[date(2019, 12, 1)] == 1
+
+
+def test_empty_roster():
+    """
+    Test that an empty roster can be analysed.
+    """
+    roster = Roster([])
+    assert len(roster.inactive(10, now=NOW)) == 0
+    assert roster.login_recency_percentiles([50]) == {50: None}
+    assert roster.join_cohorts() == {}
@@ -0,0 +1,73 @@
+"""
+Test the job scheduler
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from habitica_helper.scheduler import CronSchedule, Scheduler
+
+
+@pytest.mark.parametrize(
+    ["spec", "after", "correct_next"],
+    [
+        ("0 18 * * 2", datetime(2020, 5, 5, 12, 0),
+         datetime(2020, 5, 5, 18, 0)),
+        ("0 18 * * 2", datetime(2020, 5, 5, 18, 0),
+         datetime(2020, 5, 12, 18, 0)),
+        ("*/15 * * * *", datetime(2020, 5, 5, 12, 7, 30),
+         datetime(2020, 5, 5, 12, 15)),
+        ("30 8 1 * *", datetime(2019, 12, 27), datetime(2020, 1, 1, 8, 30)),
+        ("0 0 29 2 *", datetime(2020, 3, 1), datetime(2024, 2, 29, 0, 0)),
+        ("0 12 * * 7", datetime(2020, 5, 5), datetime(2020, 5, 10, 12, 0)),
+        ("0 9 1-5 * 0", datetime(2020, 5, 5, 10, 0),
+         datetime(2020, 5, 10, 9, 0)),
+        ("0 9,17 * * 1", datetime(2020, 5, 11, 9, 0),
+         datetime(2020, 5, 11, 17, 0)),
+    ]
+)
+def test_next_after(spec, after, correct_next):
+    """
+    Test finding the next matching time of a schedule.
+    """
+    schedule = CronSchedule(spec)
+    assert schedule.next_after(after) == correct_next
+    assert schedule.matches(correct_next)
+
+
+@pytest.mark.parametrize(
+    "spec",
+    ["* * * *", "60 * * * *", "* 24 * * *", "* * 0 * *", "5-1 * * * *",
+     "*/0 * * * *", "a * * * *"]
+)
+def test_illegal_schedule(spec):
+    """
+    Test that illegal schedules raise a ValueError.
+    """
+    with pytest.raises(ValueError):
+        CronSchedule(spec)
+
+
+def test_scheduler_runs_due_jobs_in_order():
+    """
+    Test that jobs due at the same time are run one after another in order.
+    """
+    now = [datetime(2020, 5, 5, 17, 0)]
+    sleeps = []
+    run = []
+
+    def _sleep(seconds):
+        sleeps.append(seconds)
+        now[0] = now[0] + timedelta(seconds=seconds)
+
+    scheduler = Scheduler([("0 18 * * 2", "first"),
+                           ("0 18 * * 2", "second"),
+                           ("0 8 * * *", "daily")],
+                          run.append, clock=lambda: now[0], sleep=_sleep)
+    scheduler.run_next()
+    assert run == ["first", "second"]
+    assert sleeps == [3600]
+
+    scheduler.run_next()
+    assert run == ["first", "second", "daily"]
@@ -0,0 +1,87 @@
+"""
+Test stock based seed calculation
+"""
+
+import datetime
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from habitica_helper import stockrandomizer
+from habitica_helper.stockrandomizer import StockRandomizer
+
+
+@pytest.fixture
+def stock_history():
+    """
+    Return a year of made-up daily stock data in yfinance format.
+    """
+    rng = np.random.default_rng(1234)
+    index = pd.bdate_range("2019-01-01", "2019-12-31", tz="Europe/Amsterdam")
+    prices = np.round(rng.uniform(400, 700, size=(len(index), 4)),
+                      rng.integers(1, 5))
+    data = pd.DataFrame(prices, index=index,
+                        columns=["Open", "High", "Low", "Close"])
+    # include some values that are exactly between two cents
+    data.iloc[0] = [506.955, 506.945, 485.735, 490.665]
+    data.iloc[1] = [506.95, 506.95, 485.73, 490.66]
+    return data
+
+
+# pylint doesn't understand fixtures
+# pylint: disable=redefined-outer-name
+@pytest.fixture
+def mock_ticker(monkeypatch, stock_history):
+    """
+    Make yfinance return the given stock history instead of downloading it.
+    """
+    class _FakeTicker():
+        # pylint: disable=too-few-public-methods
+        def __init__(self, ticker):
+            self.ticker = ticker
+
+        def history(self, start, end):
+            """
+            Return the rows between start (inclusive) and end (exclusive).
+            """
+            dates = stock_history.index.date
+            return stock_history[(dates >= start) & (dates < end)]
+
+    monkeypatch.setattr("yfinance.Ticker", _FakeTicker)
+
+
+def test_seed_from_known_values(stock_history):
+    """
+    Test that the seed is calculated as documented in the README.
+    """
+    seeds = stockrandomizer.seeds_from_history(stock_history.iloc[1:2])
+    assert seeds == {datetime.date(2019, 1, 2): 95957366}
+
+
+@pytest.mark.usefixtures("mock_ticker")
+def test_bulk_seeds_match_single_seeds(stock_history):
+    """
+    Test that the bulk seeds are identical to ones from StockRandomizer.
+    """
+    seeds = stockrandomizer.stock_seeds("^AEX",
+                                        datetime.date(2019, 1, 1),
+                                        datetime.date(2019, 12, 31))
+    assert len(seeds) == len(stock_history)
+    for date, seed in seeds.items():
+        assert StockRandomizer("^AEX", date).seed == seed
+
+
+def test_picks_match_seeded_random_module():
+    """
+    Test that the picks are the same as from a random module seeded the same.
+
+    This ensures that earlier draws, made by seeding the global random number
+    generator, can still be verified.
+    """
+    randomizer = StockRandomizer("^AEX", datetime.date(2020, 3, 10),
+                                 seed=95957366)
+    reference = random.Random(95957366)
+    for max_ in range(1, 50):
+        assert randomizer.pick_integer(0, max_) == reference.randint(0, max_)
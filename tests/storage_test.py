@@ -0,0 +1,34 @@
+"""
+Test the shared helpers of the local databases
+"""
+
+import datetime
+
+from habitica_helper import storage
+
+
+def test_milliseconds():
+    """
+    Test that all supported representations of a time are converted alike.
+    """
+    expected = 1588413600000
+    assert storage.milliseconds(expected) == expected
+    assert storage.milliseconds("2020-05-02T10:00:00.000Z") == expected
+    assert storage.milliseconds(datetime.datetime(2020, 5, 2, 10)) == expected
+    assert storage.milliseconds(datetime.datetime(
+        2020, 5, 2, 13, tzinfo=datetime.timezone(
+            datetime.timedelta(hours=3)))) == expected
+
+
+def test_connect_creates_schema(tmp_path):
+    """
+    Test that the schema is created and the connection waits for writers.
+    """
+    path = str(tmp_path / "test.sqlite")
+    schema = "CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY);"
+    storage.connect(path, schema).close()
+    connection = storage.connect(path, schema)
+    assert connection.execute("PRAGMA busy_timeout").fetchone()[0] == (
+        storage.BUSY_TIMEOUT * 1000)
+    assert connection.execute("SELECT COUNT(*) FROM items").fetchone() == (0,)
+    connection.close()
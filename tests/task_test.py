@@ -3,8 +3,9 @@ Test that the input data validation works when creating a Task.
 """
 
 import pytest
+import requests_mock
 
-from habitica_helper.task import Task
+from habitica_helper.task import Task, task_diff
 
 
 DEFAULTS = {
@@ -124,3 +125,96 @@ def test_equals():
         different_data[attr] = value
         task2 = Task(different_data)
         assert task != task2
+
+
+def test_create_many_to_challenge():
+    """
+    Test that many tasks are created using one request and get their IDs.
+    """
+    header = {
+        "x-client": "f687a6c7-860a-4c7c-8a07-9d0dcbb7c831-habot-testing",
+        "x-api-user": "8415a003-ef41-4168-9f8e-50baa099d37e",
+        "x-api-key": "4f1f9c07-0dab-4820-a80b-cf47a5f54ecf",
+    }
+    tasks = [Task({"text": "task {}".format(i), "tasktype": "todo"})
+             for i in range(3)]
+    with requests_mock.Mocker() as mock:
+        mock.post("https://habitica.com/api/v3/tasks/challenge/challenge-id",
+                  json={"data": [{"id": "id-{}".format(i)}
+                                 for i in range(3)]})
+        Task.create_many_to_challenge(tasks, "challenge-id", header)
+
+        assert mock.call_count == 1
+        assert [task_data["text"] for task_data in mock.last_request.json()
+                ] == ["task 0", "task 1", "task 2"]
+    assert [task.id for task in tasks] == ["id-0", "id-1", "id-2"]
+
+
+def test_from_api():
+    """
+    Test creating a task from data in Habitica API format.
+    """
+    task = Task.from_api({
+        "_id": "2b5a3f8e-55c1-4a0e-a47b-6a4d3f6c9d11",
+        "type": "habit",
+        "text": "Share something positive in party chat",
+        "notes": "",
+        "up": True,
+        "down": False,
+        "priority": 1.5,
+        "frequency": "weekly",
+        "date": None,
+        "value": 0,
+        })
+    assert task.id == "2b5a3f8e-55c1-4a0e-a47b-6a4d3f6c9d11"
+    assert task.tasktype == "habit"
+    assert task.uppable == "true"
+    assert task.downable == "false"
+    assert task.difficulty == 1.5
+    assert task.frequency == "weekly"
+
+    todo = Task.from_api({"type": "todo", "text": "todo",
+                          "date": "2020-05-19T21:00:00.000Z",
+                          "frequency": "weekly"})
+    assert todo.date == "2020-05-19"
+    assert todo.frequency is None
+
+
+def test_task_diff():
+    """
+    Test determining which tasks must be created, updated and deleted.
+    """
+    existing = [
+        Task.from_api({"id": "same", "type": "todo", "text": "same"}),
+        Task.from_api({"id": "harder", "type": "todo", "text": "harder"}),
+        Task.from_api({"id": "extra", "type": "todo", "text": "extra"}),
+        Task.from_api({"id": "dupe", "type": "todo", "text": "same"}),
+        ]
+    desired = [
+        Task.from_api({"type": "todo", "text": "same"}),
+        Task.from_api({"type": "todo", "text": "harder", "priority": 2}),
+        Task.from_api({"type": "todo", "text": "new"}),
+        ]
+
+    to_create, to_update, to_delete = task_diff(existing, desired)
+
+    assert [task.text for task in to_create] == ["new"]
+    assert [(task.id, changes) for task, changes in to_update] == [
+        ("harder", {"priority": 2})]
+    assert sorted(task.id for task in to_delete) == ["dupe", "extra"]
+
+
+def test_task_diff_partial_template():
+    """
+    Test that values missing from the desired task are left as they are.
+    """
+    existing = [Task.from_api({"id": "habit", "type": "habit", "text": "t",
+                               "priority": 2, "up": True, "down": True})]
+
+    _, to_update, _ = task_diff(existing, [
+        Task.from_api({"type": "habit", "text": "t"})])
+    assert to_update == []
+
+    _, to_update, _ = task_diff(existing, [
+        Task.from_api({"type": "habit", "text": "t", "down": False})])
+    assert [changes for _, changes in to_update] == [{"down": "false"}]
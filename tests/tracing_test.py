@@ -0,0 +1,45 @@
+"""
+Test recording tracing spans
+"""
+
+import json
+
+from habitica_helper import tracing
+
+
+def test_disabled_tracing_records_nothing():
+    """
+    Test that spans are not recorded unless tracing has been started.
+    """
+    with tracing.span("ignored"):
+        pass
+    assert not tracing.enabled()
+    assert tracing.stop() == []
+
+
+def test_nested_spans(tmp_path):
+    """
+    Test that nested spans are recorded and written in Chrome trace format.
+    """
+
+    @tracing.traced("inner")
+    def _inner():
+        return 42
+
+    tracing.start()
+    with tracing.span("outer", challenge="abc"):
+        assert _inner() == 42
+    events = tracing.stop()
+    assert not tracing.enabled()
+
+    assert [event["name"] for event in events] == ["inner", "outer"]
+    inner, outer = events
+    assert outer["args"] == {"challenge": "abc"}
+    assert outer["ts"] <= inner["ts"]
+    assert inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"]
+
+    path = tmp_path / "trace.json"
+    tracing.write_chrome_trace(str(path), events)
+    trace = json.loads(path.read_text())
+    assert trace["traceEvents"] == events
+    assert all(event["ph"] == "X" for event in trace["traceEvents"])
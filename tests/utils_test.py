@@ -66,3 +66,34 @@ def test_get_next_weekday_from(weekday_str, from_date, correct_date):
             from_date = datetime.date(2020, 5, 6)
             )
     assert next_weekday_date == datetime.date(2020, 5, 11)
+
+
+@pytest.mark.parametrize(
+    ["timestamp", "correct_datetime"],
+    [
+        ("2020-06-17T21:05:50.754Z",
+         datetime.datetime(2020, 6, 17, 21, 5, 50, 754000)),
+        ("2020-06-17T21:05:50.7Z",
+         datetime.datetime(2020, 6, 17, 21, 5, 50, 700000)),
+        ("2020-06-17T21:05:50.123456Z",
+         datetime.datetime(2020, 6, 17, 21, 5, 50, 123456)),
+    ]
+)
+def test_timestamp_to_datetime(timestamp, correct_datetime):
+    """
+    Test parsing Habitica timestamps.
+    """
+    assert utils.timestamp_to_datetime(timestamp) == correct_datetime
+
+
+@pytest.mark.parametrize(
+    "timestamp",
+    ["2020-06-17 21:05:50.754Z", "2020-06-17T21:05:50.754+00",
+     "2020-13-17T21:05:50.754Z", "2020-06-17T21:05:50Z"]
+)
+def test_illegal_timestamp(timestamp):
+    """
+    Test that timestamps not in Habitica format raise a ValueError.
+    """
+    with pytest.raises(ValueError):
+        utils.timestamp_to_datetime(timestamp)
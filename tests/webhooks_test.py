@@ -0,0 +1,113 @@
+"""
+Test receiving Habitica webhooks
+"""
+
+import json
+import threading
+from urllib.request import Request, urlopen
+
+import pytest
+import requests_mock
+
+from habitica_helper.chat import ChatIndex
+from habitica_helper import webhooks
+from habitica_helper.webhooks import WebhookState
+
+
+CHALLENGE_ID = "6a6b6ee6-2b68-4d4d-9b1c-8e2f7a2d3f01"
+PARTY_ID = "0b5e3c2a-0000-4000-8000-000000000000"
+
+
+@pytest.fixture
+def api_header():
+    """
+    Return a structurally valid API header
+    """
+    return {
+        "x-client": "f687a6c7-860a-4c7c-8a07-9d0dcbb7c831-habot-testing",
+        "x-api-user": "8415a003-ef41-4168-9f8e-50baa099d37e",
+        "x-api-key": "4f1f9c07-0dab-4820-a80b-cf47a5f54ecf",
+    }
+
+
+def _scored(user_id, task_id, completed=True, task_type="todo"):
+    """
+    Return a taskActivity event for scoring a challenge task.
+    """
+    return {"webhookType": "taskActivity", "type": "scored",
+            "user": {"_id": user_id},
+            "task": {"type": task_type, "completed": completed,
+                     "challenge": {"id": CHALLENGE_ID, "taskId": task_id}}}
+
+
+def test_completers_from_events():
+    """
+    Test that only users who have completed all todos are completers.
+    """
+    state = WebhookState()
+    for event in [_scored("user-a", "todo-1"), _scored("user-a", "todo-2"),
+                  _scored("user-b", "todo-1"), _scored("user-b", "todo-2"),
+                  _scored("user-b", "todo-2", completed=False),
+                  _scored("user-c", "todo-1"),
+                  _scored("user-c", "habit-1", task_type="habit")]:
+        webhooks.handle_event(event, state)
+    assert state.completers(CHALLENGE_ID, ["todo-1", "todo-2"]) == {"user-a"}
+    assert state.completers(CHALLENGE_ID, ["todo-1"]) == {
+        "user-a", "user-b", "user-c"}
+    state.close()
+
+
+def test_server_records_events():
+    """
+    Test that events are only accepted when sent to the secret path.
+    """
+    state = WebhookState()
+    chat_index = ChatIndex()
+    server = webhooks.make_server(("127.0.0.1", 0), "s3cret", state,
+                                  chat_index)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    base_url = "http://127.0.0.1:{}".format(server.server_address[1])
+
+    def _post(path, event):
+        request = Request(base_url + path, json.dumps(event).encode("utf-8"),
+                          {"Content-Type": "application/json"})
+        try:
+            return urlopen(request).status
+        except OSError as err:
+            return err.code
+
+    try:
+        assert _post("/wrong", _scored("user-x", "todo-1")) == 404
+        assert _post("/s3cret", _scored("user-a", "todo-1")) == 200
+        assert _post("/s3cret", {
+            "webhookType": "groupChatReceived", "group": {"id": PARTY_ID},
+            "chat": {"id": "message-1", "uuid": "user-a", "text": "Hi",
+                     "timestamp": "2020-05-02T10:00:00.000Z"}}) == 200
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+    assert state.completers(CHALLENGE_ID, ["todo-1"]) == {"user-a"}
+    assert chat_index.posters("2020-05-01T00:00:00.000Z",
+                              group_id=PARTY_ID) == {"user-a"}
+    assert not chat_index.posters("2020-05-01T00:00:00.000Z")
+
+
+# pylint doesn't understand fixtures
+# pylint: disable=redefined-outer-name
+def test_register_skips_existing(api_header):
+    """
+    Test that only missing webhooks are registered.
+    """
+    url = "https://example.com/s3cret"
+    with requests_mock.Mocker() as mock:
+        mock.get(webhooks.WEBHOOK_URL, json={"data": [
+            {"url": url, "type": "taskActivity"}]})
+        mock.post(webhooks.WEBHOOK_URL, json={"data": {}})
+        assert webhooks.register(api_header, url, PARTY_ID) == [
+            "groupChatReceived"]
+        assert mock.last_request.json() == {
+            "type": "groupChatReceived", "options": {"groupId": PARTY_ID},
+            "url": url, "label": "habitica-helper", "enabled": True}